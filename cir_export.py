@@ -0,0 +1,93 @@
+import argparse
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+import requests
+
+DATABASE_URL = "http://localhost:8001"
+# Steps fetched and written per request; memory use is bounded by one chunk
+EXPORT_CHUNK_STEPS = 64
+EXPORT_DTYPES = ("float16", "float32", "complex64")
+
+
+def fetch_cir_chunk(job_id: str, start: int, stop: int, database_url: str = DATABASE_URL) -> np.ndarray:
+    """
+    Fetch the CIRs of steps [start, stop) for the first antenna element of
+    every link, as an array of shape [2, steps, num_drones, num_drones, num_samples]
+    (magnitude then phase).
+    """
+    response = requests.get(f"{database_url}/jobs/{job_id}/cir", params={
+        "start": start, "stop": stop, "rx_ant": 0, "tx_ant": 0, "time": 0, "part": "both",
+    })
+    response.raise_for_status()
+    shape = [int(size) for size in response.headers["X-Shape"].split(",")]
+    cir = np.frombuffer(response.content, dtype=response.headers["X-Dtype"])
+    # [parts, steps, rx, rx_ant, tx, tx_ant, time, taps] -> [parts, steps, rx, tx, taps]
+    return cir.reshape(shape[0], shape[1], shape[2], shape[4], shape[7])
+
+def export_job_cir(job_id: str, file_path: str, dtype: str = "float16",
+                   database_url: str = DATABASE_URL, chunk_steps: int = EXPORT_CHUNK_STEPS,
+                   progress_callback: Optional[Callable[[int, int], None]] = None) -> Tuple[int, ...]:
+    """
+    Stream the CIRs of a job into a .npy file, one chunk of steps at a time.
+
+    The file is preallocated with np.lib.format.open_memmap and every chunk is
+    written straight into it, so jobs larger than the available memory can be
+    exported. float16/float32 files have the shape
+    [2, num_steps, num_drones, num_drones, num_samples] (magnitude and phase);
+    complex64 files have the shape [num_steps, num_drones, num_drones, num_samples].
+
+    Returns:
+        tuple: The shape of the exported array.
+    """
+    if dtype not in EXPORT_DTYPES:
+        raise ValueError(f"dtype must be one of {EXPORT_DTYPES}")
+    response = requests.get(f"{database_url}/jobs/{job_id}/steps", params={"start": 0, "stop": 1})
+    response.raise_for_status()
+    job_steps = response.json()
+    num_steps = job_steps['num_steps']
+    num_rx, _, num_tx, _, _, num_samples = job_steps['shape']
+
+    if dtype == "complex64":
+        shape = (num_steps, num_rx, num_tx, num_samples)
+    else:
+        shape = (2, num_steps, num_rx, num_tx, num_samples)
+    output = np.lib.format.open_memmap(file_path, mode="w+", dtype=dtype, shape=shape)
+
+    for start in range(0, num_steps, chunk_steps):
+        stop = min(start + chunk_steps, num_steps)
+        chunk = fetch_cir_chunk(job_id, start, stop, database_url)
+        if dtype == "complex64":
+            # Computed in float32 into the file, without a float64 intermediate
+            magnitude = chunk[0].astype(np.float32)
+            phase = chunk[1].astype(np.float32)
+            np.multiply(magnitude, np.exp(1j * phase).astype(np.complex64), out=output[start:stop])
+        else:
+            output[:, start:stop] = chunk
+        if progress_callback:
+            progress_callback(stop, num_steps)
+
+    output.flush()
+    del output
+    return shape
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the CIRs of a simulation job to a .npy file")
+    parser.add_argument("job_id", help="ID of the job to export")
+    parser.add_argument("output", help="Path of the .npy file to write")
+    parser.add_argument("--dtype", choices=EXPORT_DTYPES, default="float16",
+                        help="float16/float32 export magnitude and phase, complex64 the complex CIR")
+    parser.add_argument("--chunk-steps", type=int, default=EXPORT_CHUNK_STEPS,
+                        help="Steps fetched per request")
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    args = parser.parse_args()
+
+    def report(done, total):
+        print(f"\rExported {done}/{total} steps", end="", flush=True)
+
+    shape = export_job_cir(args.job_id, args.output, args.dtype, args.database_url,
+                           args.chunk_steps, progress_callback=report)
+    print(f"\nSaved {args.output} with shape {shape}")
+
+if __name__ == "__main__":
+    main()
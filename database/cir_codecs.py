@@ -0,0 +1,212 @@
+"""Codecs for the per-step CIR payloads stored in job results.
+
+The default codec keeps the original layout: dense float16 magnitude and
+phase arrays, each base64-encoded in "cir_mag"/"cir_phase". Any other codec
+stores a single base64 "cir_data" payload and describes itself in the
+"codec" field of the step results:
+
+- precision: "float16"/"float32" store magnitude and phase planes,
+  "complex64" stores the real and imaginary planes (float32).
+- sparse_threshold: only taps whose magnitude is above the threshold are
+  kept, as gaps between flat indices followed by the kept values.
+- delta: dense planes are XORed bitwise with the previous step's planes
+  (lossless); every keyframe_interval steps a full keyframe is stored.
+- compression: "none", "zstd" or "lz4" over the encoded bytes.
+
+This module is shared by the simulation service (encoding) and the database
+service (decoding); database/cir_codecs.py is a copy of
+simulation/app/services/cir_codecs.py and the two must be kept identical.
+"""
+import base64
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency, only needed for the zstd codec
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # Optional dependency, only needed for the lz4 codec
+    lz4_frame = None
+
+PRECISIONS = ("float16", "float32", "complex64")
+COMPRESSIONS = ("none", "zstd", "lz4")
+ZSTD_LEVEL = 3
+# Dense float16 magnitude/phase in cir_mag/cir_phase, readable by every consumer
+RAW_CODEC = {
+    "precision": "float16",
+    "compression": "none",
+    "sparse_threshold": None,
+    "delta": False,
+    "keyframe_interval": 16,
+}
+_PLANE_BITS = {"float16": np.uint16, "float32": np.uint32}
+
+
+def make_codec(codec: Optional[Dict] = None) -> Dict:
+    """Complete and validate a codec description, raising ValueError if it cannot be used."""
+    codec = {**RAW_CODEC, **(codec or {})}
+    if codec["precision"] not in PRECISIONS:
+        raise ValueError(f"Unknown CIR precision '{codec['precision']}', expected one of {PRECISIONS}")
+    if codec["compression"] not in COMPRESSIONS:
+        raise ValueError(f"Unknown CIR compression '{codec['compression']}', expected one of {COMPRESSIONS}")
+    if codec["compression"] == "zstd" and zstandard is None:
+        raise ValueError("The zstd CIR codec requires the zstandard package")
+    if codec["compression"] == "lz4" and lz4_frame is None:
+        raise ValueError("The lz4 CIR codec requires the lz4 package")
+    threshold = codec["sparse_threshold"]
+    if threshold is not None and (isinstance(threshold, bool) or not isinstance(threshold, (int, float))
+                                  or not threshold >= 0):
+        raise ValueError(f"sparse_threshold must be a non-negative number, got {threshold!r}")
+    if codec["sparse_threshold"] is not None and codec["delta"]:
+        raise ValueError("Sparse and delta CIR encoding cannot be combined")
+    if codec["keyframe_interval"] < 1:
+        raise ValueError("keyframe_interval must be at least 1")
+    return codec
+
+def plane_dtype(precision: str) -> str:
+    """dtype of the two stored planes"""
+    return "float32" if precision == "complex64" else precision
+
+def to_planes(cir: np.ndarray, precision: str) -> np.ndarray:
+    """Complex CIR -> [2, *shape] planes (magnitude/phase, or real/imaginary for complex64)"""
+    if precision == "complex64":
+        return np.stack([cir.real, cir.imag]).astype(np.float32)
+    return np.stack([np.abs(cir), np.angle(cir)]).astype(precision)
+
+def to_mag_phase(planes: np.ndarray, precision: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Magnitude and phase from decoded planes"""
+    if precision == "complex64":
+        cir = planes[0] + 1j * planes[1]
+        return np.abs(cir).astype(np.float32), np.angle(cir).astype(np.float32)
+    return planes[0], planes[1]
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if compression == "lz4":
+        return lz4_frame.compress(data)
+    return data
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("Decoding zstd CIRs requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == "lz4":
+        if lz4_frame is None:
+            raise ValueError("Decoding lz4 CIRs requires the lz4 package")
+        return lz4_frame.decompress(data)
+    return data
+
+
+class CirEncoder:
+    """Encodes the CIRs of consecutive steps; keeps the previous step for delta encoding.
+
+    One encoder is used per shard run, so a resumed or preempted shard starts
+    again from a keyframe.
+    """
+
+    def __init__(self, codec: Optional[Dict] = None):
+        self.codec = make_codec(codec)
+        self._previous = None
+        self._previous_step = None
+        self._keyframe_step = None
+
+    def encode(self, cir: np.ndarray, step: int) -> Dict:
+        """Step result fields for the complex CIR of one step (result key `step`)."""
+        codec = self.codec
+        if codec == RAW_CODEC:
+            cir_mag = np.abs(cir).astype(np.float16)
+            cir_phase = np.angle(cir).astype(np.float16)
+            return {
+                "cir_mag": base64.b64encode(cir_mag.tobytes(order='C')).decode('utf-8'),
+                "cir_phase": base64.b64encode(cir_phase.tobytes(order='C')).decode('utf-8'),
+                "dtype": str(cir_mag.dtype),
+                "shape": cir_mag.shape,
+            }
+
+        precision = codec["precision"]
+        planes = np.ascontiguousarray(to_planes(cir, precision))
+        fields = {"dtype": plane_dtype(precision), "shape": cir.shape}
+        if codec["sparse_threshold"] is not None:
+            flat = planes.reshape(2, -1)
+            indices = np.flatnonzero(np.abs(cir).ravel() > codec["sparse_threshold"]).astype(np.uint32)
+            gaps = np.diff(indices, prepend=np.uint32(0)).astype(np.uint32)
+            body = gaps.tobytes() + np.ascontiguousarray(flat[:, indices]).tobytes()
+            fields["nnz"] = int(indices.size)
+        else:
+            bits = planes.view(_PLANE_BITS[plane_dtype(precision)])
+            use_delta = (codec["delta"] and self._previous is not None
+                         and self._previous.shape == bits.shape
+                         and step == self._previous_step + 1
+                         and step - self._keyframe_step < codec["keyframe_interval"])
+            if use_delta:
+                body = np.bitwise_xor(bits, self._previous).tobytes()
+                fields["delta_of"] = self._previous_step
+            else:
+                body = bits.tobytes()
+                self._keyframe_step = step
+            self._previous, self._previous_step = bits, step
+        fields["cir_data"] = base64.b64encode(_compress(body, codec["compression"])).decode('utf-8')
+        fields["codec"] = codec
+        return fields
+
+
+def decode_planes(step_results: Dict, reference: Optional[np.ndarray] = None) -> Tuple[np.ndarray, str]:
+    """Decoded [2, *shape] planes of one step and their precision.
+
+    reference is the decoded planes of the step named by "delta_of", required
+    for delta-encoded steps.
+    """
+    shape = tuple(step_results["shape"])
+    if "cir_data" not in step_results:
+        dtype = step_results.get("dtype", "float16")
+        planes = np.stack([np.frombuffer(base64.b64decode(step_results[field]), dtype=dtype).reshape(shape)
+                           for field in ("cir_mag", "cir_phase")])
+        return planes, dtype
+
+    codec = make_codec(step_results["codec"])
+    precision = codec["precision"]
+    dtype = np.dtype(plane_dtype(precision))
+    body = _decompress(base64.b64decode(step_results["cir_data"]), codec["compression"])
+    if "nnz" in step_results:
+        nnz = step_results["nnz"]
+        gaps = np.frombuffer(body, dtype=np.uint32, count=nnz)
+        values = np.frombuffer(body, dtype=dtype, offset=4 * nnz).reshape(2, nnz)
+        planes = np.zeros((2, int(np.prod(shape))), dtype=dtype)
+        planes[:, np.cumsum(gaps, dtype=np.uint64)] = values
+        return planes.reshape((2,) + shape), precision
+
+    bits = np.frombuffer(body, dtype=_PLANE_BITS[dtype.name]).reshape((2,) + shape)
+    if "delta_of" in step_results:
+        if reference is None:
+            raise ValueError(f"Step is delta-encoded against step {step_results['delta_of']}, "
+                             "which was not provided")
+        bits = np.bitwise_xor(bits, reference.view(bits.dtype))
+    return bits.view(dtype), precision
+
+def decode_step(get_step_results: Callable[[int], Dict], step: int,
+                cache: Optional[Dict[int, Tuple[np.ndarray, str]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Magnitude and phase arrays of one step.
+
+    get_step_results returns the step results for a result key; delta chains
+    are followed back to their keyframe. Pass the same cache dict when
+    decoding consecutive steps so each one is decoded only once.
+    """
+    cache = {} if cache is None else cache
+    chain = [step]
+    while chain[-1] not in cache and "delta_of" in get_step_results(chain[-1]):
+        chain.append(get_step_results(chain[-1])["delta_of"])
+    for key in reversed(chain):
+        if key not in cache:
+            reference = None
+            data = get_step_results(key)
+            if "delta_of" in data:
+                reference = cache[data["delta_of"]][0]
+            cache[key] = decode_planes(data, reference)
+    planes, precision = cache[step]
+    return to_mag_phase(planes, precision)
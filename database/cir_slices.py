@@ -0,0 +1,100 @@
+import base64
+import itertools
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import cir_codecs
+
+# Axes of the CIR of one step, as stored by the simulation service
+CIR_AXES = ('rx', 'rx_ant', 'tx', 'tx_ant', 'time', 'taps')
+CIR_PARTS = {'mag': ('cir_mag',), 'phase': ('cir_phase',), 'both': ('cir_mag', 'cir_phase')}
+DTYPE_SIZES = {'float16': 2, 'float32': 4, 'float64': 8}
+
+# Parsed results of the most recently sliced jobs, keyed by (job id, updated_at)
+RESULT_CACHE_SIZE = 4
+_result_cache: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+# The slicing endpoints run on FastAPI's threadpool, so the cache is shared between threads
+_result_cache_lock = threading.Lock()
+
+
+def cached_result(job_id: str, updated_at: str, load) -> dict:
+    """Parsed result of a job, so browsing its steps does not parse the whole result each time"""
+    key = (job_id, updated_at)
+    with _result_cache_lock:
+        if key in _result_cache:
+            _result_cache.move_to_end(key)
+            return _result_cache[key]
+    # Loaded outside the lock: a miss on one job does not block requests for the others
+    result = load()
+    result = json.loads(result) if isinstance(result, str) else (result or {})
+    with _result_cache_lock:
+        _result_cache[key] = result
+        while len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+    return result
+
+def parse_selection(value: Optional[str], size: int, name: str) -> List[int]:
+    """Indices selected by "i", "start:stop" or nothing (the whole axis)"""
+    if value is None or value == "":
+        return list(range(size))
+    try:
+        if ":" in value:
+            start, _, stop = value.partition(":")
+            indices = list(range(size))[slice(int(start) if start else None, int(stop) if stop else None)]
+        else:
+            indices = [int(value)]
+    except ValueError:
+        raise ValueError(f"Invalid {name} selection '{value}'")
+    if not indices or not all(0 <= index < size for index in indices):
+        raise ValueError(f"{name} selection '{value}' is outside [0, {size})")
+    return indices
+
+def step_results(result: dict, step: int) -> dict:
+    step_data = result.get(str(step))
+    if step_data is None:
+        raise KeyError(f"Step {step} has no result")
+    return step_data.get('step_results', {})
+
+def _slice_encoded(result: dict, steps: List[int], selection: Dict[str, List[int]], part: str) -> Tuple[bytes, str]:
+    """Slice of steps stored with a codec other than the dense default (see cir_codecs.py)."""
+    cache = {}
+    planes = [cir_codecs.decode_step(lambda key: step_results(result, key), step, cache) for step in steps]
+    index = np.ix_(*[selection[axis] for axis in CIR_AXES])
+    parts = [CIR_PARTS['both'].index(field) for field in CIR_PARTS[part]]
+    sliced = np.stack([np.stack([step_planes[p][index] for step_planes in planes]) for p in parts])
+    return sliced.tobytes(), str(sliced.dtype)
+
+def slice_cir(result: dict, steps: List[int], selection: Dict[str, List[int]], part: str) -> Tuple[bytes, List[int], str]:
+    """Raw bytes of a slice of the CIRs, with its shape and dtype.
+
+    The output is C-ordered with shape [parts, steps, rx, rx_ant, tx, tx_ant, time, taps].
+    Taps are contiguous in the dense arrays, so each selected link is copied
+    as one block of bytes without decoding the values; steps stored with
+    another codec are decoded first.
+    """
+    out_shape = [len(CIR_PARTS[part]), len(steps)] + [len(selection[axis]) for axis in CIR_AXES]
+    if 'cir_data' in step_results(result, steps[0]):
+        content, dtype = _slice_encoded(result, steps, selection, part)
+        return content, out_shape, dtype
+
+    chunks = []
+    shape, dtype = None, None
+    for field in CIR_PARTS[part]:
+        for step in steps:
+            data = step_results(result, step)
+            shape, dtype = data['shape'], data.get('dtype', 'float16')
+            item_size = DTYPE_SIZES[dtype]
+            raw = base64.b64decode(data[field])
+            strides = [item_size] * len(shape)
+            for axis in range(len(shape) - 2, -1, -1):
+                strides[axis] = strides[axis + 1] * shape[axis + 1]
+            taps = selection['taps']
+            for index in itertools.product(*[selection[axis] for axis in CIR_AXES[:-1]]):
+                offset = sum(i * stride for i, stride in zip(index, strides))
+                # Contiguous tap range of one link
+                chunks.append(raw[offset + taps[0] * item_size: offset + (taps[-1] + 1) * item_size])
+    return b"".join(chunks), out_shape, dtype
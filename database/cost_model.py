@@ -0,0 +1,125 @@
+import os
+import statistics
+from typing import Optional
+
+# Solver budget used by the simulation service when a job does not set one
+DEFAULT_SAMPLES_PER_SRC = int(1e7)
+DEFAULT_MAX_DEPTH = 50
+
+# Job modes of the simulation service: "paths" traces every step, "radio_map"
+# interpolates path gains from precomputed maps
+JOB_MODES = ("paths", "radio_map")
+
+# Radio-map jobs (see the simulation service's radio_maps.py) when a job does not set them
+DEFAULT_RADIO_MAP_DEPTH = 5
+DEFAULT_RADIO_MAP_LAYERS = 3
+
+# Seconds per solver work unit (one source x 1e9 samples x depth) used until
+# enough steps have been measured for a scene
+DEFAULT_SECONDS_PER_UNIT = float(os.getenv("DEFAULT_SECONDS_PER_UNIT", 20.0))
+CALIBRATION_SAMPLES = 200
+
+# Size classes in the order workers drain them, with their upper bound in seconds
+SIZE_CLASSES = [
+    ("interactive", float(os.getenv("INTERACTIVE_MAX_SECONDS", 60))),
+    ("standard", float(os.getenv("STANDARD_MAX_SECONDS", 3600))),
+    ("bulk", float("inf")),
+]
+
+# Admission limits, jobs above either are rejected
+MAX_JOB_STEPS = int(os.getenv("MAX_JOB_STEPS", 100000))
+MAX_JOB_SECONDS = float(os.getenv("MAX_JOB_SECONDS", 7 * 24 * 3600))
+# Steps of radio-map jobs are lookups into precomputed maps, so many more are admitted
+MAX_RADIO_MAP_STEPS = int(os.getenv("MAX_RADIO_MAP_STEPS", 1000000))
+
+
+def count_steps(config: dict) -> int:
+    """Number of solver runs the simulation service will perform for a config"""
+    steps = int(config.get('simulation_steps', 5))
+    if config.get('move_together', True):
+        return steps
+    # Independent motion traces every combination of the moving drones' positions
+    moving = sum(1 for drone in config.get('drones', []) if drone.get('has_motion'))
+    return steps ** moving
+
+def work_per_step(config: dict) -> float:
+    """Solver work of a single step, in sources x 1e9 samples x depth"""
+    antenna = config.get('antenna_configs', {})
+    elements = antenna.get('num_rows', 1) * antenna.get('num_cols', 1)
+    # Every element of every drone is traced as its own source
+    sources = len(config.get('drones', [])) * elements
+    solver = config.get('solver') or {}
+    samples = solver.get('samples_per_src', DEFAULT_SAMPLES_PER_SRC)
+    depth = solver.get('max_depth', DEFAULT_MAX_DEPTH)
+    return sources * samples * depth / 1e9
+
+def radio_map_work(config: dict) -> float:
+    """Solver work of the gain maps of a radio-map job: every drone without motion, once per altitude layer.
+
+    An upper bound, as maps cached by earlier jobs are not solved again.
+    """
+    radio_map = config.get('radio_map') or {}
+    transmitters = sum(1 for drone in config.get('drones', []) if not drone.get('has_motion'))
+    layers = len(radio_map.get('altitudes') or []) or DEFAULT_RADIO_MAP_LAYERS
+    samples = radio_map.get('samples_per_tx', DEFAULT_SAMPLES_PER_SRC)
+    depth = radio_map.get('max_depth', DEFAULT_RADIO_MAP_DEPTH)
+    return transmitters * layers * samples * depth / 1e9
+
+def seconds_per_unit(redis_client, scene_name: str) -> float:
+    """Median measured step time per work unit, per scene when available"""
+    for key in (f"calibration:{scene_name}", "calibration:all"):
+        samples = redis_client.lrange(key, 0, -1)
+        if samples:
+            return statistics.median(float(sample) for sample in samples)
+    return DEFAULT_SECONDS_PER_UNIT
+
+def record_step_timing(redis_client, config: dict, step_seconds: float):
+    """Store a measured step time to calibrate future estimates"""
+    work = work_per_step(config)
+    if work <= 0 or step_seconds <= 0:
+        return
+    sample = step_seconds / work
+    pipe = redis_client.pipeline()
+    for key in (f"calibration:{config.get('scene_name', '')}", "calibration:all"):
+        pipe.lpush(key, sample)
+        pipe.ltrim(key, 0, CALIBRATION_SAMPLES - 1)
+    pipe.execute()
+
+def size_class(seconds: float) -> str:
+    """Queue a job of the given estimated duration belongs to"""
+    for name, max_seconds in SIZE_CLASSES:
+        if seconds <= max_seconds:
+            return name
+    return SIZE_CLASSES[-1][0]
+
+def estimate_cost(redis_client, config: dict) -> dict:
+    """Estimate the size and duration of a job from its config"""
+    steps = count_steps(config)
+    drones = len(config.get('drones', []))
+    antenna = config.get('antenna_configs', {})
+    elements = antenna.get('num_rows', 1) * antenna.get('num_cols', 1)
+    mode = config.get('mode', 'paths')
+    if mode == 'radio_map':
+        # The maps are solved once; steps are only interpolated from them
+        work = radio_map_work(config) / max(steps, 1)
+    else:
+        work = work_per_step(config)
+    seconds = steps * work * seconds_per_unit(redis_client, config.get('scene_name', ''))
+    return {
+        "mode": mode,
+        "steps": steps,
+        "links": (drones * elements) ** 2,
+        "work_per_step": work,
+        "estimated_seconds": seconds,
+        "size_class": size_class(seconds),
+    }
+
+def admission_error(estimate: dict) -> Optional[str]:
+    """Reason a job with this estimate is rejected, or None if it is admitted"""
+    max_steps = MAX_RADIO_MAP_STEPS if estimate.get('mode') == 'radio_map' else MAX_JOB_STEPS
+    if estimate['steps'] > max_steps:
+        return f"Job has {estimate['steps']} steps, the limit is {max_steps}"
+    if estimate['estimated_seconds'] > MAX_JOB_SECONDS:
+        return (f"Job is estimated to take {estimate['estimated_seconds']:.0f}s, "
+                f"the limit is {MAX_JOB_SECONDS:.0f}s")
+    return None
@@ -0,0 +1,33 @@
+from typing import Dict, List, Optional
+
+
+def metrics_table(result: dict) -> dict:
+    """Per-step link metrics of a job result, without the CIRs.
+
+    Returns {"steps": [step, ...], "metrics": {name: [per-step [rx][tx] values]}}
+    """
+    steps = sorted(int(step) for step in result)
+    table = {"steps": [], "metrics": {}}
+    for step in steps:
+        step_metrics = result[str(step)].get('step_results', {}).get('metrics')
+        if not step_metrics:
+            continue
+        table["steps"].append(step)
+        for name, values in step_metrics.items():
+            table["metrics"].setdefault(name, []).append(values)
+    return table
+
+def select_metrics(table: dict, names: Optional[List[str]] = None, start: Optional[int] = None,
+                   stop: Optional[int] = None, tx: Optional[int] = None, rx: Optional[int] = None) -> dict:
+    """Time series of some metrics over a step range, for one link when tx and rx are given"""
+    positions = [i for i, step in enumerate(table["steps"])
+                 if (start is None or step >= start) and (stop is None or step < stop)]
+    selected: Dict[str, list] = {}
+    for name in names or list(table["metrics"]):
+        if name not in table["metrics"]:
+            raise KeyError(f"Unknown metric '{name}'")
+        series = [table["metrics"][name][i] for i in positions]
+        if tx is not None and rx is not None:
+            series = [values[rx][tx] for values in series]
+        selected[name] = series
+    return {"steps": [table["steps"][i] for i in positions], "metrics": selected}
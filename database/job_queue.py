@@ -1,15 +1,25 @@
 import os
+import copy
 import json
 import uuid
-import requests
+import hashlib
+import itertools
 from datetime import datetime
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 import redis
 
+import cir_codecs
+import cir_slices
+import cost_model
+import job_metrics
+import model_catalog
+import profiles
+import retention
+
 # Connect to Redis (will be configured via environment variables)
 redis_client = redis.Redis(
     host=os.getenv('REDIS_HOST', 'localhost'),
@@ -29,48 +39,288 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Serve static files from 3d_models directory
-app.mount("/3d_models", StaticFiles(directory="/app/3d_models"), name="3d_models")
+# Mesh levels of detail the simulation service can build (its scene_assets.LOD_LEVELS)
+LOD_LEVELS = ("full", "fine", "medium", "coarse")
 
 # Models
 class Job(BaseModel):
     id: str
-    status: str = "pending"  # pending, processing, completed, failed
+    status: str = "pending"  # pending, processing, completed, failed, cancelled
     progress: int = 0  # 0-100
     created_at: str
     updated_at: str
     config: dict
     result: Optional[dict] = None
+    affinity: Optional[str] = None
+    batch_id: Optional[str] = None
+    priority: int = 0  # higher runs first within a size class
+    estimate: Optional[dict] = None
+    stats: Optional[dict] = None
+    result_bytes: Optional[int] = None  # set when the result was offloaded to disk
+    profiles: Optional[List[dict]] = None  # links to the profiles of a profiled job (GET /jobs/{job_id} only)
 
 class JobCreate(BaseModel):
     config: dict
+    priority: int = 0
+
+class JobBatchCreate(BaseModel):
+    base_config: dict
+    # Axis name -> list of values. Names are top-level config keys ("drones",
+    # "antenna_configs", ...) or dotted paths ("radio_configs.frequency").
+    sweep: Dict[str, List[Any]] = {}
+    batch_id: Optional[str] = None
+    priority: int = 0
+
+class JobBatchResponse(BaseModel):
+    batch_id: str
+    job_ids: List[str]
+
+class JobClaim(BaseModel):
+    affinity: Optional[str] = None
+    worker_id: Optional[str] = None
+
+class Shard(BaseModel):
+    index: int
+    start: int  # first step (or combination) index, inclusive
+    stop: int  # last step (or combination) index, exclusive
+    status: str = "pending"
+    progress: int = 0
+    stats: Optional[dict] = None
+    resume: Optional[int] = None  # next index to simulate after a preemption
+    preempt: bool = False
+    queued_at: Optional[str] = None
+    worker_id: Optional[str] = None
+
+class ShardClaim(BaseModel):
+    job: Job
+    shard: Shard
 
 class JobStatusUpdate(BaseModel):
     status: str
     progress: int = 0
     result: Optional[dict] = None
+    stats: Optional[dict] = None  # e.g. {"steps": 10, "mean_step_seconds": 4.2, "peak_rss_mb": 900}
+    checkpoint: Optional[dict] = None  # e.g. {"resume": 42} when a shard is paused
+
+# Job fields stored as JSON strings in the Redis hash
+JSON_FIELDS = ('config', 'result', 'estimate', 'stats')
+
+# Jobs with more steps than this are split into shards that workers claim independently
+SHARD_STEPS = int(os.getenv("SHARD_STEPS", 50))
+
+# Running non-interactive shards are preempted once an interactive shard has waited this long
+PREEMPT_AFTER_SECONDS = float(os.getenv("PREEMPT_AFTER_SECONDS", 30))
+
+# Shards of a worker that has not reported for this long are queued again
+WORKER_LEASE_SECONDS = int(os.getenv("WORKER_LEASE_SECONDS", 3600))
 
 # Helper functions
-def get_model_folders():
-    """Get list of model folders in 3d_models directory"""
-    models_path = "/app/3d_models"
-    if not os.path.exists(models_path):
-        return []
-    
-    folders = []
-    for item in os.listdir(models_path):
-        item_path = os.path.join(models_path, item)
-        if os.path.isdir(item_path):
-            # Check if there's a .glb file in the folder
-            glb_files = [f for f in os.listdir(item_path) if f.endswith('.glb')]
-            if glb_files:
-                folders.append({
-                    "name": item,
-                    "folder": item,
-                    "glb_file": glb_files[0],
-                    "path": f"/3d_models/{item}/{glb_files[0]}"
-                })
-    return folders
+def job_affinity(config: dict) -> str:
+    """Key grouping jobs that can share a warm scene on the same worker"""
+    radio_setup = {
+        "radio_configs": config.get("radio_configs"),
+        "antenna_configs": config.get("antenna_configs"),
+        "lod": config.get("lod", "full"),
+    }
+    digest = hashlib.sha1(json.dumps(radio_setup, sort_keys=True).encode()).hexdigest()[:12]
+    return f"{config.get('scene_name', '')}:{digest}"
+
+def expand_sweep(base_config: dict, sweep: Dict[str, List[Any]]) -> List[dict]:
+    """Build one config per point of the cartesian product of the sweep axes"""
+    axes = list(sweep.items())
+    configs = []
+    for values in itertools.product(*[axis_values for _, axis_values in axes]):
+        config = copy.deepcopy(base_config)
+        for (path, _), value in zip(axes, values):
+            target = config
+            *parents, leaf = path.split(".")
+            for key in parents:
+                target = target.setdefault(key, {})
+            target[leaf] = copy.deepcopy(value)
+        configs.append(config)
+    return configs
+
+def serialize_job(job: Job) -> dict:
+    """Convert a job to a flat mapping that can be stored in a Redis hash"""
+    job_dict = job.dict()
+    for key in JSON_FIELDS:
+        if job_dict.get(key) is not None:
+            job_dict[key] = json.dumps(job_dict[key])
+    # Redis cannot store None, so optional fields are only written when set
+    return {key: value for key, value in job_dict.items() if value is not None}
+
+def deserialize_job(job_data: dict) -> Job:
+    """Rebuild a job from its Redis hash"""
+    for key in JSON_FIELDS:
+        if job_data.get(key) is not None:
+            job_data[key] = json.loads(job_data[key])
+    for key in ('progress', 'priority', 'result_bytes'):
+        if key in job_data:
+            job_data[key] = int(job_data[key])
+    return Job(**job_data)
+
+def plan_shards(steps: int) -> List[Shard]:
+    """Split the step (or combination) index space of a job into shards"""
+    return [
+        Shard(index=index, start=start, stop=min(start + SHARD_STEPS, steps))
+        for index, start in enumerate(range(0, max(steps, 1), SHARD_STEPS))
+    ]
+
+def get_shards(job_id: str) -> List[Shard]:
+    """Load the shards of a job ordered by index"""
+    shards = [Shard(**json.loads(value)) for value in redis_client.hvals(f"job:{job_id}:shards")]
+    return sorted(shards, key=lambda shard: shard.index)
+
+def enqueue_shard(pipe, job: Job, shard: Shard):
+    """Add a shard to the pending queue of its job's size class and affinity group"""
+    shard.queued_at = datetime.now().isoformat()
+    pipe.hset(f"job:{job.id}:shards", shard.index, json.dumps(shard.dict()))
+    # Lowest score is claimed first: higher priority, then older jobs, then shard order
+    score = -job.priority * 1e10 + datetime.fromisoformat(job.created_at).timestamp()
+    queue = f"pending:{job.estimate['size_class']}:{job.affinity}"
+    pipe.zadd(queue, {
+        f"{job.id}#{shard.index}": score + shard.index * 1e-3
+    })
+    # Registered after the shard is queued, so drop_empty_queue never loses a non-empty queue
+    pipe.sadd(retention.PENDING_QUEUES, queue)
+
+def pending_queues(size_class: str) -> List[str]:
+    """Pending queues of a size class, one per affinity group"""
+    prefix = f"pending:{size_class}:"
+    return [key for key in redis_client.smembers(retention.PENDING_QUEUES) if key.startswith(prefix)]
+
+def drop_empty_queue(key: str):
+    """Unregister a pending queue found empty"""
+    redis_client.srem(retention.PENDING_QUEUES, key)
+    # A shard queued meanwhile registers the queue again, or is seen here
+    if redis_client.zcard(key):
+        redis_client.sadd(retention.PENDING_QUEUES, key)
+
+def enqueue_job(pipe, job: Job):
+    """Split a job into shards and queue them all"""
+    for shard in plan_shards(job.estimate['steps']):
+        enqueue_shard(pipe, job, shard)
+
+def store_shard_result(job_id: str, shard_index: int, result: dict):
+    """Add step results to those already stored for a shard (e.g. before a preemption)"""
+    key = f"job:{job_id}:shard:{shard_index}:result"
+    stored = redis_client.get(key)
+    if stored:
+        result = {**json.loads(stored), **result}
+    redis_client.set(key, json.dumps(result))
+
+def combine_stats(*stats: Optional[dict]) -> dict:
+    """Combine step timing and memory stats of several runs into one"""
+    measured = [s for s in stats if s and s.get('steps')]
+    steps = sum(s['steps'] for s in measured)
+    mean = sum(s['steps'] * s['mean_step_seconds'] for s in measured) / max(steps, 1)
+    peak = max((s.get('peak_rss_mb', 0) for s in measured), default=0)
+    return {"steps": steps, "mean_step_seconds": mean, "peak_rss_mb": peak}
+
+def merge_shards(job_id: str, shards: List[Shard]) -> dict:
+    """Assemble the results of completed shards into the job result"""
+    result = {}
+    for shard in shards:
+        shard_result = redis_client.get(f"job:{job_id}:shard:{shard.index}:result")
+        if shard_result:
+            # Shard results are keyed by global step index, so they never collide
+            result.update(json.loads(shard_result))
+    return result
+
+def renew_lease(worker_id: Optional[str]):
+    """Keep the shards claimed by a worker assigned to it"""
+    if worker_id:
+        redis_client.set(f"worker:{worker_id}:heartbeat", 1, ex=WORKER_LEASE_SECONDS)
+
+def release_worker(worker_id: str) -> int:
+    """Queue again the shards a worker claimed but did not finish"""
+    released = 0
+    for member in redis_client.smembers(f"worker:{worker_id}:claims"):
+        job_id, _, shard_index = member.rpartition("#")
+        job_data = redis_client.hgetall(f"job:{job_id}")
+        shard_data = redis_client.hget(f"job:{job_id}:shards", shard_index)
+        if not job_data or not shard_data or job_data.get('status') != "processing":
+            continue
+        shard = Shard(**json.loads(shard_data))
+        if shard.status != "processing" or shard.worker_id != worker_id:
+            continue
+        shard.status = "pending"
+        shard.preempt = False
+        shard.worker_id = None
+        enqueue_shard(redis_client, deserialize_job(job_data), shard)
+        released += 1
+    
+    pipe = redis_client.pipeline()
+    pipe.delete(f"worker:{worker_id}:claims", f"worker:{worker_id}:heartbeat")
+    pipe.srem("workers", worker_id)
+    pipe.execute()
+    return released
+
+def release_expired_workers():
+    """Recover the shards of workers whose lease ran out (e.g. their host died)"""
+    for worker_id in redis_client.smembers("workers"):
+        if not redis_client.exists(f"worker:{worker_id}:heartbeat"):
+            released = release_worker(worker_id)
+            print(f"Worker {worker_id} lease expired, released {released} shard(s)")
+
+def interactive_waiting() -> bool:
+    """Whether an interactive shard has been waiting longer than PREEMPT_AFTER_SECONDS"""
+    now = datetime.now()
+    for key in pending_queues("interactive"):
+        head = redis_client.zrange(key, 0, 0)
+        if not head:
+            drop_empty_queue(key)
+        for member in head:
+            job_id, _, shard_index = member.rpartition("#")
+            # Heads left behind by failed or cancelled jobs are not waiting
+            if redis_client.hget(f"job:{job_id}", "status") not in ("pending", "processing"):
+                continue
+            shard_data = redis_client.hget(f"job:{job_id}:shards", shard_index)
+            if not shard_data:
+                continue
+            queued_at = json.loads(shard_data).get('queued_at')
+            if queued_at and (now - datetime.fromisoformat(queued_at)).total_seconds() > PREEMPT_AFTER_SECONDS:
+                return True
+    return False
+
+def job_control(job_data: dict, shard: Optional[Shard] = None) -> str:
+    """Instruction for the simulator running a job: continue, cancel or preempt"""
+    if not job_data or job_data.get('status') == "cancelled":
+        return "cancel"
+    # Only queued shards can be paused and resumed later
+    if shard is None:
+        return "continue"
+    if shard.preempt:
+        return "preempt"
+    estimate = json.loads(job_data.get('estimate') or '{}')
+    if estimate.get('size_class', "interactive") != "interactive" and interactive_waiting():
+        return "preempt"
+    return "continue"
+
+def config_error(config: dict) -> Optional[str]:
+    """Reason a job config cannot be run by the simulation service, or None if it can"""
+    mode = config.get('mode', "paths")
+    if mode not in cost_model.JOB_MODES:
+        return f"Unknown mode '{mode}', expected one of {list(cost_model.JOB_MODES)}"
+    lod = config.get('lod', "full")
+    if lod not in LOD_LEVELS:
+        return f"Unknown level of detail '{lod}', expected one of {list(LOD_LEVELS)}"
+    try:
+        cir_codecs.make_codec(config.get('codec'))
+    except (ValueError, TypeError) as e:
+        return f"Invalid codec: {e}"
+    return None
+
+def admit_job(config: dict) -> dict:
+    """Validate a job and estimate its cost, rejecting it when it exceeds the configured limits"""
+    error = config_error(config)
+    if error:
+        raise HTTPException(status_code=422, detail={"message": error})
+    estimate = cost_model.estimate_cost(redis_client, config)
+    error = cost_model.admission_error(estimate)
+    if error:
+        raise HTTPException(status_code=422, detail={"message": error, "estimate": estimate})
+    return estimate
 
 # API Endpoints
 @app.get("/")
@@ -83,6 +333,7 @@ async def create_job(job_data: JobCreate):
     # Use the job ID from the frontend if provided, otherwise generate one
     job_id = job_data.config.get('job_id', str(uuid.uuid4()))
     now = datetime.now().isoformat()
+    estimate = admit_job(job_data.config)
     
     job = Job(
         id=job_id,
@@ -90,58 +341,174 @@ async def create_job(job_data: JobCreate):
         progress=0,
         created_at=now,
         updated_at=now,
-        config=job_data.config
+        config=job_data.config,
+        affinity=job_affinity(job_data.config),
+        priority=job_data.priority,
+        estimate=estimate
     )
     
-    # Save job to Redis (serialize complex data types)
-    job_dict = job.dict()
-    job_dict['config'] = json.dumps(job_dict['config'])
-    # Ensure result field is handled properly
-    if job_dict.get('result') is not None:
-        job_dict['result'] = json.dumps(job_dict['result'])
-    else:
-        # Remove the result field if it's None to avoid Redis errors
-        if 'result' in job_dict:
-            del job_dict['result']
+    # Save job to Redis, add to jobs list and queue it for the simulation
+    # workers, which drain interactive jobs before larger ones
+    pipe = redis_client.pipeline()
+    pipe.hset(f"job:{job_id}", mapping=serialize_job(job))
+    pipe.lpush("jobs", job_id)
+    enqueue_job(pipe, job)
+    pipe.execute()
     
-    redis_client.hset(f"job:{job_id}", mapping=job_dict)
-    # Add to jobs list
-    redis_client.lpush("jobs", job_id)
+    return job
+
+@app.post("/jobs/batch", response_model=JobBatchResponse)
+async def create_job_batch(batch_data: JobBatchCreate):
+    """Create one job per point of a parameter sweep"""
+    batch_id = batch_data.batch_id or str(uuid.uuid4())
+    configs = expand_sweep(batch_data.base_config, batch_data.sweep)
+    now = datetime.now().isoformat()
     
-    # Notify simulation service to start processing the job immediately
-    try:
-        simulation_url = os.getenv("SIMULATION_URL", "http://simulation:8000")
-        # Send request to simulation service to start the job
-        requests.post(
-            f"{simulation_url}/api/start_simulation",
-            json={"config": job_data.config},
-            timeout=5  # 5 second timeout
+    # The whole sweep is rejected if any of its jobs is invalid or exceeds the limits
+    estimates = []
+    for index, config in enumerate(configs):
+        error = config_error(config)
+        if error:
+            raise HTTPException(status_code=422, detail={"message": f"Sweep point {index}: {error}"})
+        estimate = cost_model.estimate_cost(redis_client, config)
+        error = cost_model.admission_error(estimate)
+        if error:
+            raise HTTPException(
+                status_code=422,
+                detail={"message": f"Sweep point {index}: {error}", "estimate": estimate}
+            )
+        estimates.append(estimate)
+    
+    # All jobs are written in a single round trip and left for the workers,
+    # which drain them grouped by affinity instead of one notification each
+    pipe = redis_client.pipeline()
+    job_ids = []
+    for index, config in enumerate(configs):
+        job_id = f"{batch_id}-{index}"
+        config['job_id'] = job_id
+        job = Job(
+            id=job_id,
+            status="pending",
+            progress=0,
+            created_at=now,
+            updated_at=now,
+            config=config,
+            affinity=job_affinity(config),
+            batch_id=batch_id,
+            priority=batch_data.priority,
+            estimate=estimates[index]
         )
-    except Exception as e:
-        # If the direct call fails, the worker will still pick up the job
-        print(f"Failed to notify simulation service: {e}")
-        pass
+        pipe.hset(f"job:{job_id}", mapping=serialize_job(job))
+        pipe.lpush("jobs", job_id)
+        enqueue_job(pipe, job)
+        job_ids.append(job_id)
+    pipe.execute()
     
-    return job
+    return JobBatchResponse(batch_id=batch_id, job_ids=job_ids)
+
+@app.post("/jobs/claim", response_model=ShardClaim)
+async def claim_job(claim: JobClaim):
+    """Hand the next pending shard to a worker, preferring its warm affinity group"""
+    release_expired_workers()
+    retention.enforce_retention(redis_client)
+    
+    for class_name, _ in cost_model.SIZE_CLASSES:
+        while True:
+            # Pick the queue whose head has the best score, breaking ties in
+            # favour of the worker's warm affinity group
+            best_key, best_score = None, None
+            for key in pending_queues(class_name):
+                head = redis_client.zrange(key, 0, 0, withscores=True)
+                if not head:
+                    drop_empty_queue(key)
+                    continue
+                score = head[0][1]
+                preferred = key == f"pending:{class_name}:{claim.affinity}"
+                if best_key is None or score < best_score or (score == best_score and preferred):
+                    best_key, best_score = key, score
+            if best_key is None:
+                break
+            
+            # ZPOPMIN is atomic, so each queued shard is handed to exactly one worker
+            popped = redis_client.zpopmin(best_key)
+            if not popped:
+                continue
+            job_id, _, shard_index = popped[0][0].rpartition("#")
+            job_data = redis_client.hgetall(f"job:{job_id}")
+            shard_data = redis_client.hget(f"job:{job_id}:shards", shard_index)
+            # Skip shards of jobs that were deleted, finished or started elsewhere
+            if not job_data or not shard_data or job_data.get('status') not in ("pending", "processing"):
+                continue
+            shard = Shard(**json.loads(shard_data))
+            if shard.status != "pending":
+                continue
+            
+            shard.status = "processing"
+            shard.worker_id = claim.worker_id
+            redis_client.hset(f"job:{job_id}:shards", shard_index, json.dumps(shard.dict()))
+            redis_client.hset(f"job:{job_id}", mapping={
+                "status": "processing",
+                "updated_at": datetime.now().isoformat()
+            })
+            # Claims are tracked per worker so they can be released if it dies
+            if claim.worker_id:
+                redis_client.sadd("workers", claim.worker_id)
+                redis_client.sadd(f"worker:{claim.worker_id}:claims", popped[0][0])
+                renew_lease(claim.worker_id)
+            job_data['status'] = "processing"
+            return ShardClaim(job=deserialize_job(job_data), shard=shard)
+    
+    return Response(status_code=204)
+
+def parse_datetime(value: Optional[str], name: str) -> Optional[datetime]:
+    """Naive local datetime of an ISO date or date-time query parameter, like the jobs' created_at"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"{name} must be an ISO date or date-time, got '{value}'")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
 
 @app.get("/jobs", response_model=List[Job])
-async def list_jobs():
-    """List all jobs"""
+async def list_jobs(scene_name: Optional[str] = None, status: Optional[str] = None,
+                    min_frequency: Optional[float] = None, max_frequency: Optional[float] = None,
+                    created_after: Optional[str] = None, created_before: Optional[str] = None,
+                    include_result: bool = True):
+    """List jobs, optionally filtered (offloaded results are not loaded, use GET /jobs/{job_id}).
+
+    created_after/created_before are ISO dates or date-times (local time unless
+    they carry an offset); include_result=false leaves the results in Redis,
+    for selecting jobs without transferring them.
+    """
+    after, before = parse_datetime(created_after, "created_after"), parse_datetime(created_before, "created_before")
+    retention.enforce_retention(redis_client)
     job_ids = redis_client.lrange("jobs", 0, -1)
+    fields = [field for field in Job.__fields__ if include_result or field != 'result']
     jobs = []
     
     for job_id in job_ids:
-        job_data = redis_client.hgetall(f"job:{job_id}")
-        if job_data:
-            # Deserialize complex data types
-            if 'config' in job_data:
-                job_data['config'] = json.loads(job_data['config'])
-            if 'result' in job_data and job_data['result'] is not None:
-                job_data['result'] = json.loads(job_data['result'])
-            # Convert progress to int
-            if 'progress' in job_data:
-                job_data['progress'] = int(job_data['progress'])
-            jobs.append(Job(**job_data))
+        values = redis_client.hmget(f"job:{job_id}", fields)
+        job_data = {field: value for field, value in zip(fields, values) if value is not None}
+        if not job_data:
+            continue
+        if status and job_data.get('status') != status:
+            continue
+        if after or before:
+            created_at = datetime.fromisoformat(job_data['created_at'])
+            if (after and created_at < after) or (before and created_at >= before):
+                continue
+        job = deserialize_job(job_data)
+        frequency = (job.config.get('radio_configs') or {}).get('frequency')
+        if scene_name and job.config.get('scene_name') != scene_name:
+            continue
+        if min_frequency is not None and (frequency is None or frequency < min_frequency):
+            continue
+        if max_frequency is not None and (frequency is None or frequency > max_frequency):
+            continue
+        jobs.append(job)
     
     return jobs
 
@@ -152,58 +519,401 @@ async def get_job(job_id: str):
     if not job_data:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    # Deserialize complex data types
-    if 'config' in job_data:
-        job_data['config'] = json.loads(job_data['config'])
-    if 'result' in job_data and job_data['result'] is not None:
-        job_data['result'] = json.loads(job_data['result'])
-    # Convert progress to int
-    if 'progress' in job_data:
-        job_data['progress'] = int(job_data['progress'])
+    # Results moved to cold storage are read back on demand
+    job = deserialize_job(retention.load_result(job_data))
+    job.profiles = profiles.list_profiles(redis_client, job_id) or None
+    return job
+
+def load_job_result(job_id: str) -> dict:
+    """Parsed result of a job, from the slice cache, Redis or cold storage"""
+    # Only the cache key is read up front: the result itself is fetched on a cache miss
+    job_exists, updated_at = redis_client.hmget(f"job:{job_id}", ["id", "updated_at"])
+    if job_exists is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    def load():
+        result, location = redis_client.hmget(f"job:{job_id}", ["result", "result_location"])
+        return retention.load_result({"result": result, "result_location": location}).get('result')
+
+    return cir_slices.cached_result(job_id, updated_at or '', load)
+
+def step_range(result: dict, start: Optional[int], stop: Optional[int]) -> List[int]:
+    num_steps = len(result)
+    steps = list(range(num_steps))[slice(start, stop)]
+    if not steps:
+        raise HTTPException(status_code=422, detail=f"Empty step range for a job with {num_steps} steps")
+    return steps
+
+@app.get("/jobs/{job_id}/steps")
+def get_job_steps(job_id: str, start: Optional[int] = None, stop: Optional[int] = None):
+    """Number of steps, CIR shape and drone locations of a range of steps, without the CIRs"""
+    result = load_job_result(job_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Job has no results")
+    steps = step_range(result, start, stop)
+    first = cir_slices.step_results(result, steps[0])
+    return {
+        "num_steps": len(result),
+        "shape": first.get('shape'),
+        "dtype": first.get('dtype', 'float16'),
+        "codec": first.get('codec', cir_codecs.RAW_CODEC),
+        "locations": {str(step): result.get(str(step), {}).get('drone_locations') for step in steps},
+    }
+
+@app.get("/jobs/{job_id}/cir")
+def get_job_cir(job_id: str, start: Optional[int] = None, stop: Optional[int] = None,
+                rx: Optional[str] = None, rx_ant: Optional[str] = None,
+                tx: Optional[str] = None, tx_ant: Optional[str] = None,
+                time: Optional[str] = None, taps: Optional[str] = None, part: str = "both"):
+    """Slice of the CIRs of a job as raw little-endian values.
+
+    Each axis takes an index, a "start:stop" range or nothing for all of it.
+    The shape ([parts, steps, rx, rx_ant, tx, tx_ant, time, taps], parts
+    being magnitude then phase) and dtype are sent in the X-Shape and X-Dtype headers.
+    """
+    if part not in cir_slices.CIR_PARTS:
+        raise HTTPException(status_code=422, detail=f"part must be one of {list(cir_slices.CIR_PARTS)}")
+    # Radio-map steps hold path gains read from maps, not CIRs
+    config = json.loads(redis_client.hget(f"job:{job_id}", "config") or '{}')
+    if config.get('mode') == "radio_map":
+        raise HTTPException(status_code=422, detail="Radio-map jobs have no CIRs")
+    result = load_job_result(job_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Job has no results")
+    steps = step_range(result, start, stop)
+    try:
+        shape = cir_slices.step_results(result, steps[0]).get('shape')
+        if not shape:
+            raise HTTPException(status_code=422, detail=f"Step {steps[0]} has no CIR")
+        requested = dict(zip(cir_slices.CIR_AXES, (rx, rx_ant, tx, tx_ant, time, taps)))
+        selection = {
+            axis: cir_slices.parse_selection(requested[axis], size, axis)
+            for axis, size in zip(cir_slices.CIR_AXES, shape)
+        }
+        content, out_shape, dtype = cir_slices.slice_cir(result, steps, selection, part)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     
-    return Job(**job_data)
+    return Response(content=content, media_type="application/octet-stream", headers={
+        "X-Shape": ",".join(str(size) for size in out_shape),
+        "X-Dtype": dtype,
+        "X-Parts": ",".join(cir_slices.CIR_PARTS[part]),
+    })
+
+def store_metrics(job_id: str, result: dict):
+    """Keep the link metrics of a finished job next to it, so they outlive offloaded results"""
+    redis_client.set(f"job:{job_id}:metrics", json.dumps(job_metrics.metrics_table(result)))
+
+@app.get("/jobs/{job_id}/metrics")
+def get_job_metrics(job_id: str, names: Optional[str] = None, start: Optional[int] = None,
+                    stop: Optional[int] = None, tx: Optional[int] = None, rx: Optional[int] = None):
+    """Per-step link metrics (path loss, delay spread, K-factor, ...) of a job.
+
+    `names` is a comma separated subset of metrics. With `tx` and `rx` every
+    metric is a time series of that link, otherwise of [rx][tx] matrices.
+    """
+    if (tx is None) != (rx is None):
+        raise HTTPException(status_code=422, detail="tx and rx must be given together")
+    if tx is not None and (tx < 0 or rx < 0):
+        raise HTTPException(status_code=422, detail="tx and rx must be non-negative")
+    stored = redis_client.get(f"job:{job_id}:metrics")
+    # Jobs still running are summarized from their partial result
+    table = json.loads(stored) if stored else job_metrics.metrics_table(load_job_result(job_id))
+    try:
+        return job_metrics.select_metrics(table, names.split(",") if names else None, start, stop, tx, rx)
+    except KeyError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IndexError:
+        raise HTTPException(status_code=422, detail="tx or rx is out of range")
+
+@app.post("/jobs/{job_id}/profiles")
+async def upload_profile(job_id: str, profile: dict, shard_index: Optional[int] = None):
+    """Attach the profile of a profiled run (a job or one of its shards) to the job"""
+    if not redis_client.exists(f"job:{job_id}"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return profiles.store_profile(redis_client, job_id, shard_index, profile)
+
+@app.get("/jobs/{job_id}/profiles")
+async def get_job_profiles(job_id: str):
+    """Links to the profiles of a job"""
+    if not redis_client.exists(f"job:{job_id}"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return profiles.list_profiles(redis_client, job_id)
+
+@app.get("/jobs/{job_id}/profiles/{name}")
+def download_profile(job_id: str, name: str):
+    """Download a profile as JSON (sent gzip-encoded, as stored)"""
+    path = profiles.profile_path(job_id, name)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", headers={
+        "Content-Encoding": "gzip",
+        "Content-Disposition": f'attachment; filename="profile-{name}.json"',
+    })
 
 @app.put("/jobs/{job_id}")
 async def update_job(job_id: str, update_data: JobStatusUpdate):
     """Update job status"""
     # Check if job exists
-    if not redis_client.exists(f"job:{job_id}"):
+    job_data = redis_client.hgetall(f"job:{job_id}")
+    if not job_data:
         raise HTTPException(status_code=404, detail="Job not found")
     
+    # Updates from a simulator still running a cancelled job are dropped
+    if job_control(job_data) == "cancel":
+        return {"message": "Job was cancelled", "control": "cancel"}
+    
     # Update job data
     update_dict = update_data.dict()
     update_dict['updated_at'] = datetime.now().isoformat()
+    update_dict.pop('checkpoint', None)
     
-    # Serialize complex data types
-    if 'result' in update_dict and update_dict['result'] is not None:
-        update_dict['result'] = json.dumps(update_dict['result'])
-    elif 'result' in update_dict:
-        # Remove the result field if it's None to avoid Redis errors
-        del update_dict['result']
+    # Serialize complex data types, removing unset fields to avoid Redis errors
+    for key in ('result', 'stats'):
+        if update_dict.get(key) is not None:
+            update_dict[key] = json.dumps(update_dict[key])
+        else:
+            update_dict.pop(key, None)
     
     redis_client.hset(f"job:{job_id}", mapping=update_dict)
+    if update_data.status == "completed" and update_data.result is not None:
+        store_metrics(job_id, update_data.result)
+    if update_data.status in retention.RETENTION_SECONDS:
+        retention.job_finished(redis_client, job_id, update_data.status, update_dict.get('result'))
+    
+    # Measured step timings calibrate the cost estimates of future jobs
+    if update_data.stats and update_data.stats.get('mean_step_seconds'):
+        config = json.loads(job_data['config'])
+        cost_model.record_step_timing(redis_client, config, update_data.stats['mean_step_seconds'])
+    
+    return {"message": "Job updated successfully", "control": "continue"}
+
+@app.put("/jobs/{job_id}/shards/{shard_index}")
+async def update_shard(job_id: str, shard_index: int, update_data: JobStatusUpdate):
+    """Update the status of one shard and aggregate it into its job"""
+    job_data = redis_client.hgetall(f"job:{job_id}")
+    shard_data = redis_client.hget(f"job:{job_id}:shards", shard_index)
+    if not job_data or shard_data is None:
+        raise HTTPException(status_code=404, detail="Shard not found")
+    
+    shard = Shard(**json.loads(shard_data))
+    # Updates from a simulator still running a cancelled job are dropped
+    if job_control(job_data) == "cancel":
+        return {"message": "Job was cancelled", "control": "cancel"}
+    
+    # A final report retried after a lost response is acknowledged without applying it twice
+    if shard.status == "completed":
+        return {"message": "Shard already completed", "control": "continue"}
+    
+    renew_lease(shard.worker_id)
+    if shard.worker_id and update_data.status != "processing":
+        redis_client.srem(f"worker:{shard.worker_id}:claims", f"{job_id}#{shard_index}")
+    
+    config = json.loads(job_data['config'])
+    if update_data.stats and update_data.stats.get('mean_step_seconds'):
+        cost_model.record_step_timing(redis_client, config, update_data.stats['mean_step_seconds'])
+    if update_data.result is not None:
+        store_shard_result(job_id, shard_index, update_data.result)
+    
+    # A paused shard keeps its partial results and is queued again from its checkpoint
+    if update_data.status == "paused":
+        shard.status = "pending"
+        shard.progress = update_data.progress
+        shard.preempt = False
+        shard.worker_id = None
+        shard.resume = (update_data.checkpoint or {}).get('resume', shard.resume)
+        shard.stats = combine_stats(shard.stats, update_data.stats)
+        enqueue_shard(redis_client, deserialize_job(dict(job_data)), shard)
+        return {"message": "Shard paused and requeued", "control": "preempt"}
+    
+    shard.status = update_data.status
+    shard.progress = update_data.progress
+    if update_data.stats:
+        shard.stats = combine_stats(shard.stats, update_data.stats)
+    redis_client.hset(f"job:{job_id}:shards", shard_index, json.dumps(shard.dict()))
+    
+    # Job progress is the step-weighted progress of all its shards
+    shards = get_shards(job_id)
+    total_steps = sum(s.stop - s.start for s in shards)
+    progress = sum(s.progress * (s.stop - s.start) for s in shards) // max(total_steps, 1)
+    # A single failed shard fails the whole job
+    failed = update_data.status == "failed" or job_data.get('status') == "failed"
+    job_update = {
+        "status": "failed" if failed else "processing",
+        "progress": progress,
+        "updated_at": datetime.now().isoformat()
+    }
     
-    return {"message": "Job updated successfully"}
+    # The shard completing last merges all outputs into the final result
+    if all(s.status == "completed" for s in shards) and \
+            redis_client.set(f"job:{job_id}:merged", 1, nx=True):
+        result = merge_shards(job_id, shards)
+        store_metrics(job_id, result)
+        job_update.update({
+            "status": "completed",
+            "progress": 100,
+            "result": json.dumps(result),
+            "stats": json.dumps({
+                **combine_stats(*[s.stats for s in shards]),
+                "shards": len(shards),
+            })
+        })
+        pipe = redis_client.pipeline()
+        pipe.hset(f"job:{job_id}", mapping=job_update)
+        for s in shards:
+            pipe.delete(f"job:{job_id}:shard:{s.index}:result")
+        pipe.execute()
+        retention.job_finished(redis_client, job_id, "completed", job_update['result'])
+    else:
+        redis_client.hset(f"job:{job_id}", mapping=job_update)
+        if failed and job_data.get('status') != "failed":
+            retention.job_finished(redis_client, job_id, "failed")
+    
+    return {"message": "Shard updated successfully", "control": job_control(job_data, shard)}
+
+@app.get("/jobs/{job_id}/control")
+async def get_job_control(job_id: str, shard_index: Optional[int] = None):
+    """Instruction for a simulator between solver runs, without updating the job"""
+    job_data = redis_client.hgetall(f"job:{job_id}")
+    if not job_data:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    shard = None
+    if shard_index is not None:
+        shard_data = redis_client.hget(f"job:{job_id}:shards", shard_index)
+        shard = Shard(**json.loads(shard_data)) if shard_data else None
+        renew_lease(shard and shard.worker_id)
+    return {"control": job_control(job_data, shard)}
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a job, stopping its simulation at the next step boundary"""
+    if not redis_client.exists(f"job:{job_id}"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    # Running simulators are told to stop on their next progress update
+    redis_client.hset(f"job:{job_id}", mapping={
+        "status": "cancelled",
+        "updated_at": datetime.now().isoformat()
+    })
+    # Its queued shards leave the pending queues, so they never count as waiting
+    retention.dequeue_shards(redis_client, job_id)
+    shard_results = redis_client.scan_iter(match=f"job:{job_id}:shard:*:result")
+    redis_client.delete(f"job:{job_id}:merged", *shard_results)
+    retention.job_finished(redis_client, job_id, "cancelled")
+    
+    return {"message": "Job cancelled successfully"}
+
+@app.post("/jobs/{job_id}/preempt")
+async def preempt_job(job_id: str):
+    """Pause the running shards of a job at the next step boundary and queue them again"""
+    if not redis_client.exists(f"job:{job_id}"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    preempted = 0
+    for shard in get_shards(job_id):
+        if shard.status == "processing":
+            shard.preempt = True
+            redis_client.hset(f"job:{job_id}:shards", shard.index, json.dumps(shard.dict()))
+            preempted += 1
+    
+    return {"message": f"Preempting {preempted} running shard(s)"}
+
+@app.post("/retention/run")
+async def run_retention():
+    """Apply the retention policy now instead of waiting for the next lazy run"""
+    return retention.enforce_retention(redis_client, force=True)
+
+@app.post("/workers/{worker_id}/release")
+async def release_worker_claims(worker_id: str):
+    """Queue again the unfinished shards of a worker that exited"""
+    released = release_worker(worker_id)
+    return {"message": f"Released {released} shard(s)"}
 
 @app.delete("/jobs/{job_id}")
 async def delete_job(job_id: str):
-    """Delete a specific job"""
+    """Delete a specific job (a simulator still running it stops on its next update)"""
     # Check if job exists
     if not redis_client.exists(f"job:{job_id}"):
         raise HTTPException(status_code=404, detail="Job not found")
     
-    # Remove job from jobs list
-    redis_client.lrem("jobs", 0, job_id)
-    
-    # Delete job data
-    redis_client.delete(f"job:{job_id}")
+    # Delete job data, including its shards and any result offloaded to disk
+    retention.delete_job_data(redis_client, job_id)
     
     return {"message": "Job deleted successfully"}
 
+@app.on_event("startup")
+def register_pending_queues():
+    """Register the pending queues created before the queue registry existed"""
+    for key in redis_client.scan_iter(match="pending:*"):
+        redis_client.sadd(retention.PENDING_QUEUES, key)
+
+@app.on_event("startup")
+def index_models():
+    """Hash and precompress the models before the first request needs them"""
+    model_catalog.list_models()
+
 @app.get("/models")
-async def list_models():
+def list_models():
     """List available 3D models"""
-    return get_model_folders()
+    return model_catalog.list_models()
+
+def _read_range(path: str, start: int, stop: int, chunk_size: int = 1 << 16):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+@app.api_route("/3d_models/{asset_path:path}", methods=["GET", "HEAD"])
+def get_model_asset(asset_path: str, request: Request):
+    """Serve a model file with ETag/immutable caching, precompressed variants and byte ranges"""
+    path = model_catalog.resolve_asset(asset_path)
+    if path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    sha256 = model_catalog.file_hash(path)
+    etag = f'"{sha256[:16]}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Vary": "Accept-Encoding"}
+    # Versioned URLs (as listed by GET /models) never change content
+    if request.query_params.get("v") == sha256[:16]:
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        headers["Cache-Control"] = "public, max-age=0, must-revalidate"
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    size = os.path.getsize(path)
+    range_header = request.headers.get("range")
+    if range_header:
+        # Ranges are always served from the uncompressed file
+        byte_range = model_catalog.parse_range(range_header, size)
+        if byte_range is None:
+            raise HTTPException(status_code=416, detail="Invalid range",
+                                headers={"Content-Range": f"bytes */{size}"})
+        start, last = byte_range
+        headers.update({"Content-Range": f"bytes {start}-{last}/{size}",
+                        "Content-Length": str(last - start + 1)})
+        body = _read_range(path, start, last + 1) if request.method == "GET" else iter(())
+        return StreamingResponse(body, status_code=206, headers=headers,
+                                 media_type=model_catalog.media_type(path))
+
+    media_type = model_catalog.media_type(path)
+    accepted = request.headers.get("accept-encoding", "")
+    variants = model_catalog.compressed_variants(path, sha256)
+    for encoding in ("br", "gzip"):
+        if encoding in variants and encoding in accepted:
+            headers["Content-Encoding"] = encoding
+            return FileResponse(variants[encoding], headers=headers, media_type=media_type,
+                                method=request.method)
+    return FileResponse(path, headers=headers, media_type=media_type, method=request.method)
 
 if __name__ == "__main__":
     import uvicorn
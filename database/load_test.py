@@ -0,0 +1,283 @@
+"""Offline load test of the job queue and the worker pipeline.
+
+Runs the job queue app in-process (FastAPI TestClient, no network) against an
+in-process Redis stand-in (fakeredis) or a local Redis server, with a stub
+simulator that answers claimed shards with step results of the real format:
+
+    python load_test.py --clients 8 --duration 30 --drones 8 --steps 20
+    python load_test.py --redis-url redis://localhost:6379/15 --output baseline.json
+
+Every client repeatedly picks an operation from the --mix weights:
+create (POST /jobs), list (GET /jobs), get (GET /jobs/{id}), update (claim a
+shard and complete it with results, as a simulation worker does) and delete
+(DELETE /jobs/{id}). The report has, per endpoint, the p50/p99 latency,
+throughput, errors and request/response payload bytes. Redis memory is
+reported for the whole run, before and after it, not per endpoint: INFO's
+used_memory with a server, an estimate from the stored values with fakeredis.
+
+fakeredis is only needed by this script: pip install fakeredis
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Offloaded results go to a scratch directory, never to the service's volume
+os.environ.setdefault("RESULTS_DIR", tempfile.mkdtemp(prefix="load_test_results_"))
+
+import cir_codecs
+import job_queue
+
+DEFAULT_MIX = "create=2,list=1,get=4,update=3,delete=1"
+# Taps of the CIR window used by the simulation service (l_min=-3 .. l_max=47)
+NUM_TAPS = 51
+
+
+def make_redis(redis_url: Optional[str]):
+    """Redis client for the run: a local server when a URL is given, else fakeredis"""
+    import redis
+    if redis_url:
+        client = redis.Redis.from_url(redis_url, decode_responses=True)
+        client.flushdb()
+        return client
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit("Install fakeredis (pip install fakeredis) or pass --redis-url of a local Redis")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+def redis_memory(client, server: bool) -> Dict[str, int]:
+    """Memory used by Redis: as reported by the server, or estimated from the stored values for fakeredis"""
+    if server:
+        # INFO only: reading every key does not scale to the databases a server run targets
+        info = client.info("memory")
+        return {"used_memory": int(info["used_memory"]), "keys": int(client.dbsize())}
+    estimated = 0
+    for key in client.scan_iter():
+        kind = client.type(key)
+        if kind == "string":
+            values = [client.get(key) or ""]
+        elif kind == "hash":
+            values = [item for pair in client.hgetall(key).items() for item in pair]
+        elif kind == "list":
+            values = client.lrange(key, 0, -1)
+        elif kind == "set":
+            values = list(client.smembers(key))
+        elif kind == "zset":
+            values = [member for member, _ in client.zrange(key, 0, -1, withscores=True)]
+        else:
+            values = []
+        estimated += len(key) + sum(len(str(value)) for value in values)
+    return {"estimated_bytes": estimated, "keys": int(client.dbsize())}
+
+def job_config(drones: int, steps: int, codec: dict) -> dict:
+    """Config of a job as submitted by the frontend"""
+    return {
+        "job_id": str(uuid.uuid4()),
+        "scene_name": "load_test",
+        "simulation_steps": steps,
+        "move_together": True,
+        "antenna_configs": {"num_rows": 1, "num_cols": 1, "pattern": "iso", "polarization": "H"},
+        "radio_configs": {"frequency": 6e9, "bandwidth": 500e6},
+        "drones": [{"location": [10.0 * i, 0.0, 30.0], "has_motion": False} for i in range(drones)],
+        "codec": codec,
+    }
+
+def stub_results(config: dict, start: int, stop: int, seed: int = 0) -> dict:
+    """Results of steps [start, stop) in the format the simulation service reports"""
+    rng = np.random.default_rng(seed)
+    num_drones = len(config["drones"])
+    encoder = cir_codecs.CirEncoder(config.get("codec"))
+    results = {}
+    for step in range(start, stop):
+        # Energy-normalized taps decaying over the window, [rx, rx_ant, tx, tx_ant, time, taps]
+        shape = (num_drones, 1, num_drones, 1, 1, NUM_TAPS)
+        cir = (rng.normal(size=shape) + 1j * rng.normal(size=shape)) * np.exp(-np.arange(NUM_TAPS) / 6)
+        cir /= np.sqrt(np.sum(np.abs(cir) ** 2, axis=-1, keepdims=True))
+        metrics = {
+            name: np.round(rng.uniform(0, 100, (num_drones, num_drones)), 3).tolist()
+            for name in ("path_loss_db", "mean_excess_delay_ns", "rms_delay_spread_ns",
+                         "k_factor_db", "los", "coherence_bandwidth_mhz")
+        }
+        step_results = encoder.encode(cir.astype(np.complex64), step)
+        step_results["shape"] = list(step_results["shape"])
+        results[str(step)] = {
+            "drone_locations": [drone["location"] for drone in config["drones"]],
+            "step_results": {
+                **step_results,
+                "num_drones": num_drones,
+                "scene_name": config["scene_name"],
+                "metrics": metrics,
+            },
+        }
+    return results
+
+
+class LoadTest:
+    """Clients sharing the in-process app, the known job ids and the measurements"""
+
+    def __init__(self, drones: int, steps: int, codec: dict, mix: Dict[str, float]):
+        self.drones, self.steps, self.codec = drones, steps, codec
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.job_ids: List[str] = []
+        self.lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.request_bytes: Dict[str, int] = defaultdict(int)
+        self.response_bytes: Dict[str, int] = defaultdict(int)
+        self._local = threading.local()
+
+    def _client(self):
+        # One TestClient and event loop per client thread
+        if not hasattr(self._local, "client"):
+            from fastapi.testclient import TestClient
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            self._local.client = TestClient(job_queue.app)
+        return self._local.client
+
+    def _call(self, endpoint: str, method: str, url: str, body: Optional[dict] = None):
+        payload = json.dumps(body).encode() if body is not None else None
+        start = time.perf_counter()
+        response = self._client().request(method, url, data=payload,
+                                          headers={"Content-Type": "application/json"} if payload else None)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.samples[endpoint].append(elapsed)
+            self.request_bytes[endpoint] += len(payload or b"")
+            self.response_bytes[endpoint] += len(response.content)
+            if response.status_code >= 400:
+                self.errors[endpoint] += 1
+        return response
+
+    def _random_job(self) -> Optional[str]:
+        with self.lock:
+            return random.choice(self.job_ids) if self.job_ids else None
+
+    def create(self):
+        config = job_config(self.drones, self.steps, self.codec)
+        response = self._call("POST /jobs", "POST", "/jobs", {"config": config})
+        if response.status_code == 200:
+            with self.lock:
+                self.job_ids.append(config["job_id"])
+
+    def list(self):
+        self._call("GET /jobs", "GET", "/jobs")
+
+    def get(self):
+        job_id = self._random_job()
+        if job_id:
+            self._call("GET /jobs/{id}", "GET", f"/jobs/{job_id}")
+
+    def update(self):
+        """Claim a shard and complete it with stub results, as a simulation worker does"""
+        worker_id = f"load-test-{threading.get_ident()}"
+        response = self._call("POST /jobs/claim", "POST", "/jobs/claim", {"worker_id": worker_id})
+        if response.status_code != 200:
+            return
+        claim = response.json()
+        job, shard = claim["job"], claim["shard"]
+        url = f"/jobs/{job['id']}/shards/{shard['index']}"
+        self._call("PUT /jobs/{id}/shards/{i}", "PUT", url, {"status": "processing", "progress": 50})
+        results = stub_results(job["config"], shard["start"], shard["stop"], seed=shard["index"])
+        self._call("PUT /jobs/{id}/shards/{i}", "PUT", url, {
+            "status": "completed", "progress": 100, "result": results,
+            "stats": {"steps": shard["stop"] - shard["start"], "mean_step_seconds": 0.0, "peak_rss_mb": 0},
+        })
+
+    def delete(self):
+        with self.lock:
+            job_id = self.job_ids.pop(random.randrange(len(self.job_ids))) if self.job_ids else None
+        if job_id:
+            self._call("DELETE /jobs/{id}", "DELETE", f"/jobs/{job_id}")
+
+    def run_client(self, deadline: float, seed: int):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            getattr(self, rng.choices(self.operations, self.weights)[0])()
+
+    def report(self, seconds: float) -> dict:
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = np.array(samples) * 1000
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": self.errors[endpoint],
+                "throughput_per_s": len(samples) / seconds,
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "mean_request_bytes": self.request_bytes[endpoint] / len(samples),
+                "mean_response_bytes": self.response_bytes[endpoint] / len(samples),
+            }
+        return endpoints
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in ("create", "list", "get", "update", "delete"):
+            raise argparse.ArgumentTypeError(f"Unknown operation '{name}'")
+        mix[name] = float(weight or 1)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of traffic")
+    parser.add_argument("--drones", type=int, default=4, help="Drones per job (result size grows with its square)")
+    parser.add_argument("--steps", type=int, default=10, help="Steps per job")
+    parser.add_argument("--codec", type=json.loads, default={}, help='CIR codec of the results, e.g. \'{"compression": "zstd"}\'')
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help="Operation weights")
+    parser.add_argument("--preload", type=int, default=20, help="Jobs created before the measured run")
+    parser.add_argument("--redis-url", help="Use this local Redis server (its database is flushed) instead of fakeredis")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    job_queue.redis_client = make_redis(args.redis_url)
+    test = LoadTest(args.drones, args.steps, args.codec, args.mix)
+    for _ in range(args.preload):
+        test.create()
+    test.samples.clear()
+    memory_before = redis_memory(job_queue.redis_client, bool(args.redis_url))
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        for future in [executor.submit(test.run_client, deadline, seed) for seed in range(args.clients)]:
+            future.result()
+    seconds = time.perf_counter() - start
+
+    report = {
+        "clients": args.clients,
+        "seconds": seconds,
+        "drones": args.drones,
+        "steps": args.steps,
+        "codec": cir_codecs.make_codec(args.codec),
+        "redis": "server" if args.redis_url else "fakeredis",
+        "redis_memory_before": memory_before,
+        "redis_memory_after": redis_memory(job_queue.redis_client, bool(args.redis_url)),
+        "endpoints": test.report(seconds),
+    }
+    print(f"{'endpoint':<28}{'requests':>9}{'errors':>7}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'req B':>10}{'resp B':>11}")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:<28}{stats['requests']:>9}{stats['errors']:>7}{stats['throughput_per_s']:>9.1f}"
+              f"{stats['p50_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['mean_request_bytes']:>10.0f}"
+              f"{stats['mean_response_bytes']:>11.0f}")
+    print(f"Redis memory: {report['redis_memory_before']} -> {report['redis_memory_after']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import web_lods
+
+try:
+    import brotli
+except ImportError:  # brotli variants are skipped, gzip is always available
+    brotli = None
+
+MODELS_DIR = os.getenv("MODELS_DIR", "/app/3d_models")
+# Precompressed variants, keyed by content hash so they survive renames and restarts
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", "/app/asset_cache")
+
+# Formats worth compressing (images are already compressed)
+COMPRESSIBLE_EXTENSIONS = ('.glb', '.gltf', '.bin', '.ply', '.obj', '.xml', '.json')
+PREVIEW_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+# Variants are only kept when they save at least this fraction of the size
+MIN_COMPRESSION_SAVING = 0.1
+
+_lock = threading.Lock()
+_index: Dict[str, dict] = {}
+_index_stamp: Optional[Tuple] = None
+# (path, size, mtime) -> sha256, so unchanged files are never hashed twice
+_file_hashes: Dict[Tuple[str, int, int], str] = {}
+
+
+def _directory_stamp() -> Optional[Tuple]:
+    """Modification times of the models directory and of every model folder"""
+    try:
+        entries = list(os.scandir(MODELS_DIR))
+    except FileNotFoundError:
+        return None
+    return (os.stat(MODELS_DIR).st_mtime_ns,) + tuple(sorted(
+        (entry.name, entry.stat().st_mtime_ns) for entry in entries
+        if entry.is_dir() and not entry.name.startswith('.')
+    ))
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file, cached by path, size and modification time"""
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+def _write_variant(path: str, target: str, encoding: str):
+    # Written to a temporary file and renamed, so a half-written variant is never served
+    staging = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(path, "rb") as src:
+        if encoding == "gzip":
+            with gzip.open(staging, "wb", compresslevel=9) as dst:
+                shutil.copyfileobj(src, dst)
+        else:
+            with open(staging, "wb") as dst:
+                dst.write(brotli.compress(src.read(), quality=11))
+    if os.path.getsize(staging) > os.path.getsize(path) * (1 - MIN_COMPRESSION_SAVING):
+        # Not worth it; an empty marker records that this file was tried
+        open(staging, "wb").close()
+    os.replace(staging, target)
+
+def compressed_variants(path: str, sha256: str) -> Dict[str, str]:
+    """Precompressed variants of a file by content encoding, generating them if missing"""
+    if not path.endswith(COMPRESSIBLE_EXTENSIONS):
+        return {}
+    os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+    variants = {}
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if encoding == "br" and brotli is None:
+            continue
+        target = os.path.join(ASSET_CACHE_DIR, sha256 + suffix)
+        if not os.path.exists(target):
+            _write_variant(path, target, encoding)
+        if os.path.getsize(target) > 0:
+            variants[encoding] = target
+    return variants
+
+def _describe_file(folder: str, filename: str) -> dict:
+    path = os.path.join(MODELS_DIR, folder, filename)
+    sha256 = file_hash(path)
+    compressed_variants(path, sha256)
+    return {
+        "file": filename,
+        "size": os.path.getsize(path),
+        "sha256": sha256,
+        # Versioned URL, served with immutable caching headers
+        "path": f"/3d_models/{folder}/{filename}?v={sha256[:16]}",
+    }
+
+def _index_model(folder: str) -> Optional[dict]:
+    files = sorted(os.listdir(os.path.join(MODELS_DIR, folder)))
+    glb_files = [f for f in files if f.endswith('.glb')]
+    if not glb_files:
+        return None
+    model = _describe_file(folder, glb_files[0])
+    previews = [f for f in files if f.lower().endswith(PREVIEW_EXTENSIONS)]
+
+    model_dir = os.path.join(MODELS_DIR, folder)
+    # Missing web levels are built in the background; the index is rebuilt once they exist
+    web_lods.schedule_lods(model_dir, glb_files[0], model["sha256"], invalidate)
+    lods = [dict(_describe_file(folder, lod["file"]), level=lod["level"])
+            for lod in web_lods.existing_lods(model_dir, model["sha256"])]
+    lods.append(dict(model, level="full"))
+    return {
+        "name": folder,
+        "folder": folder,
+        "glb_file": glb_files[0],
+        "path": model["path"],
+        "size": model["size"],
+        "sha256": model["sha256"],
+        "preview": _describe_file(folder, previews[0])["path"] if previews else None,
+        # Coarsest first, so clients can show a level while loading the next one
+        "lods": lods,
+    }
+
+def invalidate():
+    """Forces the next list_models call to rebuild the index"""
+    global _index_stamp
+    with _lock:
+        _index_stamp = None
+
+def list_models() -> List[dict]:
+    """Models with a .glb file, rebuilt only when the models directory changes"""
+    global _index, _index_stamp
+    with _lock:
+        stamp = _directory_stamp()
+        if stamp != _index_stamp:
+            index = {}
+            for folder, _ in (stamp or ())[1:]:
+                model = _index_model(folder)
+                if model:
+                    index[folder] = model
+            _index, _index_stamp = index, stamp
+        return list(_index.values())
+
+def media_type(path: str) -> str:
+    """Content type of a model file"""
+    if path.endswith('.glb'):
+        return "model/gltf-binary"
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+def resolve_asset(relative_path: str) -> Optional[str]:
+    """Absolute path of a file inside the models directory, or None if outside or missing"""
+    root = os.path.realpath(MODELS_DIR)
+    path = os.path.realpath(os.path.join(root, relative_path))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive byte range of a single-range "bytes=" header, or None if unsatisfiable"""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    try:
+        if not start:
+            # Suffix range: the last N bytes
+            length = int(end)
+            return (max(size - length, 0), size - 1) if length > 0 and size else None
+        first = int(start)
+        last = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+    return (first, last) if first <= last else None
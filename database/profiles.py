@@ -0,0 +1,49 @@
+import gzip
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import List, Optional
+from urllib.parse import quote
+
+# Profiles of jobs run with `profile: true`, stored as gzipped JSON, one directory per job
+PROFILES_DIR = os.getenv("PROFILES_DIR", "/app/jobs/profiles")
+
+
+def profile_name(shard_index: Optional[int]) -> str:
+    return "job" if shard_index is None else f"shard-{shard_index}"
+
+def profile_dir(job_id: str) -> str:
+    return os.path.join(PROFILES_DIR, quote(job_id, safe=''))
+
+def profile_path(job_id: str, name: str) -> str:
+    return os.path.join(profile_dir(job_id), f"{quote(name, safe='')}.json.gz")
+
+def store_profile(redis_client, job_id: str, shard_index: Optional[int], profile: dict) -> dict:
+    """Write a profile to disk and link it from its job, replacing an earlier profile of the same shard"""
+    name = profile_name(shard_index)
+    path = profile_path(job_id, name)
+    os.makedirs(profile_dir(job_id), exist_ok=True)
+    # Written to a temporary file and renamed, so a download never sees a partial file
+    with gzip.open(f"{path}.tmp", "wt", encoding="utf-8") as f:
+        json.dump(profile, f)
+    os.replace(f"{path}.tmp", path)
+
+    link = {
+        "name": name,
+        "shard_index": shard_index,
+        "url": f"/jobs/{quote(job_id, safe='')}/profiles/{name}",
+        "bytes": os.path.getsize(path),
+        "seconds": profile.get("seconds"),
+        "created_at": datetime.now().isoformat(),
+    }
+    redis_client.hset(f"job:{job_id}:profiles", name, json.dumps(link))
+    return link
+
+def list_profiles(redis_client, job_id: str) -> List[dict]:
+    links = [json.loads(link) for link in redis_client.hvals(f"job:{job_id}:profiles")]
+    return sorted(links, key=lambda link: (link["shard_index"] is not None, link["shard_index"] or 0))
+
+def delete_profiles(job_id: str):
+    """Delete the profile files of a job (its links go with the job's Redis keys)"""
+    shutil.rmtree(profile_dir(job_id), ignore_errors=True)
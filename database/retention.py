@@ -0,0 +1,128 @@
+import gzip
+import os
+import time
+from typing import Optional
+from urllib.parse import quote
+
+import profiles
+
+# Offloaded results are stored here as gzipped JSON, one file per job
+RESULTS_DIR = os.getenv("RESULTS_DIR", "/app/jobs/results")
+
+# Seconds a finished job is kept after it ends, by status (0 keeps it forever)
+RETENTION_SECONDS = {
+    "completed": float(os.getenv("RETENTION_COMPLETED_SECONDS", 30 * 24 * 3600)),
+    "failed": float(os.getenv("RETENTION_FAILED_SECONDS", 7 * 24 * 3600)),
+    "cancelled": float(os.getenv("RETENTION_CANCELLED_SECONDS", 24 * 3600)),
+}
+
+# Results move from Redis to disk once they are this old, or oldest first
+# while the results kept in Redis add up to more than MAX_REDIS_RESULT_MB
+OFFLOAD_AFTER_SECONDS = float(os.getenv("OFFLOAD_AFTER_SECONDS", 3600))
+MAX_REDIS_RESULT_BYTES = int(float(os.getenv("MAX_REDIS_RESULT_MB", 512)) * 2**20)
+
+# Retention is enforced lazily, at most once per interval across all API processes
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", 60))
+
+
+# Set of the pending shard queues ("pending:<size class>:<affinity>"), so they
+# are found without scanning the keyspace; job_queue.enqueue_shard registers them
+PENDING_QUEUES = "queues:pending"
+
+
+def result_path(job_id: str) -> str:
+    """File an offloaded job result is stored in"""
+    return os.path.join(RESULTS_DIR, f"{quote(job_id, safe='')}.json.gz")
+
+def job_finished(redis_client, job_id: str, status: str, result: Optional[str] = None):
+    """Start the retention clock of a job that reached a final status"""
+    now = time.time()
+    ttl = RETENTION_SECONDS.get(status, 0)
+    if ttl > 0:
+        redis_client.zadd("retention:expiry", {job_id: now + ttl})
+    if result is not None:
+        # Results held in Redis, by completion time, with their size
+        redis_client.zadd("retention:results", {job_id: now})
+        redis_client.hset("retention:result_bytes", job_id, len(result))
+
+def offload_result(redis_client, job_id: str) -> int:
+    """Move a job result from Redis to disk, returning the number of bytes freed"""
+    result = redis_client.hget(f"job:{job_id}", "result")
+    pipe = redis_client.pipeline()
+    pipe.zrem("retention:results", job_id)
+    pipe.hdel("retention:result_bytes", job_id)
+    if result is None:
+        pipe.execute()
+        return 0
+
+    path = result_path(job_id)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    # Written to a temporary file and renamed, so a reader never sees a partial file
+    with gzip.open(f"{path}.tmp", "wt", encoding="utf-8") as f:
+        f.write(result)
+    os.replace(f"{path}.tmp", path)
+
+    pipe.hset(f"job:{job_id}", mapping={"result_location": path, "result_bytes": len(result)})
+    pipe.hdel(f"job:{job_id}", "result")
+    pipe.execute()
+    return len(result)
+
+def load_result(job_data: dict) -> dict:
+    """Job hash with its result read back from disk if it was offloaded"""
+    path = job_data.get('result_location')
+    if path and job_data.get('result') is None and os.path.exists(path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            job_data['result'] = f.read()
+    return job_data
+
+def dequeue_shards(redis_client, job_id: str):
+    """Remove the queued shards of a job from the pending queues"""
+    members = [f"{job_id}#{shard_index}" for shard_index in redis_client.hkeys(f"job:{job_id}:shards")]
+    if not members:
+        return
+    for key in redis_client.smembers(PENDING_QUEUES):
+        redis_client.zrem(key, *members)
+
+def delete_job_data(redis_client, job_id: str):
+    """Delete a job, its shards, its retention entries, its offloaded result and its profiles"""
+    dequeue_shards(redis_client, job_id)
+    pipe = redis_client.pipeline()
+    pipe.lrem("jobs", 0, job_id)
+    pipe.delete(f"job:{job_id}", *redis_client.scan_iter(match=f"job:{job_id}:*"))
+    pipe.zrem("retention:expiry", job_id)
+    pipe.zrem("retention:results", job_id)
+    pipe.hdel("retention:result_bytes", job_id)
+    pipe.execute()
+    if os.path.exists(result_path(job_id)):
+        os.remove(result_path(job_id))
+    profiles.delete_profiles(job_id)
+
+def enforce_retention(redis_client, force: bool = False) -> dict:
+    """Delete expired jobs and offload old results until Redis is within its budget"""
+    if not force and not redis_client.set("retention:lock", 1, nx=True, ex=RETENTION_INTERVAL_SECONDS):
+        return {}
+    now = time.time()
+
+    expired = redis_client.zrangebyscore("retention:expiry", 0, now)
+    for job_id in expired:
+        delete_job_data(redis_client, job_id)
+
+    offloaded, freed = 0, 0
+    for job_id in redis_client.zrangebyscore("retention:results", 0, now - OFFLOAD_AFTER_SECONDS):
+        freed += offload_result(redis_client, job_id)
+        offloaded += 1
+
+    stored = sum(int(size) for size in redis_client.hvals("retention:result_bytes"))
+    while stored > MAX_REDIS_RESULT_BYTES:
+        oldest = redis_client.zrange("retention:results", 0, 0)
+        if not oldest:
+            break
+        size = offload_result(redis_client, oldest[0])
+        stored -= size
+        freed += size
+        offloaded += 1
+
+    if expired or offloaded:
+        print(f"Retention: deleted {len(expired)} expired job(s), "
+              f"offloaded {offloaded} result(s) ({freed / 2**20:.1f} MB)")
+    return {"deleted": len(expired), "offloaded": offloaded, "freed_bytes": freed}
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The database service's modules are imported by name, as in its container
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
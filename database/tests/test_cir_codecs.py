@@ -0,0 +1,122 @@
+"""Round trips of the CIR codecs: encode -> decode_step and encode -> cir_slices.slice_cir."""
+import json
+
+import numpy as np
+import pytest
+
+import cir_codecs
+import cir_slices
+
+# [rx, rx_ant, tx, tx_ant, time, taps], as stored by the simulation service
+SHAPE = (3, 2, 3, 1, 1, 51)
+NUM_STEPS = 8
+SPARSE_THRESHOLD = 0.05
+
+needs_zstd = pytest.mark.skipif(cir_codecs.zstandard is None, reason="zstandard is not installed")
+needs_lz4 = pytest.mark.skipif(cir_codecs.lz4_frame is None, reason="lz4 is not installed")
+
+CODECS = [
+    pytest.param({}, id="raw"),
+    pytest.param({"compression": "zstd"}, id="zstd", marks=needs_zstd),
+    pytest.param({"precision": "float32", "compression": "zstd"}, id="float32-zstd", marks=needs_zstd),
+    pytest.param({"precision": "complex64", "compression": "lz4"}, id="complex64-lz4", marks=needs_lz4),
+    pytest.param({"sparse_threshold": SPARSE_THRESHOLD}, id="sparse"),
+    pytest.param({"sparse_threshold": SPARSE_THRESHOLD, "compression": "zstd"}, id="sparse-zstd", marks=needs_zstd),
+    # Keyframes at steps 0, 3 and 6, so delta chains cross keyframe boundaries
+    pytest.param({"delta": True, "keyframe_interval": 3}, id="delta"),
+    pytest.param({"precision": "complex64", "delta": True, "keyframe_interval": 3, "compression": "zstd"},
+                 id="complex64-delta-zstd", marks=needs_zstd),
+]
+
+
+def make_cirs(seed: int = 0) -> list:
+    """Slowly varying CIRs of consecutive steps, with taps decaying below the sparse threshold"""
+    rng = np.random.default_rng(seed)
+    base = (rng.normal(size=SHAPE) + 1j * rng.normal(size=SHAPE)) * np.exp(-np.arange(SHAPE[-1]) / 6)
+    cirs = []
+    for step in range(NUM_STEPS):
+        drift = 1 + 0.01 * step * rng.normal(size=SHAPE)
+        cirs.append((base * drift).astype(np.complex64))
+    return cirs
+
+def encode_result(codec: dict, cirs: list) -> dict:
+    """Job result of the encoded steps, as stored by the database service (through JSON)"""
+    encoder = cir_codecs.CirEncoder(codec)
+    result = {str(step): {"drone_locations": [], "step_results": encoder.encode(cir, step)}
+              for step, cir in enumerate(cirs)}
+    return json.loads(json.dumps(result, default=list))
+
+def expected_mag_phase(codec: dict, cir: np.ndarray):
+    """Magnitude and phase a lossless codec must give back: those of the stored planes"""
+    codec = cir_codecs.make_codec(codec)
+    planes = cir_codecs.to_planes(cir, codec["precision"])
+    if codec["sparse_threshold"] is not None:
+        planes = np.where(np.abs(cir) > codec["sparse_threshold"], planes, 0).astype(planes.dtype)
+    return cir_codecs.to_mag_phase(planes, codec["precision"])
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_decode_step_round_trip(codec):
+    cirs = make_cirs()
+    result = encode_result(codec, cirs)
+    cache = {}
+    for step, cir in enumerate(cirs):
+        magnitude, phase = cir_codecs.decode_step(lambda key: cir_slices.step_results(result, key), step, cache)
+        expected_magnitude, expected_phase = expected_mag_phase(codec, cir)
+        assert magnitude.shape == SHAPE
+        np.testing.assert_array_equal(magnitude, expected_magnitude)
+        np.testing.assert_array_equal(phase, expected_phase)
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_decode_step_without_cache(codec):
+    """A step in the middle of a delta chain decodes on its own, following the chain to its keyframe"""
+    cirs = make_cirs()
+    result = encode_result(codec, cirs)
+    step = NUM_STEPS - 1
+    magnitude, phase = cir_codecs.decode_step(lambda key: cir_slices.step_results(result, key), step)
+    expected_magnitude, expected_phase = expected_mag_phase(codec, cirs[step])
+    np.testing.assert_array_equal(magnitude, expected_magnitude)
+    np.testing.assert_array_equal(phase, expected_phase)
+
+@pytest.mark.parametrize("codec", CODECS)
+@pytest.mark.parametrize("part", ["mag", "phase", "both"])
+def test_slice_cir_round_trip(codec, part):
+    cirs = make_cirs()
+    result = encode_result(codec, cirs)
+    # Steps spanning the keyframes of the delta codecs, and a sub-block of every axis
+    steps = list(range(2, NUM_STEPS))
+    selection = {axis: list(range(size)) for axis, size in zip(cir_slices.CIR_AXES, SHAPE)}
+    selection.update({"rx": [0, 2], "tx": [1], "rx_ant": [1], "taps": list(range(5, 20))})
+
+    content, shape, dtype = cir_slices.slice_cir(result, steps, selection, part)
+    sliced = np.frombuffer(content, dtype=dtype).reshape(shape)
+
+    index = np.ix_(*[selection[axis] for axis in cir_slices.CIR_AXES])
+    parts = [cir_slices.CIR_PARTS["both"].index(field) for field in cir_slices.CIR_PARTS[part]]
+    expected = np.stack([
+        np.stack([expected_mag_phase(codec, cirs[step])[p][index] for step in steps]) for p in parts
+    ])
+    assert list(expected.shape) == shape
+    np.testing.assert_array_equal(sliced, expected)
+
+def test_delta_steps_refer_to_the_previous_step_between_keyframes():
+    result = encode_result({"delta": True, "keyframe_interval": 3}, make_cirs())
+    delta_of = {step: result[str(step)]["step_results"].get("delta_of") for step in range(NUM_STEPS)}
+    assert delta_of == {0: None, 1: 0, 2: 1, 3: None, 4: 3, 5: 4, 6: None, 7: 6}
+
+def test_decode_delta_step_without_reference():
+    result = encode_result({"delta": True, "keyframe_interval": 3}, make_cirs())
+    with pytest.raises(ValueError):
+        cir_codecs.decode_planes(result["1"]["step_results"])
+
+@pytest.mark.parametrize("codec", [
+    {"precision": "float64"},
+    {"compression": "brotli"},
+    {"sparse_threshold": 0.1, "delta": True},
+    {"keyframe_interval": 0},
+    {"sparse_threshold": "abc"},
+    {"sparse_threshold": -1.0},
+])
+def test_make_codec_rejects_invalid_codecs(codec):
+    with pytest.raises(ValueError):
+        cir_codecs.make_codec(codec)
@@ -0,0 +1,123 @@
+"""Shard planning, claiming and the merge of the last completed shard (needs fakeredis)."""
+import json
+import uuid
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient
+
+import job_queue
+import retention
+
+SHARD_STEPS = 4
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(job_queue, "redis_client", fakeredis.FakeRedis(decode_responses=True))
+    monkeypatch.setattr(job_queue, "SHARD_STEPS", SHARD_STEPS)
+    monkeypatch.setattr(retention, "RESULTS_DIR", str(tmp_path))
+    return TestClient(job_queue.app)
+
+def create_job(client, steps: int) -> str:
+    config = {
+        "job_id": str(uuid.uuid4()),
+        "scene_name": "test_scene",
+        "simulation_steps": steps,
+        "antenna_configs": {"num_rows": 1, "num_cols": 1},
+        "radio_configs": {"frequency": 6e9, "bandwidth": 500e6},
+        "drones": [{"location": [0.0, 0.0, 30.0]}, {"location": [10.0, 0.0, 30.0]}],
+    }
+    response = client.post("/jobs", json={"config": config})
+    assert response.status_code == 200, response.text
+    return config["job_id"]
+
+def step_results(start: int, stop: int) -> dict:
+    return {str(step): {"drone_locations": [], "step_results": {"step": step}} for step in range(start, stop)}
+
+def claim(client, worker_id: str) -> dict:
+    response = client.post("/jobs/claim", json={"worker_id": worker_id})
+    assert response.status_code == 200, response.text
+    return response.json()["shard"]
+
+def complete(client, job_id: str, shard: dict):
+    response = client.put(f"/jobs/{job_id}/shards/{shard['index']}", json={
+        "status": "completed", "progress": 100, "result": step_results(shard["start"], shard["stop"]),
+    })
+    assert response.status_code == 200, response.text
+
+
+@pytest.mark.parametrize("steps, ranges", [
+    (10, [(0, 4), (4, 8), (8, 10)]),
+    (8, [(0, 4), (4, 8)]),
+    (3, [(0, 3)]),
+    # A job without steps still gets one (empty) shard, so it can complete
+    (0, [(0, 0)]),
+])
+def test_plan_shards(monkeypatch, steps, ranges):
+    monkeypatch.setattr(job_queue, "SHARD_STEPS", SHARD_STEPS)
+    shards = job_queue.plan_shards(steps)
+    assert [(shard.start, shard.stop) for shard in shards] == ranges
+    assert [shard.index for shard in shards] == list(range(len(ranges)))
+
+def test_merge_shards_combines_shard_results(client):
+    job_id = create_job(client, 10)
+    shards = job_queue.get_shards(job_id)
+    for shard in shards:
+        job_queue.store_shard_result(job_id, shard.index, step_results(shard.start, shard.stop))
+    assert job_queue.merge_shards(job_id, shards) == step_results(0, 10)
+
+def test_store_shard_result_keeps_results_from_before_a_preemption(client):
+    job_id = create_job(client, 10)
+    job_queue.store_shard_result(job_id, 0, step_results(0, 2))
+    job_queue.store_shard_result(job_id, 0, step_results(2, 4))
+    assert job_queue.merge_shards(job_id, job_queue.get_shards(job_id)[:1]) == step_results(0, 4)
+
+def test_last_completed_shard_merges_the_job(client):
+    job_id = create_job(client, 10)
+    shards = [claim(client, f"worker-{i}") for i in range(3)]
+    assert [(shard["start"], shard["stop"]) for shard in shards] == [(0, 4), (4, 8), (8, 10)]
+    # Nothing is left to claim, and the emptied queue leaves the registry
+    assert client.post("/jobs/claim", json={"worker_id": "worker-3"}).status_code == 204
+    assert job_queue.redis_client.smembers(retention.PENDING_QUEUES) == set()
+
+    # Shards complete out of order; the job only completes with the last one
+    for shard in (shards[2], shards[0]):
+        complete(client, job_id, shard)
+        job = client.get(f"/jobs/{job_id}").json()
+        assert job["status"] == "processing"
+        assert job["result"] is None
+    complete(client, job_id, shards[1])
+
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job["status"] == "completed"
+    assert job["progress"] == 100
+    assert job["result"] == step_results(0, 10)
+    assert job["stats"]["shards"] == 3
+    redis_client = job_queue.redis_client
+    assert redis_client.get(f"job:{job_id}:merged") == "1"
+    assert not list(redis_client.scan_iter(match=f"job:{job_id}:shard:*:result"))
+    assert not redis_client.smembers("worker:worker-1:claims")
+
+def test_merge_runs_once(client):
+    """Only the update that sets job:{id}:merged assembles the result"""
+    job_id = create_job(client, 6)
+    shards = [claim(client, f"worker-{i}") for i in range(2)]
+    complete(client, job_id, shards[0])
+    # As if a concurrent update of the last shard had already merged the job
+    job_queue.redis_client.set(f"job:{job_id}:merged", 1)
+    complete(client, job_id, shards[1])
+    job = json.loads(client.get(f"/jobs/{job_id}").content)
+    assert job["status"] == "processing"
+    assert job["result"] is None
+
+def test_failed_shard_fails_the_job(client):
+    job_id = create_job(client, 10)
+    shard = claim(client, "worker-0")
+    client.put(f"/jobs/{job_id}/shards/{shard['index']}", json={"status": "failed", "progress": 0})
+    assert client.get(f"/jobs/{job_id}").json()["status"] == "failed"
+    # The job's other queued shards are no longer handed out
+    assert client.post("/jobs/claim", json={"worker_id": "worker-1"}).status_code == 204
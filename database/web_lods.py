@@ -0,0 +1,93 @@
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+# Command line of glTF-Transform (installed in the Docker image)
+GLTF_TRANSFORM = os.getenv("GLTF_TRANSFORM", "gltf-transform")
+LOD_TIMEOUT_SECONDS = int(os.getenv("WEB_LOD_TIMEOUT_SECONDS", 600))
+
+# Web levels of detail, coarsest first: fraction of triangles kept, simplification
+# error (fraction of the mesh radius) and largest texture size in pixels
+WEB_LODS = [
+    ("low", 0.1, 0.01, 256),
+    ("medium", 0.35, 0.002, 1024),
+]
+
+# Generated files live next to the model, named after the level and the source hash
+WEB_LOD_FOLDER = ".web"
+
+_executor = ThreadPoolExecutor(max_workers=1)
+_scheduled = set()
+# Model versions whose levels failed to build, not retried until the model changes
+_failed = set()
+_lock = threading.Lock()
+
+
+def lod_filename(level: str, sha256: str) -> str:
+    return f"{level}-{sha256[:16]}.glb"
+
+def available() -> bool:
+    """Whether the glTF-Transform CLI is installed"""
+    return shutil.which(GLTF_TRANSFORM) is not None
+
+def _run(*args: str):
+    subprocess.run([GLTF_TRANSFORM, *args], check=True, capture_output=True, timeout=LOD_TIMEOUT_SECONDS)
+
+def build_lod(source: str, target: str, ratio: float, error: float, texture_size: int):
+    """Simplifies a GLB, downscales its textures and compresses it with meshopt
+    (quantized, EXT_meshopt_compression, which three.js decodes natively)"""
+    staging = f"{target}.tmp"
+    simplified = f"{staging}.simplified.glb"
+    resized = f"{staging}.resized.glb"
+    try:
+        _run("simplify", source, simplified, "--ratio", str(ratio), "--error", str(error))
+        _run("resize", simplified, resized, "--width", str(texture_size), "--height", str(texture_size))
+        _run("meshopt", resized, f"{staging}.glb")
+        os.replace(f"{staging}.glb", target)
+    finally:
+        for path in (simplified, resized, f"{staging}.glb"):
+            if os.path.exists(path):
+                os.remove(path)
+
+def _build_lods(model_dir: str, glb_file: str, sha256: str, on_done: Callable[[], None]):
+    folder = os.path.join(model_dir, WEB_LOD_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    try:
+        for level, ratio, error, texture_size in WEB_LODS:
+            target = os.path.join(folder, lod_filename(level, sha256))
+            if not os.path.exists(target):
+                try:
+                    build_lod(os.path.join(model_dir, glb_file), target, ratio, error, texture_size)
+                except (subprocess.SubprocessError, OSError) as e:
+                    _failed.add(sha256)
+                    print(f"Failed to build {level} LOD of {model_dir}/{glb_file}: {e}")
+        # Drop the levels of previous versions of the model
+        current = {lod_filename(level, sha256) for level, *_ in WEB_LODS}
+        for filename in os.listdir(folder):
+            if filename not in current:
+                os.remove(os.path.join(folder, filename))
+    finally:
+        with _lock:
+            _scheduled.discard(sha256)
+        on_done()
+
+def existing_lods(model_dir: str, sha256: str) -> List[dict]:
+    """Generated levels of a model version, coarsest first"""
+    lods = []
+    for level, *_ in WEB_LODS:
+        path = os.path.join(model_dir, WEB_LOD_FOLDER, lod_filename(level, sha256))
+        if os.path.exists(path):
+            lods.append({"level": level, "file": os.path.relpath(path, model_dir), "size": os.path.getsize(path)})
+    return lods
+
+def schedule_lods(model_dir: str, glb_file: str, sha256: str, on_done: Callable[[], None]):
+    """Builds the missing levels of a model in the background, calling on_done when finished"""
+    if len(existing_lods(model_dir, sha256)) == len(WEB_LODS) or not available():
+        return
+    with _lock:
+        if sha256 not in _scheduled and sha256 not in _failed:
+            _scheduled.add(sha256)
+            _executor.submit(_build_lods, model_dir, glb_file, sha256, on_done)
@@ -0,0 +1,274 @@
+"""Build ML-ready datasets from many completed simulation jobs.
+
+Jobs are selected by query (scene, frequency range, status, creation date)
+and their steps are streamed, in parallel worker processes, into fixed-size
+shards of one sample per step:
+
+    cir        [2, num_drones, num_drones, num_samples] magnitude and phase
+               (float16/float32), or [num_drones, num_drones, num_samples] (complex64)
+    locations  [num_drones, 3] float32 drone positions
+    meta       (job, step) int32: index of the job in index.json and step in the job
+
+Each field of a shard is a .npy file (shard-00000.cir.npy, ...), filled
+through a memory map, so only the chunks in flight are ever held in memory.
+index.json holds the schema, the number of samples in each shard and the
+metadata of every job (scene, radio setup, first sample), so sample i is row
+i % shard_size of shard i // shard_size. Running the builder again on the
+same directory appends the newly matching jobs:
+
+    python dataset_builder.py dataset/ --scene model13 --min-frequency 5e9 --created-after 2026-01-01
+"""
+import argparse
+import json
+import os
+from collections import deque
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from cir_export import DATABASE_URL, EXPORT_DTYPES, fetch_cir_chunk
+
+INDEX_FILE = "index.json"
+SHARD_FIELDS = ("cir", "locations", "meta")
+DEFAULT_SHARD_SIZE = 4096
+# Steps fetched per worker task; memory use is bounded by (2 x workers) chunks
+DATASET_CHUNK_STEPS = 64
+
+
+def select_jobs(database_url: str = DATABASE_URL, scene_name: Optional[str] = None,
+                status: str = "completed", min_frequency: Optional[float] = None,
+                max_frequency: Optional[float] = None, created_after: Optional[str] = None,
+                created_before: Optional[str] = None) -> List[dict]:
+    """Jobs matching the query, oldest first, without their results"""
+    params = {
+        "scene_name": scene_name, "status": status,
+        "min_frequency": min_frequency, "max_frequency": max_frequency,
+        "created_after": created_after, "created_before": created_before,
+        "include_result": "false",
+    }
+    response = requests.get(f"{database_url}/jobs",
+                            params={key: value for key, value in params.items() if value is not None})
+    response.raise_for_status()
+    return sorted(response.json(), key=lambda job: job.get('created_at', ''))
+
+def _fetch_chunk(task: Tuple[str, int, int, str]) -> Tuple[np.ndarray, np.ndarray]:
+    """CIRs [2, steps, rx, tx, num_samples] and locations [steps, drones, 3] of a step range (worker process)"""
+    job_id, start, stop, database_url = task
+    cir = fetch_cir_chunk(job_id, start, stop, database_url)
+    response = requests.get(f"{database_url}/jobs/{job_id}/steps", params={"start": start, "stop": stop})
+    response.raise_for_status()
+    locations = response.json()['locations']
+    return cir, np.array([locations[str(step)] for step in range(start, stop)], dtype=np.float32)
+
+
+class DatasetWriter:
+    """Appends samples to the shards of a dataset directory, keeping index.json in sync"""
+
+    def __init__(self, directory: str, dtype: str = "float16", shard_size: int = DEFAULT_SHARD_SIZE):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.index = json.load(f)
+        else:
+            if dtype not in EXPORT_DTYPES:
+                raise ValueError(f"dtype must be one of {EXPORT_DTYPES}")
+            self.index = {"schema": None, "dtype": dtype, "shard_size": shard_size,
+                          "num_samples": 0, "shards": [], "jobs": []}
+        self._shard = None
+
+    @property
+    def job_ids(self):
+        return {job['id'] for job in self.index['jobs']}
+
+    def check_schema(self, num_drones: int, num_samples: int) -> bool:
+        """Whether a job fits the dataset; the first job added sets the schema"""
+        schema = {"num_drones": num_drones, "num_samples": num_samples}
+        if self.index['schema'] is None:
+            self.index['schema'] = schema
+        return self.index['schema'] == schema
+
+    def _shapes(self) -> Dict[str, Tuple[Tuple[int, ...], str]]:
+        drones, samples = self.index['schema']['num_drones'], self.index['schema']['num_samples']
+        if self.index['dtype'] == "complex64":
+            cir = ((drones, drones, samples), "complex64")
+        else:
+            cir = ((2, drones, drones, samples), self.index['dtype'])
+        return {"cir": cir, "locations": ((drones, 3), "float32"), "meta": ((2,), "int32")}
+
+    def _open_shard(self):
+        """Memory maps of the last shard, creating a new one when it is full"""
+        size = self.index['shard_size']
+        shards = self.index['shards']
+        if not shards or shards[-1]['count'] >= size:
+            shards.append({"name": f"shard-{len(shards):05d}", "count": 0})
+            mode = "w+"
+        else:
+            mode = "r+"
+        name = shards[-1]['name']
+        if self._shard is None or self._shard[0] != name:
+            self._shard = (name, {
+                field: np.lib.format.open_memmap(os.path.join(self.directory, f"{name}.{field}.npy"), mode=mode,
+                                                 dtype=dtype, shape=(size,) + shape)
+                for field, (shape, dtype) in self._shapes().items()
+            })
+        return shards[-1], self._shard[1]
+
+    def append(self, job_index: int, first_step: int, cir: np.ndarray, locations: np.ndarray):
+        """Append the steps of a chunk: cir [2, steps, rx, tx, num_samples], locations [steps, drones, 3]"""
+        steps = cir.shape[1]
+        if self.index['dtype'] == "complex64":
+            samples = (cir[0].astype(np.float32) * np.exp(1j * cir[1].astype(np.float32))).astype(np.complex64)
+        else:
+            # [2, steps, ...] -> [steps, 2, ...]
+            samples = np.moveaxis(cir, 0, 1).astype(self.index['dtype'])
+        written = 0
+        while written < steps:
+            shard, arrays = self._open_shard()
+            count = min(steps - written, self.index['shard_size'] - shard['count'])
+            rows = slice(shard['count'], shard['count'] + count)
+            arrays['cir'][rows] = samples[written:written + count]
+            arrays['locations'][rows] = locations[written:written + count]
+            arrays['meta'][rows, 0] = job_index
+            arrays['meta'][rows, 1] = np.arange(first_step + written, first_step + written + count)
+            shard['count'] += count
+            written += count
+        self.index['num_samples'] += steps
+
+    def commit(self):
+        """Flush the shards and write the index atomically, making the appended samples visible"""
+        if self._shard is not None:
+            for array in self._shard[1].values():
+                array.flush()
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+def build_dataset(directory: str, jobs: List[dict], dtype: str = "float16",
+                  shard_size: int = DEFAULT_SHARD_SIZE, workers: int = 4,
+                  chunk_steps: int = DATASET_CHUNK_STEPS, database_url: str = DATABASE_URL) -> dict:
+    """Append the jobs that are not in the dataset yet, returning the updated index.
+
+    Radio-map jobs, which have no CIRs, and jobs whose drone count or CIR
+    length differ from the dataset schema are skipped.
+    """
+    writer = DatasetWriter(directory, dtype, shard_size)
+    known = writer.job_ids
+    ctx = get_context("spawn")
+    with ctx.Pool(workers) as pool:
+        for job in jobs:
+            if job['id'] in known:
+                continue
+            config = job.get('config', {})
+            # Radio-map jobs store path gains read from maps, not CIRs
+            if config.get('mode') == "radio_map":
+                print(f"Skipping job {job['id']}: radio-map jobs have no CIRs")
+                continue
+            response = requests.get(f"{database_url}/jobs/{job['id']}/steps", params={"start": 0, "stop": 1})
+            if response.status_code != 200:
+                print(f"Skipping job {job['id']}: {response.text}")
+                continue
+            job_steps = response.json()
+            if not job_steps.get('shape'):
+                print(f"Skipping job {job['id']}: its steps have no CIRs")
+                continue
+            num_steps = job_steps['num_steps']
+            num_rx, _, num_tx, _, _, num_samples = job_steps['shape']
+            if num_rx != num_tx or not writer.check_schema(num_rx, num_samples):
+                print(f"Skipping job {job['id']}: {num_rx} drones and {num_samples} samples "
+                      f"do not match the dataset schema {writer.index['schema']}")
+                continue
+
+            radio = config.get('radio_configs') or {}
+            job_index = len(writer.index['jobs'])
+            writer.index['jobs'].append({
+                "id": job['id'],
+                "scene_name": config.get('scene_name'),
+                "frequency": radio.get('frequency'),
+                "bandwidth": radio.get('bandwidth'),
+                "lod": config.get('lod', "full"),
+                "move_together": config.get('move_together', True),
+                "created_at": job.get('created_at'),
+                "first_sample": writer.index['num_samples'],
+                "num_steps": num_steps,
+            })
+
+            # Chunks are fetched in parallel but written in order, with at most
+            # 2 x workers chunks in flight
+            tasks = [(job['id'], start, min(start + chunk_steps, num_steps), database_url)
+                     for start in range(0, num_steps, chunk_steps)]
+            pending = deque()
+            for task in tasks:
+                pending.append((task[1], pool.apply_async(_fetch_chunk, (task,))))
+                if len(pending) >= 2 * workers:
+                    start, result = pending.popleft()
+                    writer.append(job_index, start, *result.get())
+            while pending:
+                start, result = pending.popleft()
+                writer.append(job_index, start, *result.get())
+            # Committed per job, so an interrupted build resumes at the last complete job
+            writer.commit()
+            print(f"Added job {job['id']}: {num_steps} samples ({writer.index['num_samples']} in total)")
+    return writer.index
+
+
+class Dataset:
+    """Random access to the samples of a built dataset"""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        self.shard_size = self.index['shard_size']
+        self._shards = [
+            {field: np.load(os.path.join(directory, f"{shard['name']}.{field}.npy"), mmap_mode="r")
+             for field in SHARD_FIELDS}
+            for shard in self.index['shards']
+        ]
+
+    def __len__(self):
+        return self.index['num_samples']
+
+    def __getitem__(self, i: int) -> dict:
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        shard = self._shards[i // self.shard_size]
+        row = i % self.shard_size
+        job_index, step = shard['meta'][row]
+        return {
+            "cir": np.asarray(shard['cir'][row]),
+            "locations": np.asarray(shard['locations'][row]),
+            "job": self.index['jobs'][job_index],
+            "step": int(step),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge completed simulation jobs into a sharded dataset")
+    parser.add_argument("output", help="Dataset directory (new jobs are appended when it exists)")
+    parser.add_argument("--scene", help="Only jobs of this scene")
+    parser.add_argument("--status", default="completed")
+    parser.add_argument("--min-frequency", type=float)
+    parser.add_argument("--max-frequency", type=float)
+    parser.add_argument("--created-after", help="ISO date or date-time, e.g. 2026-01-01 or 2026-01-01T08:00")
+    parser.add_argument("--created-before", help="ISO date or date-time, e.g. 2026-02-01")
+    parser.add_argument("--dtype", choices=EXPORT_DTYPES, default="float16",
+                        help="float16/float32 store magnitude and phase, complex64 the complex CIR (new datasets only)")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Samples per shard (new datasets only)")
+    parser.add_argument("--workers", type=int, default=4, help="Processes fetching job results")
+    parser.add_argument("--chunk-steps", type=int, default=DATASET_CHUNK_STEPS, help="Steps fetched per request")
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    args = parser.parse_args()
+
+    jobs = select_jobs(args.database_url, args.scene, args.status, args.min_frequency,
+                       args.max_frequency, args.created_after, args.created_before)
+    print(f"{len(jobs)} job(s) match the query")
+    index = build_dataset(args.output, jobs, args.dtype, args.shard_size, args.workers,
+                          args.chunk_steps, args.database_url)
+    print(f"Dataset {args.output}: {index['num_samples']} samples from {len(index['jobs'])} job(s) "
+          f"in {len(index['shards'])} shard(s)")
+
+if __name__ == "__main__":
+    main()
@@ -285,6 +285,20 @@ function Model3D({ modelPath, position = [0, 0, 0], rotation = [0, 0, 0], scale
   );
 }
 
+// Loads the web levels of detail of a model coarsest first: each level is shown
+// (as the Suspense fallback of the next one) until the finer one has loaded
+function ProgressiveModel3D({ modelPath, lods = [], ...props }) {
+  const paths = [...lods.map((lod) => lod.path).filter((path) => path !== modelPath), modelPath];
+  return paths.reduce(
+    (fallback, path) => (
+      <Suspense key={path} fallback={fallback}>
+        <Model3D modelPath={path} {...props} />
+      </Suspense>
+    ),
+    null
+  );
+}
+
 function LoadingOverlay({ isModelSelected, onModelLoaded }) {
   const { progress } = useProgress();
   
@@ -1369,8 +1383,9 @@ export default function Simulation() {
           
           {/* Render the selected 3D model if available */}
           {selectedModel && (
-            <Model3D 
+            <ProgressiveModel3D 
               modelPath={selectedModel} 
+              lods={models.find((model) => model.path === selectedModel)?.lods}
               position={modelPosition} 
               rotation={[modelRotation[0], modelRotation[1], modelRotation[2]]} 
               scale={modelScale} 
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from pydantic import BaseModel
 from app.models.configs import Config
+from app.services.warmup import is_warm
 import os
 import requests
 
@@ -9,6 +10,9 @@ router = APIRouter()
 class HealthCheck(BaseModel):
     status: str
 
+class ReadinessCheck(BaseModel):
+    status: str
+
 class JobResponse(BaseModel):
     job_id: str
     message: str
@@ -19,3 +23,13 @@ async def health_check():
     Health check endpoint
     """
     return HealthCheck(status="healthy")
+
+@router.get("/ready", response_model=ReadinessCheck)
+async def readiness_check(response: Response):
+    """
+    Readiness endpoint, reports "warm" once a worker process has finished its warm-up
+    """
+    if not is_warm():
+        response.status_code = 503
+        return ReadinessCheck(status="warming")
+    return ReadinessCheck(status="warm")
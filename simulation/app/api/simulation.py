@@ -3,9 +3,7 @@ from pydantic import BaseModel
 from app.models.configs import Config
 import os
 import requests
-import asyncio
 import json
-from app.services.simulate import *
 router = APIRouter()
 
 
@@ -25,42 +23,25 @@ async def start_simulation(job_request: JobRequest):
     """
     Receive simulation config from frontend and add to job queue
     """
+    # The supervised worker pool claims queued jobs, so simulations never run
+    # inside this API process
     try:
-        # Run simulation in background
-        asyncio.create_task(run_simulation_background(job_request.config))
-        
-        # Return immediate response
-        return JobResponse(
-            job_id=job_request.config.job_id,
-            message="Simulation started successfully"
+        database_url = os.getenv("DATABASE_URL", "http://database:8000")
+        response = requests.post(
+            f"{database_url}/jobs",
+            json={"config": job_request.config.dict()},
+            timeout=5
         )
     except Exception as e:
         raise HTTPException(
             status_code=500, 
             detail=f"Unexpected error: {str(e)}"
         )
-
-
-async def run_simulation_background(config: Config):
-    """
-    Run simulation in background and update job status
-    """
-    try:
-        # Run the simulation (now handles database updates internally)
-        run_simulation(config)
-    except Exception as e:
-        print(f"Error in background simulation: {str(e)}")
-        # Update job status to failed
-        try:
-            database_url = os.getenv("DATABASE_URL", "http://database:8000")
-            update_data = {
-                "status": "failed",
-                "progress": 0
-            }
-            requests.put(
-                f"{database_url}/jobs/{config.job_id}",
-                json=update_data
-            )
-        except:
-            pass
-        raise e
\ No newline at end of file
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=response.json().get("detail"))
+
+    # Return immediate response
+    return JobResponse(
+        job_id=job_request.config.job_id,
+        message="Simulation queued successfully"
+    )
@@ -1,11 +1,8 @@
 from fastapi import FastAPI
-import app.bootstrap_mitsuba
 from app.api import health, simulation
-from contextlib import asynccontextmanager
-import mitsuba as mi
-from loguru import logger
-import sionna.rt
-  # noqa: F401  (side-effect: sets variant & registers plugins)
+
+# Simulations run in the supervised worker processes (app/supervisor.py),
+# so the API process never loads Mitsuba or Sionna
 app = FastAPI(title="Simulation Service")
 
 
@@ -17,4 +14,4 @@ app.include_router(simulation.router, prefix="/api")
 
 @app.get("/")
 async def root():
-    return {"message": "Simulation Service"}
\ No newline at end of file
+    return {"message": "Simulation Service"}
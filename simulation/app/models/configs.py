@@ -14,10 +14,34 @@ class AntennaConfig(BaseModel):
     pattern: str = "iso"
     polarization: str = "H"
 
+class SolverConfig(BaseModel):
+    max_depth: int = 50
+    samples_per_src: int = int(1e7)
+    max_num_paths_per_src: int = int(1e7)
+
+class CodecConfig(BaseModel):
+    """How step CIRs are stored (see services/cir_codecs.py); the defaults keep dense float16."""
+    precision: str = "float16"  # "float16", "float32" or "complex64"
+    compression: str = "none"  # "none", "zstd" or "lz4"
+    sparse_threshold: Optional[float] = None  # Keep only taps with a larger magnitude
+    delta: bool = False  # XOR each step against the previous one
+    keyframe_interval: int = 16
+
+class RadioMapConfig(BaseModel):
+    """Gain maps of radio-map jobs (see services/radio_maps.py)"""
+    cell_size: float = 1.0  # m
+    altitudes: Optional[List[float]] = None  # Map layers (m); by default every altitude_spacing around the drones
+    altitude_spacing: float = 2.0
+    margin: float = 5.0  # Added around the trajectories' bounding box (m)
+    samples_per_tx: int = int(1e7)
+    max_depth: int = 5
+
 class Motion(BaseModel):
-    motion_type: str
+    motion_type: str  # "line", "circle", "waypoints" or "spline" (see services/motion.py)
     radius: float = 0.0
     end_position: Optional[List[float]] = None  # 3D
+    waypoints: Optional[List[List[float]]] = None  # 3D points visited after the drone's location
+    velocity_profile: str = "constant"  # "constant", "ease_in_out", "accelerate" or "decelerate"
 
 class Drone(BaseModel):
     location: List[float]
@@ -32,6 +56,16 @@ class Config(BaseModel):
     antenna_configs: AntennaConfig
     radio_configs: RadioConfig
     drones: List[Drone]
+    solver: SolverConfig = SolverConfig()
+    # Mesh level of detail: "full", "fine", "medium" or "coarse" (see scene_assets.LOD_LEVELS)
+    lod: str = "full"
+    codec: CodecConfig = CodecConfig()
+    # "paths" traces every step; "radio_map" reads path gains to the drones
+    # without motion from precomputed gain maps
+    mode: str = "paths"
+    radio_map: RadioMapConfig = RadioMapConfig()
+    # Profile the run and attach the profile to the job (see services/profiling.py)
+    profile: bool = False
 
 
 class Response(BaseModel):
@@ -0,0 +1,130 @@
+"""Size and encode/decode throughput of the CIR codecs.
+
+Encodes the CIRs of a finished job (or synthetic CIRs with the same tap
+window when no job is given) with every codec and reports the stored size
+against the dense float16 layout:
+
+    python -m app.services.codec_benchmark --job-id <job id> --output codec_report.json
+    python -m app.services.codec_benchmark --steps 64 --drones 8
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+import requests
+
+from app.services import cir_codecs
+
+# Same window as the taps computed in simulate._run_sionna_step
+L_MIN, L_MAX = -3, 47
+BENCHMARK_CODECS = {
+    "raw": {},
+    "float16+zstd": {"compression": "zstd"},
+    "float16+lz4": {"compression": "lz4"},
+    "float16+delta+zstd": {"delta": True, "compression": "zstd"},
+    "float16+sparse+zstd": {"sparse_threshold": 1e-3, "compression": "zstd"},
+    "float32+zstd": {"precision": "float32", "compression": "zstd"},
+    "complex64+sparse+zstd": {"precision": "complex64", "sparse_threshold": 1e-3, "compression": "zstd"},
+}
+
+
+def job_cirs(job_id: str, database_url: str) -> List[np.ndarray]:
+    """Complex CIRs of every step of a finished job, in step order."""
+    response = requests.get(f"{database_url}/jobs/{job_id}")
+    response.raise_for_status()
+    result = response.json().get("result") or {}
+    steps = sorted(result, key=int)
+
+    def get_step_results(step):
+        return result[str(step)]["step_results"]
+
+    cache = {}
+    cirs = []
+    for step in steps:
+        magnitude, phase = cir_codecs.decode_step(get_step_results, int(step), cache)
+        cirs.append(magnitude.astype(np.float32) * np.exp(1j * phase.astype(np.float32)))
+    return cirs
+
+def synthetic_cirs(steps: int, drones: int, paths: int = 8, seed: int = 0) -> List[np.ndarray]:
+    """Energy-normalized band-limited CIRs of slowly moving links, [rx, 1, tx, 1, 1, taps] per step."""
+    rng = np.random.default_rng(seed)
+    delays = rng.uniform(0, 20, (drones, drones, paths))
+    delays[..., 0] = rng.uniform(0, 2, (drones, drones))
+    gains = np.exp(-delays / 8) * np.exp(2j * np.pi * rng.uniform(size=(drones, drones, paths)))
+    drift = rng.normal(0, 0.02, (drones, drones, paths))
+    taps = np.arange(L_MIN, L_MAX + 1)
+    cirs = []
+    for step in range(steps):
+        step_delays = delays + drift * step
+        cir = (gains[..., None] * np.sinc(taps - step_delays[..., None])).sum(axis=-2)
+        cir /= np.sqrt(np.sum(np.abs(cir) ** 2, axis=-1, keepdims=True))
+        cirs.append(cir[:, None, :, None, None, :].astype(np.complex64))
+    return cirs
+
+def _stored_bytes(fields: Dict) -> int:
+    return sum(len(fields.get(name, "")) for name in ("cir_mag", "cir_phase", "cir_data"))
+
+def benchmark_codec(cirs: List[np.ndarray], codec: Dict) -> Dict:
+    """Stored size, throughput and reconstruction error of one codec over a sequence of steps."""
+    encoder = cir_codecs.CirEncoder(codec)
+    start = time.perf_counter()
+    encoded = [encoder.encode(cir, step) for step, cir in enumerate(cirs)]
+    encode_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cache = {}
+    decoded = [cir_codecs.decode_step(lambda step: encoded[step], step, cache) for step in range(len(cirs))]
+    decode_seconds = time.perf_counter() - start
+
+    errors, energy = 0.0, 0.0
+    for cir, (magnitude, phase) in zip(cirs, decoded):
+        reconstructed = magnitude.astype(np.float32) * np.exp(1j * phase.astype(np.float32))
+        errors += float(np.sum(np.abs(reconstructed - cir) ** 2))
+        energy += float(np.sum(np.abs(cir) ** 2))
+    # Throughputs are relative to the dense float16 magnitude and phase
+    dense_mb = sum(cir.size * 4 for cir in cirs) / 1e6
+    stored = sum(_stored_bytes(fields) for fields in encoded)
+    return {
+        "stored_bytes_per_step": stored / len(cirs),
+        "encode_mb_per_s": dense_mb / max(encode_seconds, 1e-9),
+        "decode_mb_per_s": dense_mb / max(decode_seconds, 1e-9),
+        "nmse_db": float(10 * np.log10(max(errors / max(energy, 1e-30), 1e-30))),
+    }
+
+def codec_benchmark(cirs: List[np.ndarray]) -> Dict:
+    """Benchmarks every codec of BENCHMARK_CODECS whose compression library is installed."""
+    report = {"steps": len(cirs), "shape": list(cirs[0].shape), "codecs": {}}
+    for name, codec in BENCHMARK_CODECS.items():
+        try:
+            cir_codecs.make_codec(codec)
+        except ValueError as e:
+            report["codecs"][name] = {"skipped": str(e)}
+            continue
+        report["codecs"][name] = benchmark_codec(cirs, codec)
+    raw_size = report["codecs"]["raw"]["stored_bytes_per_step"]
+    for result in report["codecs"].values():
+        if "stored_bytes_per_step" in result:
+            result["ratio_vs_raw"] = raw_size / result["stored_bytes_per_step"]
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--job-id", help="Benchmark the CIRs of this finished job")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", "http://database:8000"))
+    parser.add_argument("--steps", type=int, default=64, help="Synthetic steps, without --job-id")
+    parser.add_argument("--drones", type=int, default=8, help="Synthetic drones, without --job-id")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    if args.job_id:
+        cirs = job_cirs(args.job_id, args.database_url)
+    else:
+        cirs = synthetic_cirs(args.steps, args.drones)
+    report = codec_benchmark(cirs)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,77 @@
+from typing import Dict, List
+
+import numpy as np
+
+SPEED_OF_LIGHT = 299792458.0
+# A path arriving within this delay of the straight-line distance counts as line of sight
+LOS_TOLERANCE_S = 0.5e-9
+
+METRIC_NAMES = (
+    "path_loss_db",
+    "mean_excess_delay_ns",
+    "rms_delay_spread_ns",
+    "k_factor_db",
+    "los",
+    "coherence_bandwidth_mhz",
+)
+
+
+def link_metrics(a: np.ndarray, tau: np.ndarray, distances: np.ndarray) -> Dict[str, np.ndarray]:
+    """Per-link channel summaries computed from the propagation paths.
+
+    Vectorized over any leading link axes (e.g. [rx, tx]).
+
+    Args:
+        a: Complex path coefficients, shape [..., paths].
+        tau: Path delays in seconds (negative for invalid paths), shape [..., paths].
+        distances: Straight-line transmitter to receiver distances in meters, shape [...].
+
+    Returns:
+        dict: One array of shape [...] per name in METRIC_NAMES. Links without
+        any path are NaN (los is 0).
+    """
+    power = np.abs(a) ** 2
+    valid = (tau >= 0) & (power > 0)
+    power = np.where(valid, power, 0.0)
+    delays = np.where(valid, tau, 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total = power.sum(axis=-1)
+        has_paths = total > 0
+        mean_delay = (power * delays).sum(axis=-1) / total
+        first_arrival = np.where(valid, tau, np.inf).min(axis=-1)
+        second_moment = (power * delays ** 2).sum(axis=-1) / total
+        rms_delay_spread = np.sqrt(np.maximum(second_moment - mean_delay ** 2, 0.0))
+
+        # Rician K-factor, taking the strongest path as the specular component
+        strongest = power.max(axis=-1)
+        k_factor_db = 10 * np.log10(strongest / (total - strongest))
+
+        los_delay = distances / SPEED_OF_LIGHT
+        los = (valid & (np.abs(tau - los_delay[..., None]) <= LOS_TOLERANCE_S)).any(axis=-1)
+
+        metrics = {
+            "path_loss_db": -10 * np.log10(total),
+            "mean_excess_delay_ns": (mean_delay - first_arrival) * 1e9,
+            "rms_delay_spread_ns": rms_delay_spread * 1e9,
+            "k_factor_db": k_factor_db,
+            "los": los.astype(float),
+            # 50% frequency-correlation approximation
+            "coherence_bandwidth_mhz": 1 / (5 * rms_delay_spread) / 1e6,
+        }
+    for name in METRIC_NAMES:
+        if name != "los":
+            metrics[name] = np.where(has_paths, metrics[name], np.nan)
+    return metrics
+
+def link_distances(rx_positions: np.ndarray, tx_positions: np.ndarray) -> np.ndarray:
+    """Distances between every receiver and transmitter, shape [rx, tx]."""
+    return np.linalg.norm(rx_positions[:, None, :] - tx_positions[None, :, :], axis=-1)
+
+def to_lists(metrics: Dict[str, np.ndarray], decimals: int = 3) -> Dict[str, List]:
+    """JSON-friendly metrics: rounded nested lists, with None for NaN and infinite values."""
+    lists = {}
+    for name, values in metrics.items():
+        values = np.round(values.astype(float), decimals)
+        lists[name] = np.where(np.isfinite(values), values, None).tolist()
+    return lists
@@ -0,0 +1,96 @@
+"""Accuracy vs. speed of the mesh levels of detail.
+
+Runs the steps of a job config at every level of detail and compares the
+CIRs to the ones of the full mesh on the same trajectories:
+
+    python -m app.services.lod_report test_job_model13.json --steps 3 --output lod_report.json
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from loguru import logger
+
+import app.bootstrap_mitsuba  # noqa: F401  (side-effect: sets variant & registers plugins)
+from app.models.configs import Config, Drone
+from app.services import cir_codecs, motion, scene_assets
+from app.services.simulate import _run_sionna_step
+
+
+def _decode_cir(result: dict) -> np.ndarray:
+    # Every step is encoded by its own encoder, so it never refers to a previous step
+    magnitude, phase = cir_codecs.to_mag_phase(*cir_codecs.decode_planes(result))
+    return magnitude.astype(np.float32) * np.exp(1j * phase.astype(np.float32))
+
+def _rms_delay_spread(cir: np.ndarray) -> np.ndarray:
+    """RMS delay spread of every link, in taps."""
+    power = np.abs(cir) ** 2
+    taps = np.arange(cir.shape[-1])
+    total = np.maximum(power.sum(axis=-1), 1e-30)
+    mean = (power * taps).sum(axis=-1) / total
+    return np.sqrt(np.maximum((power * taps ** 2).sum(axis=-1) / total - mean ** 2, 0))
+
+def _compare(cir: np.ndarray, reference: np.ndarray) -> dict:
+    """Errors of a CIR against the full-mesh one (taps are energy-normalized per link)."""
+    error = np.sum(np.abs(cir - reference) ** 2, axis=-1)
+    energy = np.maximum(np.sum(np.abs(reference) ** 2, axis=-1), 1e-30)
+    nmse_db = 10 * np.log10(np.maximum(error / energy, 1e-12))
+    delay_error = np.abs(_rms_delay_spread(cir) - _rms_delay_spread(reference))
+    return {
+        "nmse_db_mean": float(np.mean(nmse_db)),
+        "nmse_db_max": float(np.max(nmse_db)),
+        "delay_spread_error_taps_mean": float(np.mean(delay_error)),
+        "delay_spread_error_taps_max": float(np.max(delay_error)),
+    }
+
+def _triangles(config: Config, lod: str) -> int:
+    path = scene_assets.prepare_lod(config.scene_name, lod, config.radio_configs.frequency)
+    with open(os.path.join(path, "manifest.json")) as f:
+        return sum(shape.get("triangles", 0) for shape in json.load(f)["shapes"])
+
+def lod_report(config: Config, steps: int) -> dict:
+    """Runs the first `steps` steps (drones moving together) at every level of detail."""
+    trajectories = motion.calculate_trajectories(config.drones, config.simulation_steps)
+    steps = min(steps, config.simulation_steps)
+    cirs, report = {}, {"scene_name": config.scene_name, "frequency": config.radio_configs.frequency,
+                        "steps": steps, "levels": {}}
+
+    for lod in scene_assets.LOD_LEVELS:
+        lod_config = config.copy(update={"lod": lod})
+        cirs[lod], seconds = [], []
+        for step in range(steps):
+            drones = [Drone(location=location) for location in trajectories[:, step].tolist()]
+            start = time.perf_counter()
+            cirs[lod].append(_decode_cir(_run_sionna_step(lod_config, drones, step)))
+            seconds.append(time.perf_counter() - start)
+
+        level = {
+            "tolerance_m": scene_assets.lod_tolerance(lod, config.radio_configs.frequency),
+            "triangles": _triangles(config, lod),
+            # The first step includes loading the scene
+            "first_step_seconds": seconds[0],
+            "mean_step_seconds": float(np.mean(seconds[1:] or seconds)),
+        }
+        if lod != "full":
+            level.update(_compare(np.stack(cirs[lod]), np.stack(cirs["full"])))
+            level["speedup"] = report["levels"]["full"]["mean_step_seconds"] / level["mean_step_seconds"]
+        report["levels"][lod] = level
+        logger.info(f"{lod}: {level}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("config", help="Job config JSON file")
+    parser.add_argument("--steps", type=int, default=3, help="Number of trajectory steps to compare")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = Config(**json.load(f))
+    report = lod_report(config, args.steps)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,89 @@
+import os
+import resource
+from typing import Optional, Tuple
+from loguru import logger
+
+from app.models.configs import SolverConfig
+
+# Approximate solver memory per candidate path and interaction depth
+# (vertices, interaction types, object/primitive ids, field coefficients)
+BYTES_PER_PATH_DEPTH = int(os.getenv("SOLVER_BYTES_PER_PATH_DEPTH", 64))
+
+_peak_rss = 0
+
+
+def _container_memory_bytes() -> Optional[int]:
+    """Memory limit of the container (cgroup v2 or v1), or of the host."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            # "max" and huge v1 values mean no limit is set
+            if value.isdigit() and int(value) < 1 << 60:
+                return int(value)
+        except OSError:
+            continue
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError):
+        return None
+
+def memory_limit_bytes() -> int:
+    """RAM ceiling for a single solver run (SIMULATION_MEMORY_LIMIT_MB, else 70% of available)."""
+    if os.getenv("SIMULATION_MEMORY_LIMIT_MB"):
+        return int(float(os.environ["SIMULATION_MEMORY_LIMIT_MB"]) * 2**20)
+    available = _container_memory_bytes() or 8 * 2**30
+    return int(available * 0.7)
+
+def estimate_solver_bytes(num_sources: int, solver: SolverConfig) -> int:
+    """Estimated peak memory of the path solver for the given sources and budget."""
+    paths_per_src = min(solver.samples_per_src, solver.max_num_paths_per_src)
+    return num_sources * paths_per_src * solver.max_depth * BYTES_PER_PATH_DEPTH
+
+def plan_source_chunks(num_drones: int, elements_per_drone: int,
+                       solver: SolverConfig) -> Tuple[int, SolverConfig]:
+    """Number of drones to trace per solver run so each run fits the RAM ceiling.
+
+    If a single drone does not fit, its sample budget is reduced instead,
+    trading path accuracy for not being OOM-killed.
+    """
+    limit = memory_limit_bytes()
+    per_drone = estimate_solver_bytes(elements_per_drone, solver)
+    if per_drone <= limit:
+        drones_per_chunk = max(1, min(num_drones, limit // max(per_drone, 1)))
+        return drones_per_chunk, solver
+
+    scale = limit / per_drone
+    reduced = solver.copy(update={
+        "samples_per_src": max(1, int(solver.samples_per_src * scale)),
+        "max_num_paths_per_src": max(1, int(solver.max_num_paths_per_src * scale)),
+    })
+    logger.warning(
+        f"Solver budget needs ~{per_drone / 2**20:.0f} MB per drone, above the "
+        f"{limit / 2**20:.0f} MB ceiling; reducing samples_per_src to {reduced.samples_per_src}"
+    )
+    return 1, reduced
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def reset_peak():
+    """Starts tracking the peak memory of a new job."""
+    global _peak_rss
+    _peak_rss = current_rss_bytes()
+
+def sample_peak() -> int:
+    """Records the current RSS and returns the peak since the last reset."""
+    global _peak_rss
+    _peak_rss = max(_peak_rss, current_rss_bytes())
+    return _peak_rss
+
+def peak_mb() -> float:
+    """Peak RSS since the last reset, in megabytes."""
+    return sample_peak() / 2**20
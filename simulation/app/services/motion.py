@@ -0,0 +1,103 @@
+"""Drone trajectories, generated as NumPy arrays.
+
+Every drone gets one position per step, so the position of any drone at any
+step (or combination of steps, in independent mode) is a plain array index.
+
+Motion types:
+- line: straight line from the drone's location to motion.end_position.
+- circle: one lap of a circle of motion.radius, whose leftmost point is the
+  drone's location.
+- waypoints: polyline from the drone's location through motion.waypoints.
+- spline: Catmull-Rom spline from the drone's location through motion.waypoints.
+
+motion.velocity_profile sets how the progress along the path evolves over the
+steps: "constant", "ease_in_out", "accelerate" or "decelerate". Waypoint and
+spline paths are parameterized by arc length, so "constant" is constant speed.
+"""
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from app.models.configs import Drone, Motion
+
+# Polyline samples per spline segment, used to parameterize splines by arc length
+SPLINE_SAMPLES_PER_SEGMENT = 64
+
+VELOCITY_PROFILES: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "constant": lambda u: u,
+    "ease_in_out": lambda u: u * u * (3 - 2 * u),
+    "accelerate": lambda u: u * u,
+    "decelerate": lambda u: 1 - (1 - u) ** 2,
+}
+
+
+def _progress(motion: Motion, steps: int, closed: bool = False) -> np.ndarray:
+    """Fraction of the path covered at each step, in [0, 1].
+
+    A closed path stops one step short of the start, which it would repeat.
+    """
+    if motion.velocity_profile not in VELOCITY_PROFILES:
+        raise ValueError(f"Unknown velocity profile '{motion.velocity_profile}', "
+                         f"expected one of {list(VELOCITY_PROFILES)}")
+    u = np.arange(steps) / steps if closed else np.linspace(0.0, 1.0, steps)
+    return VELOCITY_PROFILES[motion.velocity_profile](u)
+
+def _along_polyline(points: np.ndarray, progress: np.ndarray) -> np.ndarray:
+    """Positions at the given fractions of the length of a polyline, [len(progress), 3]."""
+    distance = np.concatenate([[0.0], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))])
+    if distance[-1] == 0:
+        return np.repeat(points[:1], len(progress), axis=0)
+    targets = progress * distance[-1]
+    return np.stack([np.interp(targets, distance, points[:, axis]) for axis in range(3)], axis=1)
+
+def _catmull_rom(points: np.ndarray, samples_per_segment: int = SPLINE_SAMPLES_PER_SEGMENT) -> np.ndarray:
+    """Dense polyline along a uniform Catmull-Rom spline through the points."""
+    padded = np.concatenate([points[:1], points, points[-1:]])
+    p0, p1, p2, p3 = (padded[i:i + len(points) - 1, None, :] for i in range(4))
+    t = np.linspace(0.0, 1.0, samples_per_segment, endpoint=False)[None, :, None]
+    curve = 0.5 * (2 * p1 + (p2 - p0) * t + (2 * p0 - 5 * p1 + 4 * p2 - p3) * t ** 2
+                   + (3 * p1 - p0 - 3 * p2 + p3) * t ** 3)
+    return np.concatenate([curve.reshape(-1, 3), points[-1:]])
+
+def _path_points(drone: Drone) -> np.ndarray:
+    """The drone's location followed by its waypoints"""
+    if not drone.motion.waypoints:
+        raise ValueError(f"Motion type '{drone.motion.motion_type}' requires waypoints")
+    return np.array([drone.location] + drone.motion.waypoints, dtype=float)
+
+def trajectory(drone: Drone, steps: int) -> np.ndarray:
+    """Positions of one drone at every step, [steps, 3]."""
+    location = np.array(drone.location, dtype=float)
+    if not (drone.has_motion and drone.motion):
+        return np.repeat(location[None, :], steps, axis=0)
+
+    motion = drone.motion
+    if motion.motion_type == "line":
+        if not motion.end_position:
+            raise ValueError("Motion type 'line' requires end_position")
+        progress = _progress(motion, steps)[:, None]
+        return location + progress * (np.array(motion.end_position, dtype=float) - location)
+    if motion.motion_type == "circle":
+        # Start at 180 degrees (the leftmost point) and go around the circle
+        # centered one radius to the right of the drone
+        angles = np.pi + 2 * np.pi * _progress(motion, steps, closed=True)
+        center = location + np.array([motion.radius, 0.0, 0.0])
+        offsets = motion.radius * np.stack([np.cos(angles), np.sin(angles), np.zeros(steps)], axis=1)
+        return center + offsets
+    if motion.motion_type == "waypoints":
+        return _along_polyline(_path_points(drone), _progress(motion, steps))
+    if motion.motion_type == "spline":
+        return _along_polyline(_catmull_rom(_path_points(drone)), _progress(motion, steps))
+    raise ValueError(f"Unknown motion type '{motion.motion_type}'")
+
+def calculate_trajectories(drones: List[Drone], steps: int) -> np.ndarray:
+    """Positions of every drone at every step, [drones, steps, 3]."""
+    return np.stack([trajectory(drone, steps) for drone in drones])
+
+def combination_steps(index: int, lengths: List[int]) -> List[int]:
+    """Decodes a combination index into per-drone step indices, in itertools.product order."""
+    steps = []
+    for length in reversed(lengths):
+        index, step_idx = divmod(index, length)
+        steps.append(step_idx)
+    return steps[::-1]
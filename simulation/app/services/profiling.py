@@ -0,0 +1,143 @@
+"""Per-job profiling, enabled with `profile: true` in a job config.
+
+While a profile is active, run_simulation records:
+- a cProfile profile of the Python side of the whole run;
+- per step: the wall time of each stage (see stage()), the peak RSS and the
+  Dr.Jit kernel launches with their compile and execution times.
+
+The artifact is a JSON document uploaded to the database service, which
+links it from the job (GET /jobs/{job_id}/profiles). Stages and steps are
+no-ops when no profile is active, so unprofiled jobs pay nothing.
+"""
+import base64
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from app.services import memory
+
+# Functions listed in the text summary of the Python profile
+PROFILE_TOP_FUNCTIONS = int(os.getenv("PROFILE_TOP_FUNCTIONS", 40))
+
+_active: Optional["JobProfile"] = None
+
+
+class JobProfile:
+    """Measurements of one run of run_simulation (a job or one of its shards)."""
+
+    def __init__(self, job_id: str, shard_index: Optional[int] = None):
+        self.job_id = job_id
+        self.shard_index = shard_index
+        self.steps = []
+        self.stage_totals: Dict[str, float] = defaultdict(float)
+        self._stages: Dict[str, float] = defaultdict(float)
+        self._step_start = time.perf_counter()
+        self._step_peak = 0
+        self._started = time.perf_counter()
+        self._python = cProfile.Profile()
+        self._kernel_history = _set_kernel_history(True)
+
+    def add_stage(self, name: str, seconds: float):
+        self._stages[name] += seconds
+        self.stage_totals[name] += seconds
+        self._step_peak = max(self._step_peak, memory.current_rss_bytes())
+
+    def end_step(self, step: Any):
+        self._step_peak = max(self._step_peak, memory.current_rss_bytes())
+        self.steps.append({
+            "step": step,
+            "seconds": time.perf_counter() - self._step_start,
+            "stages": dict(self._stages),
+            "peak_rss_mb": self._step_peak / 2**20,
+            "drjit": _kernel_stats() if self._kernel_history else None,
+        })
+        self._stages.clear()
+        self._step_peak = 0
+        self._step_start = time.perf_counter()
+
+    def artifact(self) -> Dict[str, Any]:
+        """JSON-friendly profile; python_stats holds the marshalled pstats data, loadable with pstats."""
+        summary = io.StringIO()
+        stats = pstats.Stats(self._python, stream=summary)
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        return {
+            "job_id": self.job_id,
+            "shard_index": self.shard_index,
+            "seconds": time.perf_counter() - self._started,
+            "peak_rss_mb": memory.peak_mb(),
+            "stages": dict(self.stage_totals),
+            "steps": self.steps,
+            "python_profile": summary.getvalue(),
+            "python_stats": base64.b64encode(marshal.dumps(stats.stats)).decode("utf-8"),
+        }
+
+
+def start(job_id: str, shard_index: Optional[int] = None) -> JobProfile:
+    """Starts profiling the current run."""
+    global _active
+    _active = JobProfile(job_id, shard_index)
+    _active._python.enable()
+    logger.info(f"Profiling job {job_id} (shard {shard_index})")
+    return _active
+
+def stop() -> Optional[Dict[str, Any]]:
+    """Stops profiling and returns the artifact, or None when no profile was active."""
+    global _active
+    profile, _active = _active, None
+    if profile is None:
+        return None
+    profile._python.disable()
+    if profile._kernel_history:
+        _set_kernel_history(False)
+    return profile.artifact()
+
+@contextmanager
+def stage(name: str):
+    """Times a stage of the current step when a profile is active."""
+    if _active is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        if _active is not None:
+            _active.add_stage(name, time.perf_counter() - start_time)
+
+def end_step(step: Any):
+    """Closes the measurements of a step when a profile is active."""
+    if _active is not None:
+        _active.end_step(step)
+
+
+def _set_kernel_history(enabled: bool) -> bool:
+    """Turns Dr.Jit's kernel history on or off, returning whether it is available."""
+    try:
+        import drjit as dr
+        dr.set_flag(dr.JitFlag.KernelHistory, enabled)
+        if enabled:
+            dr.kernel_history()  # Drop the launches that happened before the run
+        return True
+    except Exception as e:
+        logger.warning(f"Dr.Jit kernel history unavailable: {e}")
+        return False
+
+def _kernel_stats() -> Dict[str, Any]:
+    """Kernel launches since the last call, with their summed compile and execution times (ms)."""
+    import drjit as dr
+    history = dr.kernel_history()
+    stats: Dict[str, Any] = {"launches": len(history), "cache_hits": 0}
+    for kernel in history:
+        stats["cache_hits"] += bool(kernel.get("cache_hit"))
+        for key in ("codegen_time", "backend_time", "execution_time", "operation_count"):
+            if isinstance(kernel.get(key), (int, float)):
+                stats[key] = stats.get(key, 0) + kernel[key]
+    return stats
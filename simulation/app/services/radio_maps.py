@@ -0,0 +1,162 @@
+"""Precomputed path-gain maps for radio-map jobs.
+
+In radio-map mode the drones without motion are the transmitters. For each of
+them a stack of planar gain maps (one per altitude layer) is computed with
+Sionna RT's RadioMapSolver over the bounding region of all trajectories, and
+the path gain to every drone at every step is then read from the maps by
+trilinear interpolation instead of tracing paths.
+
+Maps are cached on disk per scene, transmitter position, grid and radio setup
+(RADIO_MAP_CACHE_DIR/<scene>/<key>.npy), so jobs sharing a transmitter and
+grid reuse them. The region is snapped outward to the cell grid, which makes
+jobs over the same area produce the same grid.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from loguru import logger
+
+from app.models.configs import Config
+from app.services import scene_assets
+
+RADIO_MAP_CACHE_DIR = os.getenv("RADIO_MAP_CACHE_DIR", os.path.join(scene_assets.SCENES_DIR, ".radio_maps"))
+
+
+def fixed_transmitters(config: Config) -> List[int]:
+    """Indices of the drones used as transmitters: those without motion."""
+    fixed = [i for i, drone in enumerate(config.drones) if not drone.has_motion]
+    if not fixed:
+        raise ValueError("Radio-map mode needs at least one drone without motion")
+    return fixed
+
+def map_grid(config: Config, trajectories: np.ndarray) -> Dict[str, Any]:
+    """Grid of the gain maps covering every position of the trajectories ([drones, steps, 3])."""
+    settings = config.radio_map
+    cell = settings.cell_size
+    positions = trajectories.reshape(-1, 3)
+    low = np.floor((positions[:, :2].min(axis=0) - settings.margin) / cell) * cell
+    high = np.ceil((positions[:, :2].max(axis=0) + settings.margin) / cell) * cell
+    cells = np.maximum(np.round((high - low) / cell).astype(int), 1)
+    if settings.altitudes:
+        altitudes = sorted(float(z) for z in settings.altitudes)
+    else:
+        # Layers every altitude_spacing meters, bracketing every drone altitude
+        spacing = settings.altitude_spacing
+        z_low = np.floor(positions[:, 2].min() / spacing) * spacing
+        z_high = np.ceil(positions[:, 2].max() / spacing) * spacing
+        altitudes = np.round(np.arange(z_low, z_high + spacing / 2, spacing), 3).tolist()
+    return {
+        "origin": low.tolist(),
+        "cells": cells.tolist(),  # [x, y]
+        "cell_size": cell,
+        "altitudes": altitudes,
+    }
+
+def _scene_hash(scene_name: str) -> str:
+    prepared = scene_assets.prepared_dir(scene_name)
+    return os.path.basename(prepared) if prepared else scene_assets.content_hash(scene_name)
+
+def _cache_path(config: Config, grid: Dict[str, Any], tx_position: List[float]) -> str:
+    key = {
+        "scene": _scene_hash(config.scene_name),
+        "lod": config.lod,
+        "frequency": config.radio_configs.frequency,
+        "antenna": config.antenna_configs.dict(),
+        "samples_per_tx": config.radio_map.samples_per_tx,
+        "max_depth": config.radio_map.max_depth,
+        "grid": grid,
+        "tx": np.round(tx_position, 3).tolist(),
+    }
+    digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:24]
+    return os.path.join(RADIO_MAP_CACHE_DIR, config.scene_name, f"{digest}.npy")
+
+def _solve(scene, config: Config, grid: Dict[str, Any], tx_positions: List[List[float]]) -> np.ndarray:
+    """Gain maps of the given transmitters, [tx, layers, cells_y, cells_x] (linear scale)."""
+    import mitsuba as mi
+    from sionna.rt import RadioMapSolver, Transmitter
+
+    for i, position in enumerate(tx_positions):
+        scene.add(Transmitter(name=f"tx_{i}", position=position))
+    cell = grid["cell_size"]
+    size = [cells * cell for cells in grid["cells"]]
+    center_x, center_y = (origin + extent / 2 for origin, extent in zip(grid["origin"], size))
+    solver = RadioMapSolver()
+    layers = []
+    try:
+        for altitude in grid["altitudes"]:
+            radio_map = solver(scene,
+                               center=mi.Point3f(center_x, center_y, altitude),
+                               orientation=mi.Point3f(0, 0, 0),
+                               size=mi.Point2f(*size),
+                               cell_size=mi.Point2f(cell, cell),
+                               samples_per_tx=config.radio_map.samples_per_tx,
+                               max_depth=config.radio_map.max_depth,
+                               los=True,
+                               specular_reflection=True,
+                               diffuse_reflection=True,
+                               refraction=True,
+                               seed=32)
+            layers.append(radio_map.path_gain.numpy())
+    finally:
+        for i in range(len(tx_positions)):
+            scene.remove(f"tx_{i}")
+    return np.stack(layers, axis=1)
+
+def gain_maps(config: Config, grid: Dict[str, Any], tx_positions: List[List[float]],
+              load_scene: Callable[[], Any]) -> np.ndarray:
+    """Gain maps of every transmitter, [tx, layers, cells_y, cells_x], from the cache when possible.
+
+    load_scene returns the configured scene and is only called when some
+    transmitter has no cached maps; those are solved together.
+    """
+    paths = [_cache_path(config, grid, position) for position in tx_positions]
+    maps: List[Any] = [np.load(path) if os.path.exists(path) else None for path in paths]
+    missing = [i for i, tx_maps in enumerate(maps) if tx_maps is None]
+    logger.info(f"Radio maps: {len(maps) - len(missing)} cached, {len(missing)} to compute "
+                f"({grid['cells'][0]}x{grid['cells'][1]} cells, {len(grid['altitudes'])} layers)")
+    if missing:
+        solved = _solve(load_scene(), config, grid, [tx_positions[i] for i in missing])
+        for i, tx_maps in zip(missing, solved):
+            maps[i] = tx_maps
+            os.makedirs(os.path.dirname(paths[i]), exist_ok=True)
+            staging = f"{paths[i]}.{os.getpid()}.tmp.npy"
+            np.save(staging, tx_maps)
+            os.replace(staging, paths[i])
+    return np.stack(maps)
+
+def _bracket(coordinates: np.ndarray, axis: np.ndarray):
+    """Neighbouring indices along a sorted axis and the weight of the upper one (clamped at the ends)."""
+    if len(axis) == 1:
+        index = np.zeros(coordinates.shape, dtype=int)
+        return index, index, np.zeros(coordinates.shape)
+    upper = np.clip(np.searchsorted(axis, coordinates), 1, len(axis) - 1)
+    lower = upper - 1
+    weight = np.clip((coordinates - axis[lower]) / (axis[upper] - axis[lower]), 0.0, 1.0)
+    return lower, upper, weight
+
+def lookup(maps: np.ndarray, grid: Dict[str, Any], positions: np.ndarray) -> np.ndarray:
+    """Path gains (linear) of every transmitter at the given positions.
+
+    Args:
+        maps: Gain maps, [tx, layers, cells_y, cells_x].
+        positions: Receiver positions, [..., 3].
+
+    Returns:
+        np.ndarray: Gains of shape [tx, ...].
+    """
+    cell = grid["cell_size"]
+    centers_x = grid["origin"][0] + (np.arange(grid["cells"][0]) + 0.5) * cell
+    centers_y = grid["origin"][1] + (np.arange(grid["cells"][1]) + 0.5) * cell
+    x0, x1, wx = _bracket(positions[..., 0], centers_x)
+    y0, y1, wy = _bracket(positions[..., 1], centers_y)
+    z0, z1, wz = _bracket(positions[..., 2], np.asarray(grid["altitudes"], dtype=float))
+
+    gains = 0.0
+    for z, fz in ((z0, 1 - wz), (z1, wz)):
+        for y, fy in ((y0, 1 - wy), (y1, wy)):
+            for x, fx in ((x0, 1 - wx), (x1, wx)):
+                gains = gains + maps[:, z, y, x] * (fz * fy * fx)
+    return gains
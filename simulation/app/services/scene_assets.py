@@ -0,0 +1,371 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+SCENES_DIR = os.getenv("SCENES_DIR", "/3d_models")
+# Prepared artifacts live under <PREPARED_SCENES_DIR>/<scene>/<content hash>/
+PREPARED_SCENES_DIR = os.getenv("PREPARED_SCENES_DIR", os.path.join(SCENES_DIR, ".prepared"))
+# Slab thickness (m) of the ITU materials, as assumed by Sionna for legacy "mat-itu_*" materials
+MATERIAL_THICKNESS = float(os.getenv("PREPARED_MATERIAL_THICKNESS", 0.1))
+
+# Levels of detail and their simplification tolerance, as a fraction of the wavelength
+# (the database service admits jobs against the same names, see its job_queue.LOD_LEVELS)
+LOD_LEVELS = {"full": 0.0, "fine": 0.1, "medium": 0.25, "coarse": 0.5}
+SPEED_OF_LIGHT = 299792458.0
+# Levels built ahead of time by prepare_all_scenes, for these carrier frequencies (Hz);
+# other levels and frequencies are simplified on first use
+PREPARED_LODS = [lod for lod in os.getenv("PREPARED_LODS", "fine,medium,coarse").split(",") if lod]
+PREPARED_LOD_FREQUENCIES = [float(f) for f in os.getenv("PREPARED_LOD_FREQUENCIES", "6e9").split(",") if f]
+
+PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8",
+}
+
+
+class SceneValidationError(ValueError):
+    """Raised when a scene cannot be converted to prepared assets."""
+
+
+def scene_xml_path(scene_name: str) -> str:
+    return os.path.join(SCENES_DIR, scene_name, "Mitsuba", f"{scene_name}.xml")
+
+def _read_polygons(data: bytes, offset: int, count: int, count_type: np.dtype,
+                   index_type: np.dtype) -> Tuple[np.ndarray, int]:
+    """Reads variable-length PLY faces, fan-triangulating polygons."""
+    triangles = []
+    for _ in range(count):
+        n = int(np.frombuffer(data, count_type, 1, offset)[0])
+        offset += count_type.itemsize
+        polygon = np.frombuffer(data, index_type, n, offset)
+        offset += n * index_type.itemsize
+        triangles.extend((polygon[0], polygon[i], polygon[i + 1]) for i in range(1, n - 1))
+    return np.asarray(triangles, dtype=np.uint32).reshape(-1, 3), offset
+
+def read_ply(path: str) -> Dict[str, np.ndarray]:
+    """Reads positions, normals (if any) and triangles from a binary PLY mesh."""
+    with open(path, "rb") as f:
+        header = []
+        while not header or header[-1] != "end_header":
+            line = f.readline()
+            if not line:
+                raise SceneValidationError(f"{path}: truncated PLY header")
+            header.append(line.decode("ascii").strip())
+        data = f.read()
+
+    if header[0] != "ply":
+        raise SceneValidationError(f"{path}: not a PLY file")
+    ply_format, elements = None, []
+    for line in header[1:]:
+        parts = line.split()
+        if parts[0] == "format":
+            ply_format = parts[1]
+        elif parts[0] == "element":
+            elements.append((parts[1], int(parts[2]), []))
+        elif parts[0] == "property" and parts[1] == "list":
+            elements[-1][2].append((parts[4], PLY_TYPES[parts[2]], PLY_TYPES[parts[3]]))
+        elif parts[0] == "property":
+            elements[-1][2].append((parts[2], PLY_TYPES[parts[1]]))
+    if ply_format not in ("binary_little_endian", "binary_big_endian"):
+        raise SceneValidationError(f"{path}: unsupported PLY format '{ply_format}', export as binary")
+    endian = "<" if ply_format == "binary_little_endian" else ">"
+
+    offset, vertex, faces = 0, None, None
+    for name, count, properties in elements:
+        if all(len(p) == 2 for p in properties):
+            dtype = np.dtype([(p[0], endian + p[1]) for p in properties])
+            values = np.frombuffer(data, dtype, count, offset)
+            offset += count * dtype.itemsize
+            if name == "vertex":
+                vertex = values
+        elif name == "face" and len(properties) == 1:
+            count_type = np.dtype(endian + properties[0][1])
+            index_type = np.dtype(endian + properties[0][2])
+            # Fast path for meshes made only of triangles
+            triangle = np.dtype([("n", count_type), ("i", index_type, 3)])
+            fits = len(data) >= offset + count * triangle.itemsize
+            values = np.frombuffer(data, triangle, count, offset) if fits else None
+            if values is not None and np.all(values["n"] == 3):
+                faces = values["i"].astype(np.uint32)
+                offset += count * triangle.itemsize
+            else:
+                faces, offset = _read_polygons(data, offset, count, count_type, index_type)
+        else:
+            raise SceneValidationError(f"{path}: unsupported PLY element '{name}'")
+
+    if vertex is None or faces is None:
+        raise SceneValidationError(f"{path}: PLY has no vertex or face element")
+    if faces.size and faces.max() >= len(vertex):
+        raise SceneValidationError(f"{path}: face indices out of range")
+
+    mesh = {
+        "vertices": np.stack([vertex["x"], vertex["y"], vertex["z"]], axis=1).astype(np.float32),
+        "faces": faces,
+    }
+    if {"nx", "ny", "nz"} <= set(vertex.dtype.names):
+        mesh["normals"] = np.stack([vertex["nx"], vertex["ny"], vertex["nz"]], axis=1).astype(np.float32)
+    return mesh
+
+def parse_scene_xml(scene_name: str) -> List[Dict[str, str]]:
+    """Lists the shapes of a scene with their mesh file and ITU material type."""
+    xml_path = scene_xml_path(scene_name)
+    root = ET.parse(xml_path).getroot()
+    bsdf_ids = {bsdf.get("id") for bsdf in root.iter("bsdf")}
+
+    shapes = []
+    for shape in root.iter("shape"):
+        shape_id = shape.get("id")
+        if shape.get("type") != "ply":
+            raise SceneValidationError(f"{scene_name}: shape '{shape_id}' has unsupported type '{shape.get('type')}'")
+        if shape.find("transform") is not None:
+            raise SceneValidationError(f"{scene_name}: shape '{shape_id}' has a transform")
+        filename = shape.find("string[@name='filename']")
+        material = shape.find("ref[@name='bsdf']")
+        if filename is None or material is None or material.get("id") not in bsdf_ids:
+            raise SceneValidationError(f"{scene_name}: shape '{shape_id}' has no mesh file or material")
+        material_id = material.get("id")
+        if "itu_" not in material_id:
+            raise SceneValidationError(f"{scene_name}: material '{material_id}' is not an ITU material")
+        shapes.append({
+            "id": shape_id,
+            "filename": os.path.join(os.path.dirname(xml_path), filename.get("value")),
+            "itu_type": material_id.split("itu_", 1)[1],
+        })
+    return shapes
+
+def _itu_material_types() -> set:
+    # Includes "human" once add_human_material.py has patched Sionna
+    from sionna.rt.radio_materials.itu import ITU_MATERIALS_PROPERTIES
+    return set(ITU_MATERIALS_PROPERTIES)
+
+def _source_files(scene_name: str) -> List[str]:
+    return [scene_xml_path(scene_name)] + [shape["filename"] for shape in parse_scene_xml(scene_name)]
+
+def content_hash(scene_name: str) -> str:
+    """Hash of the scene XML and every mesh it references."""
+    digest = hashlib.sha256()
+    for path in _source_files(scene_name):
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+def _stamp(scene_name: str) -> Dict[str, List[int]]:
+    """Sizes and modification times of the source files, to skip rehashing unchanged scenes."""
+    stamp = {}
+    for path in _source_files(scene_name):
+        stat = os.stat(path)
+        stamp[path] = [stat.st_size, stat.st_mtime_ns]
+    return stamp
+
+def _write_current(scene_dir: str, scene_hash: str, stamp: Dict[str, List[int]]):
+    """Points a scene at its prepared assets; written atomically, as several workers may do it at once."""
+    staging = os.path.join(scene_dir, f"current.json.{os.getpid()}.tmp")
+    with open(staging, "w") as f:
+        json.dump({"hash": scene_hash, "stamp": stamp}, f)
+    os.replace(staging, os.path.join(scene_dir, "current.json"))
+
+def prepared_dir(scene_name: str) -> Optional[str]:
+    """Directory of the up-to-date prepared assets of a scene, if any."""
+    scene_dir = os.path.join(PREPARED_SCENES_DIR, scene_name)
+    try:
+        with open(os.path.join(scene_dir, "current.json")) as f:
+            current = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stamp = _stamp(scene_name)
+    if current.get("stamp") != stamp:
+        if current.get("hash") != content_hash(scene_name):
+            return None
+        # Touched but unchanged sources: record the new stamp so they are not rehashed on every call
+        _write_current(scene_dir, current["hash"], stamp)
+    path = os.path.join(scene_dir, current["hash"])
+    return path if os.path.exists(os.path.join(path, "manifest.json")) else None
+
+def prepare_scene(scene_name: str, force: bool = False) -> str:
+    """Validates a scene and converts its meshes to memory-mappable arrays.
+
+    Artifacts are keyed by the content hash of the sources and only rebuilt
+    when those change. Returns the directory of the prepared assets.
+    """
+    if not force:
+        existing = prepared_dir(scene_name)
+        if existing:
+            return existing
+
+    shapes = parse_scene_xml(scene_name)
+    known_types = _itu_material_types()
+    for shape in shapes:
+        if shape["itu_type"] not in known_types:
+            raise SceneValidationError(
+                f"{scene_name}: unknown ITU material '{shape['itu_type']}' "
+                f"(is Sionna patched by add_human_material.py?)"
+            )
+
+    scene_hash = content_hash(scene_name)
+    scene_dir = os.path.join(PREPARED_SCENES_DIR, scene_name)
+    target = os.path.join(scene_dir, scene_hash)
+    os.makedirs(scene_dir, exist_ok=True)
+
+    if force or not os.path.exists(os.path.join(target, "manifest.json")):
+        logger.info(f"Preparing scene assets: {scene_name} ({scene_hash})")
+        # Built in a temporary directory and renamed, so concurrent workers never see partial files
+        staging = tempfile.mkdtemp(dir=scene_dir)
+        manifest = {"scene": scene_name, "hash": scene_hash, "shapes": []}
+        for shape in shapes:
+            mesh = read_ply(shape["filename"])
+            entry = {"id": shape["id"], "itu_type": shape["itu_type"], "triangles": len(mesh["faces"])}
+            for key, array in mesh.items():
+                filename = f"{shape['id']}.{key}.npy"
+                np.save(os.path.join(staging, filename), np.ascontiguousarray(array))
+                entry[key] = filename
+            manifest["shapes"].append(entry)
+        with open(os.path.join(staging, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+
+    _write_current(scene_dir, scene_hash, _stamp(scene_name))
+    return target
+
+def simplify_mesh(mesh: Dict[str, np.ndarray], tolerance: float) -> Dict[str, np.ndarray]:
+    """Simplifies a mesh by vertex clustering, moving no vertex by more than `tolerance` (m).
+
+    Vertices are merged per grid cell into their mean, triangles that collapse
+    are dropped. Geometry smaller than the tolerance disappears, which is the
+    point: it is well below what the radio waves resolve.
+    """
+    vertices, faces = mesh["vertices"], mesh["faces"]
+    # The cell diagonal bounds the distance between a vertex and its cluster mean
+    cell = tolerance / np.sqrt(3)
+    keys = np.floor((vertices - vertices.min(axis=0)) / cell).astype(np.int64)
+    _, cluster, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    cluster = cluster.ravel()
+
+    def cluster_mean(values):
+        return np.stack([np.bincount(cluster, values[:, i], len(counts)) for i in range(3)], axis=1) / counts[:, None]
+
+    faces = cluster[faces]
+    degenerate = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 0] == faces[:, 2])
+    faces = faces[~degenerate]
+    # Drop triangles merged onto the same vertices, keeping the first one's orientation
+    _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    faces = faces[np.sort(first)]
+    used, faces = np.unique(faces, return_inverse=True)
+
+    simplified = {
+        "vertices": cluster_mean(vertices)[used].astype(np.float32),
+        "faces": faces.reshape(-1, 3).astype(np.uint32),
+    }
+    if "normals" in mesh:
+        normals = cluster_mean(mesh["normals"])[used]
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        simplified["normals"] = (normals / np.where(lengths > 0, lengths, 1)).astype(np.float32)
+    return simplified
+
+def lod_tolerance(lod: str, frequency: float) -> float:
+    """Simplification tolerance in meters of a level of detail at a carrier frequency."""
+    if lod not in LOD_LEVELS:
+        raise ValueError(f"Unknown level of detail '{lod}', expected one of {list(LOD_LEVELS)}")
+    return LOD_LEVELS[lod] * SPEED_OF_LIGHT / frequency
+
+def prepare_lod(scene_name: str, lod: str, frequency: float) -> str:
+    """Directory of the prepared assets of a scene at a level of detail, building them if needed.
+
+    Levels are keyed by their tolerance in millimeters, so jobs at nearby
+    frequencies share the same simplified meshes.
+    """
+    base = prepare_scene(scene_name)
+    tolerance_mm = round(lod_tolerance(lod, frequency) * 1000)
+    if tolerance_mm == 0:
+        return base
+    target = os.path.join(base, f"lod-{tolerance_mm}mm")
+    if os.path.exists(os.path.join(target, "manifest.json")):
+        return target
+
+    with open(os.path.join(base, "manifest.json")) as f:
+        manifest = json.load(f)
+    logger.info(f"Simplifying scene {scene_name} at {tolerance_mm} mm ({lod})")
+    staging = tempfile.mkdtemp(dir=base)
+    manifest["tolerance_m"] = tolerance_mm / 1000
+    for entry in manifest["shapes"]:
+        mesh = {key: np.load(os.path.join(base, entry[key])) for key in ("vertices", "faces", "normals") if key in entry}
+        mesh = simplify_mesh(mesh, tolerance_mm / 1000)
+        for key, array in mesh.items():
+            np.save(os.path.join(staging, entry[key]), array)
+        entry["triangles"] = len(mesh["faces"])
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    return target
+
+def load_prepared_scene(scene_name: str, lod: str = "full", frequency: float = 6e9):
+    """Builds a Sionna scene from prepared assets, preparing them first if needed."""
+    import mitsuba as mi
+    from sionna.rt import ITURadioMaterial, SceneObject, load_scene
+
+    path = prepare_lod(scene_name, lod, frequency)
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    scene = load_scene()
+    materials, objects = {}, []
+    for shape in manifest["shapes"]:
+        # Memory-mapped, so processes on a host share the page-cached arrays
+        arrays = {key: np.load(os.path.join(path, shape[key]), mmap_mode="r")
+                  for key in ("vertices", "faces", "normals") if key in shape}
+        mesh = mi.Mesh(shape["id"],
+                       vertex_count=len(arrays["vertices"]),
+                       face_count=len(arrays["faces"]),
+                       has_vertex_normals="normals" in arrays)
+        params = mi.traverse(mesh)
+        params["vertex_positions"] = mi.Float(np.ravel(arrays["vertices"]))
+        params["faces"] = mi.UInt32(np.ravel(arrays["faces"]))
+        if "normals" in arrays:
+            params["vertex_normals"] = mi.Float(np.ravel(arrays["normals"]))
+        params.update()
+
+        itu_type = shape["itu_type"]
+        if itu_type not in materials:
+            materials[itu_type] = ITURadioMaterial(f"itu_{itu_type}", itu_type, thickness=MATERIAL_THICKNESS)
+        objects.append(SceneObject(mi_mesh=mesh, name=shape["id"], radio_material=materials[itu_type]))
+
+    scene.edit(add=objects)
+    return scene
+
+def prepare_all_scenes() -> Dict[str, str]:
+    """Prepares every scene found in SCENES_DIR and its PREPARED_LODS, logging the ones that fail validation."""
+    prepared = {}
+    for scene_name in sorted(os.listdir(SCENES_DIR)) if os.path.isdir(SCENES_DIR) else []:
+        if scene_name.startswith(".") or not os.path.exists(scene_xml_path(scene_name)):
+            continue
+        try:
+            prepared[scene_name] = prepare_scene(scene_name)
+            for lod in PREPARED_LODS:
+                for frequency in PREPARED_LOD_FREQUENCIES:
+                    prepare_lod(scene_name, lod, frequency)
+        except (SceneValidationError, OSError, ET.ParseError) as e:
+            logger.error(f"Scene '{scene_name}' cannot be prepared, it will be loaded from XML: {e}")
+    return prepared
+
+if __name__ == "__main__":
+    import app.bootstrap_mitsuba  # noqa: F401  (side-effect: sets variant & registers plugins)
+    names = sys.argv[1:]
+    if names:
+        for name in names:
+            print(f"{name}: {prepare_scene(name, force=True)}")
+    else:
+        for name, path in prepare_all_scenes().items():
+            print(f"{name}: {path}")
@@ -8,80 +8,199 @@ from sionna.rt import load_scene, Transmitter, Receiver, PlanarArray, PathSolver
 import pickle
 import drjit as dr
 import gc
-from app.models.configs import Config, Drone
-from typing import List, Dict, Any, Optional
-import itertools
-import math
+from app.models.configs import AntennaConfig, Config, Drone
+from app.services import cir_codecs, link_metrics, memory, motion, profiling, radio_maps, scene_assets
+from typing import List, Dict, Any, Optional, Callable
 from loguru import logger
-import base64
 import mitsuba as mi
 import traceback
 import requests
+import time
+from collections import OrderedDict
 
-def polar_to_cartesian(radius: float, degree: float) -> tuple[float, float]:
-    """Converts polar coordinates to Cartesian coordinates."""
-    rad = math.radians(degree)
-    x = radius * math.cos(rad)
-    y = radius * math.sin(rad)
-    return float(round(x, 2)), float(round(y, 2))
+# Loaded scenes kept warm between steps and jobs, most recently used last
+SCENE_CACHE_SIZE = int(os.getenv("SCENE_CACHE_SIZE", 2))
+# Keyed by (scene name, level-of-detail tolerance in mm)
+_scene_cache: "OrderedDict[tuple, Any]" = OrderedDict()
+# Build scenes from the preprocessed mesh arrays (see scene_assets.py) instead of parsing the XML/PLY files
+USE_PREPARED_SCENES = os.getenv("USE_PREPARED_SCENES", "true").lower() == "true"
+# Attempts at the final report of a run beyond the first, waiting 2, 4, 8, ... seconds in between
+STATUS_REPORT_RETRIES = int(os.getenv("STATUS_REPORT_RETRIES", 5))
+STATUS_REPORT_BACKOFF_SECONDS = float(os.getenv("STATUS_REPORT_BACKOFF_SECONDS", 2))
 
-def _update_job_status(job_id: str, status: str, progress: int = 0, result: Dict[Any, Any] = None):
-    """Update job status in the database service."""
+
+class SimulationCancelled(Exception):
+    """Raised inside a step when the job is cancelled between solver runs."""
+
+class StatusReportError(Exception):
+    """Raised when the final status of a run could not be reported to the database service."""
+
+def _put_job_status(job_id: str, status: str, progress: int = 0, result: Dict[Any, Any] = None,
+                    stats: Dict[str, Any] = None, shard_index: Optional[int] = None,
+                    checkpoint: Dict[str, Any] = None) -> str:
+    """Send a job (or job shard) status update, raising if the database service did not accept it."""
+    database_url = os.getenv("DATABASE_URL", "http://database:8000")
+    url = f"{database_url}/jobs/{job_id}"
+    if shard_index is not None:
+        url = f"{url}/shards/{shard_index}"
+    update_data = {
+        "status": status,
+        "progress": progress
+    }
+    if result is not None:
+        update_data["result"] = result
+    if stats is not None:
+        update_data["stats"] = stats
+    if checkpoint is not None:
+        update_data["checkpoint"] = checkpoint
+
+    response = requests.put(url, json=update_data)
+    if response.status_code == 404:
+        logger.warning(f"Job {job_id} no longer exists")
+        return "cancel"
+    response.raise_for_status()
+    return response.json().get("control", "continue")
+
+def _update_job_status(job_id: str, status: str, progress: int = 0, result: Dict[Any, Any] = None,
+                       stats: Dict[str, Any] = None, shard_index: Optional[int] = None,
+                       checkpoint: Dict[str, Any] = None) -> str:
+    """Update job (or job shard) progress in the database service.
+
+    Returns the control instruction sent back by the database service:
+    "continue", "cancel" (the job was cancelled or deleted) or "preempt".
+    A failed update is logged and the simulation continues; the final
+    report of a run goes through report_final_status instead.
+    """
     try:
-        database_url = os.getenv("DATABASE_URL", "http://database:8000")
-        update_data = {
-            "status": status,
-            "progress": progress
-        }
-        if result is not None:
-            update_data["result"] = result
-            
-        response = requests.put(
-            f"{database_url}/jobs/{job_id}",
-            json=update_data
-        )
-        if response.status_code != 200:
-            logger.error(f"Failed to update job status: {response.text}")
+        return _put_job_status(job_id, status, progress, result, stats, shard_index, checkpoint)
     except Exception as e:
         logger.error(f"Error updating job status: {str(e)}")
+        return "continue"
 
-def _calculate_trajectories(drones: List[Drone], steps: int) -> List[List[List[float]]]:
-    """Calculates the trajectory for each drone based on its motion profile."""
-    trajectories = []
-    for drone in drones:
-        if drone.has_motion and drone.motion:
-            if drone.motion.motion_type == 'line':
-                start = np.array(drone.location)
-                end = np.array(drone.motion.end_position)
-                # Linearly interpolate between start and end points
-                drone_path = [
-                    (start + i * (end - start) / (steps - 1)).tolist() for i in range(steps)
-                ]
-                trajectories.append(drone_path)
-            elif drone.motion.motion_type == 'circle':
-                drone_path = []
-                drone_x, drone_y, z = drone.location
-                radius = drone.motion.radius
-                
-                # The drone is on the edge of the circle.
-                # Based on the frontend logic, the center is offset from the drone's position.
-                center_x = drone_x + radius
-                center_y = drone_y
-
-                angle_step = 360 / steps
-
-                for i in range(steps):
-                    # Start at 180 degrees (the leftmost point) and go around the circle.
-                    angle = 180 + (i * angle_step)
-                    dx, dy = polar_to_cartesian(radius, angle)
-                    drone_path.append([center_x + dx, center_y + dy, z])
-                trajectories.append(drone_path)
-        else:
-            trajectories.append([drone.location] * steps)
-    return trajectories
+def report_final_status(job_id: str, status: str, progress: int = 0, result: Dict[Any, Any] = None,
+                        stats: Dict[str, Any] = None, shard_index: Optional[int] = None,
+                        checkpoint: Dict[str, Any] = None) -> str:
+    """Report the outcome of a run (completed, failed or paused), retrying with backoff.
+
+    Raises StatusReportError when every attempt failed: the shard is still
+    claimed by this worker, so the caller must not treat it as done.
+    """
+    for attempt in range(STATUS_REPORT_RETRIES + 1):
+        try:
+            return _put_job_status(job_id, status, progress, result, stats, shard_index, checkpoint)
+        except Exception as e:
+            if attempt == STATUS_REPORT_RETRIES:
+                raise StatusReportError(f"Could not report job {job_id} (shard {shard_index}) "
+                                        f"as {status}: {e}") from e
+            delay = STATUS_REPORT_BACKOFF_SECONDS * 2 ** attempt
+            logger.warning(f"Reporting job {job_id} as {status} failed ({e}), retrying in {delay:.0f}s")
+            time.sleep(delay)
+
+def _upload_profile(job_id: str, profile: Dict[str, Any], shard_index: Optional[int] = None):
+    """Attach a profile artifact to its job in the database service."""
+    try:
+        database_url = os.getenv("DATABASE_URL", "http://database:8000")
+        response = requests.post(f"{database_url}/jobs/{job_id}/profiles", json=profile,
+                                 params={"shard_index": shard_index})
+        response.raise_for_status()
+        logger.info(f"Uploaded profile of job {job_id} (shard {shard_index})")
+    except Exception as e:
+        logger.error(f"Error uploading profile of job {job_id}: {str(e)}")
+
+def _job_control(job_id: str, shard_index: Optional[int] = None) -> str:
+    """Asks the database service whether a running job should continue, without updating it."""
+    try:
+        database_url = os.getenv("DATABASE_URL", "http://database:8000")
+        response = requests.get(f"{database_url}/jobs/{job_id}/control",
+                                params={"shard_index": shard_index})
+        if response.status_code == 404:
+            return "cancel"
+        return response.json().get("control", "continue")
+    except Exception as e:
+        logger.error(f"Error checking job control: {str(e)}")
+        return "continue"
+
+def _get_scene(scene_name: str, lod: str = "full", frequency: float = 6e9):
+    """Returns a loaded scene with no radio devices, reusing a warm copy when cached."""
+    tolerance = scene_assets.lod_tolerance(lod, frequency)
+    cache_key = (scene_name, round(tolerance * 1000))
+    scene = _scene_cache.pop(cache_key, None)
+    if scene is not None:
+        logger.info(f"Reusing warm scene: {scene_name} ({lod})")
+        # Drop the transmitters and receivers placed by the previous step
+        for name in list(scene.transmitters) + list(scene.receivers):
+            scene.remove(name)
+    elif not scene_name:
+        # An empty scene, only used to warm up the solver kernels
+        scene = load_scene()
+    elif USE_PREPARED_SCENES:
+        try:
+            logger.info(f"Loading prepared scene: {scene_name} ({lod})")
+            scene = scene_assets.load_prepared_scene(scene_name, lod, frequency)
+        except Exception as e:
+            logger.warning(f"Prepared assets unavailable for {scene_name}, loading XML: {e}")
+    if scene is None:
+        if tolerance > 0:
+            logger.warning(f"Level of detail '{lod}' needs prepared assets, using the full mesh")
+        scene_path = scene_assets.scene_xml_path(scene_name)
+        logger.info(f"Loading scene: {scene_path}")
+        scene = load_scene(scene_path)
+        logger.info(f"Scene loaded successfully!")
+
+    _scene_cache[cache_key] = scene
+    while len(_scene_cache) > SCENE_CACHE_SIZE:
+        (evicted_name, _), _ = _scene_cache.popitem(last=False)
+        logger.info(f"Evicting scene from cache: {evicted_name}")
+    return scene
+
+def release_memory():
+    """Returns freed Python and Dr.Jit memory to the system (between jobs, not per step)."""
+    gc.collect()
+    dr.flush_malloc_cache()
+
+def _release_scene(scene_name: str):
+    """Drops the cached copies of a scene and returns their memory to the system."""
+    for cache_key in [key for key in _scene_cache if key[0] == scene_name]:
+        del _scene_cache[cache_key]
+    release_memory()
+
+def _stop_simulation(config: Config, control: str, results: Dict[str, Any], stats: Dict[str, Any],
+                     next_index: int, progress: int, shard_index: Optional[int]):
+    """Handles a cancel or preempt instruction received at a step boundary."""
+    if control == "cancel":
+        logger.info(f"Job {config.job_id} was cancelled, stopping simulation")
+        _release_scene(config.scene_name)
+        return None
+
+    # Preempted shards hand back their partial results and resume from the
+    # next step once a worker claims them again
+    logger.info(f"Job {config.job_id} shard {shard_index} preempted at index {next_index}")
+    report_final_status(config.job_id, "paused", progress, results, stats,
+                        shard_index=shard_index, checkpoint={"resume": next_index})
+    return results
+
+def _antenna_array(antenna_config: AntennaConfig) -> PlanarArray:
+    """Planar array used for both the transmitters and the receivers."""
+    return PlanarArray(
+        num_rows=antenna_config.num_rows,
+        num_cols=antenna_config.num_cols,
+        vertical_spacing=antenna_config.vertical_spacing,
+        horizontal_spacing=antenna_config.horizontal_spacing,
+        pattern=antenna_config.pattern,
+        polarization=antenna_config.polarization
+    )
+
+def _run_sionna_step(config: Config, current_drones: List[Drone], step: int,
+                     should_stop: Optional[Callable[[], bool]] = None,
+                     encoder: Optional[cir_codecs.CirEncoder] = None):
+    """Runs a single step of the Sionna RT simulation with extensive diagnostics.
 
-def _run_sionna_step(config: Config, current_drones: List[Drone], step: int):
-    """Runs a single step of the Sionna RT simulation with extensive diagnostics."""
+    Transmitters are traced in chunks sized to fit the memory ceiling and the
+    per-chunk CIRs are concatenated; should_stop is polled between chunks.
+    The CIR is stored with the encoder's codec, under the result key `step`.
+    """
+    if encoder is None:
+        encoder = cir_codecs.CirEncoder(config.codec.dict())
     
     variant_to_set = 'llvm_ad_mono_polarized'
     logger.info(f"Attempting to set Mitsuba variant to: '{variant_to_set}'")
@@ -90,11 +209,9 @@ def _run_sionna_step(config: Config, current_drones: List[Drone], step: int):
     
     scene = None
     try:
-        # 1. Load Scene
-        scene_path = f"/3d_models/{config.scene_name}/Mitsuba/{config.scene_name}.xml"
-        logger.info(f"Loading scene: {scene_path}")
-        scene = load_scene(scene_path)
-        logger.info(f"Scene loaded successfully!")
+        # 1. Load Scene (warm copies are reused across steps and jobs)
+        with profiling.stage("scene"):
+            scene = _get_scene(config.scene_name, config.lod, config.radio_configs.frequency)
 
         # 2. Setup Scene
         radio_config = config.radio_configs
@@ -104,71 +221,87 @@ def _run_sionna_step(config: Config, current_drones: List[Drone], step: int):
         logger.info(f"Frequency: {radio_config.frequency}")
         logger.info(f"Setting up scene...")
         scene.frequency = radio_config.frequency
-        antenna_array = PlanarArray(
-            num_rows=antenna_config.num_rows,
-            num_cols=antenna_config.num_cols,
-            vertical_spacing=antenna_config.vertical_spacing,
-            horizontal_spacing=antenna_config.horizontal_spacing,
-            pattern=antenna_config.pattern,
-            polarization=antenna_config.polarization
-        )
+        antenna_array = _antenna_array(antenna_config)
         scene.tx_array = antenna_array
         scene.rx_array = antenna_array
 
-        # 3. Add Transmitters and Receivers
+        # 3. Add Receivers (transmitters are added per source chunk)
         for i, drone in enumerate(current_drones):
-            tx = Transmitter(name=f'tx_{i}', position=drone.location)
             rx = Receiver(name=f'rx_{i}', position=drone.location)
-            scene.add(tx)
             scene.add(rx)
 
-        # 4. Compute Paths
+        # 4. Compute Paths and CIR, tracing as many transmitters at once as fit in memory
+        elements = antenna_config.num_rows * antenna_config.num_cols
+        drones_per_chunk, solver = memory.plan_source_chunks(len(current_drones), elements, config.solver)
         p_solver = PathSolver()
-        logger.info(f"Path solver created successfully!.... running simulation..")
-        paths = p_solver(scene=scene,
-                        max_num_paths_per_src=int(1e7),
-                        samples_per_src=int(1e7),
-                        max_depth=50,
-                        los=True,
-                        specular_reflection=True,
-                        diffuse_reflection=True,
-                        refraction=True,
-                        synthetic_array=False,
-                        seed=32)
-        # 5. Get CIR
-        cir = paths.taps(bandwidth=radio_config.bandwidth, # Bandwidth to which the channel is low-pass filtered
-                  l_min=-3,        # Smallest time lag
-                  l_max=47,       # Largest time lag
-                  sampling_frequency=None, # Sampling at Nyquist rate, i.e., 1/bandwidth
-                  normalize=True,  # Normalize energy
-                  normalize_delays=True,
-                  num_time_steps=1,
-                  out_type="numpy")
-
-        logger.info(f"CIR shape: {cir.shape}, dtype: {cir.dtype}")
+        logger.info(f"Path solver created successfully!.... running simulation "
+                    f"({drones_per_chunk} transmitter(s) per solver run)..")
+        cir_chunks, metric_chunks = [], []
+        positions = np.array([drone.location for drone in current_drones], dtype=float)
+        for chunk_start in range(0, len(current_drones), drones_per_chunk):
+            if chunk_start and should_stop and should_stop():
+                raise SimulationCancelled()
+            chunk = range(chunk_start, min(chunk_start + drones_per_chunk, len(current_drones)))
+            for i in chunk:
+                tx = Transmitter(name=f'tx_{i}', position=current_drones[i].location)
+                scene.add(tx)
 
-        cir_mag = np.abs(cir).astype(np.float16)
-        cir_phase = np.angle(cir).astype(np.float16)
+            # Dr.Jit evaluates lazily: kernels traced here may run in the "taps" stage
+            with profiling.stage("solver"):
+                paths = p_solver(scene=scene,
+                                max_num_paths_per_src=solver.max_num_paths_per_src,
+                                samples_per_src=solver.samples_per_src,
+                                max_depth=solver.max_depth,
+                                los=True,
+                                specular_reflection=True,
+                                diffuse_reflection=True,
+                                refraction=True,
+                                synthetic_array=False,
+                                seed=32)
+            # 5. Get CIR (energy and delays are normalized per link, so chunks are independent)
+            with profiling.stage("taps"):
+                cir_chunks.append(paths.taps(bandwidth=radio_config.bandwidth, # Bandwidth to which the channel is low-pass filtered
+                          l_min=-3,        # Smallest time lag
+                          l_max=47,       # Largest time lag
+                          sampling_frequency=None, # Sampling at Nyquist rate, i.e., 1/bandwidth
+                          normalize=True,  # Normalize energy
+                          normalize_delays=True,
+                          num_time_steps=1,
+                          out_type="numpy"))
+            # Link metrics use the unnormalized path gains and absolute delays;
+            # first antenna element of each link: [rx, tx, paths]
+            with profiling.stage("metrics"):
+                a, tau = paths.cir(normalize_delays=False, out_type="numpy")
+                metric_chunks.append(link_metrics.link_metrics(
+                    a[:, 0, :, 0, :, 0], tau[:, 0, :, 0, :],
+                    link_metrics.link_distances(positions, positions[chunk.start:chunk.stop])))
+            memory.sample_peak()
 
-        logger.info(f"CIR magnitude shape: {cir_mag.shape}, dtype: {cir_mag.dtype}")
-        logger.info(f"CIR phase shape: {cir_phase.shape}, dtype: {cir_phase.dtype}")
+            del paths
+            for i in chunk:
+                scene.remove(f'tx_{i}')
 
-        cir_mag_base64 = base64.b64encode(cir_mag.tobytes(order='C')).decode('utf-8')
-        cir_phase_base64 = base64.b64encode(cir_phase.tobytes(order='C')).decode('utf-8')
+        # Transmitters are the third axis: [rx, rx_ant, tx, tx_ant, time, taps]
+        cir = np.concatenate(cir_chunks, axis=2)
+        metrics = {name: np.concatenate([chunk[name] for chunk in metric_chunks], axis=1)
+                   for name in link_metrics.METRIC_NAMES}
 
-        
+        logger.info(f"CIR shape: {cir.shape}, dtype: {cir.dtype}")
 
+        with profiling.stage("encode"):
+            encoded = encoder.encode(cir, step)
         results = {
-            "cir_mag": cir_mag_base64,
-            "cir_phase": cir_phase_base64,
-            "dtype": str(cir_mag.dtype),
-            "shape": cir_mag.shape,
+            **encoded,
             "num_drones": len(current_drones),
             "scene_name": config.scene_name,
+            # Per-link summaries, [rx][tx] lists per metric
+            "metrics": link_metrics.to_lists(metrics),
         }
 
         return results
 
+    except SimulationCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error in simulation: {e}")
         full_trace = ''.join(traceback.format_exc())
@@ -181,32 +314,146 @@ def _run_sionna_step(config: Config, current_drones: List[Drone], step: int):
             del p_solver
         if 'paths' in locals():
             del paths
-        gc.collect()
-        dr.flush_malloc_cache()
 
-        
-def run_simulation(config: Config, progress_callback=None):
-    """Main function to run the drone simulation based on the provided config."""
+def _run_radio_map(config: Config, trajectories: np.ndarray, shard: Optional[Dict[str, Any]] = None):
+    """Radio-map mode of run_simulation: path gains to the drones without motion, read from gain maps.
+
+    Results have one entry per step (or combination), as with path tracing,
+    holding the path loss of every link to a fixed drone in their metrics
+    and no CIR.
+    """
+    shard_index = shard["index"] if shard else None
+    num_drones, num_steps = trajectories.shape[:2]
+    transmitters = radio_maps.fixed_transmitters(config)
+    grid = radio_maps.map_grid(config, trajectories)
+
+    def load_configured_scene():
+        scene = _get_scene(config.scene_name, config.lod, config.radio_configs.frequency)
+        scene.frequency = config.radio_configs.frequency
+        scene.tx_array = _antenna_array(config.antenna_configs)
+        scene.rx_array = scene.tx_array
+        return scene
+
+    maps_start = time.perf_counter()
+    with profiling.stage("radio_maps"):
+        maps = radio_maps.gain_maps(config, grid, trajectories[transmitters, 0].tolist(), load_configured_scene)
+    # Path loss from every transmitter to every drone at every step, [tx, drones, steps]
+    with profiling.stage("lookup"), np.errstate(divide="ignore"):
+        path_loss_db = -10 * np.log10(radio_maps.lookup(maps, grid, trajectories))
+    path_loss_db[~np.isfinite(path_loss_db)] = np.nan
+    stats = {"steps": 0, "mean_step_seconds": 0.0, "peak_rss_mb": memory.peak_mb(),
+             "radio_map_seconds": time.perf_counter() - maps_start}
+
+    moving_drone_indices = [i for i, d in enumerate(config.drones) if d.has_motion]
+    trajectory_lengths = [num_steps] * len(moving_drone_indices)
+    total = num_steps if config.move_together else int(np.prod(trajectory_lengths))
+    start, stop = (shard["start"], shard["stop"]) if shard else (0, total)
+    resume = (shard.get("resume") or start) if shard else start
+    drone_range = np.arange(num_drones)
+
+    results, progress = {}, 0
+    for i in range(resume, stop):
+        if config.move_together:
+            step_indices = np.full(num_drones, i)
+        else:
+            step_indices = np.zeros(num_drones, dtype=int)
+            step_indices[moving_drone_indices] = motion.combination_steps(i, trajectory_lengths)
+        # [rx, tx] over all drones; only the fixed drones transmit
+        path_loss = np.full((num_drones, num_drones), np.nan)
+        path_loss[:, transmitters] = path_loss_db[:, drone_range, step_indices].T
+        path_loss[transmitters, transmitters] = np.nan
+        results[str(i)] = {
+            "drone_locations": trajectories[drone_range, step_indices].tolist(),
+            "step_results": {
+                "mode": "radio_map",
+                "transmitters": transmitters,
+                "num_drones": num_drones,
+                "scene_name": config.scene_name,
+                "metrics": link_metrics.to_lists({"path_loss_db": path_loss}),
+            },
+        }
+
+        # Lookups are cheap, so progress is only reported when its percentage changes
+        step_progress = int((i - start + 1) / (stop - start) * 100)
+        if step_progress != progress:
+            progress = step_progress
+            with profiling.stage("report"):
+                control = _update_job_status(config.job_id, "processing", progress, shard_index=shard_index)
+            profiling.end_step(i)
+            if control == "cancel" or (control == "preempt" and i + 1 < stop):
+                return _stop_simulation(config, control, results, stats, i + 1, progress, shard_index)
+
+    report_final_status(config.job_id, "completed", 100, results, stats, shard_index=shard_index)
+    return results
+
+def run_simulation(config: Config, progress_callback=None, shard: Optional[Dict[str, Any]] = None):
+    """Main function to run the drone simulation based on the provided config.
+
+    When a shard is given, only its [start, stop) range of step (or combination)
+    indices is simulated and progress/results are reported to that shard. The
+    simulation stops early, returning None, if the job is cancelled; a preempted
+    shard returns its partial results.
+    Raises StatusReportError if the final report could not be delivered, in
+    which case the shard is still claimed and has to be released.
+
+    With `profile` set in the config, the run is profiled (see
+    services/profiling.py) and the profile is uploaded to the job.
+    """
+    if not config.profile:
+        return _run_simulation(config, progress_callback, shard)
+    shard_index = shard["index"] if shard else None
+    profiling.start(config.job_id, shard_index)
+    try:
+        return _run_simulation(config, progress_callback, shard)
+    finally:
+        _upload_profile(config.job_id, profiling.stop(), shard_index)
+
+def _run_simulation(config: Config, progress_callback=None, shard: Optional[Dict[str, Any]] = None):
+    """run_simulation without profiling."""
+    shard_index = shard["index"] if shard else None
+    memory.reset_peak()
     # Update job status to processing
-    _update_job_status(config.job_id, "processing", 0)
+    _update_job_status(config.job_id, "processing", 0, shard_index=shard_index)
     
-    trajectories = _calculate_trajectories(config.drones, config.simulation_steps)
+    # [drones, steps, 3]
+    trajectories = motion.calculate_trajectories(config.drones, config.simulation_steps)
+    if config.mode == "radio_map":
+        return _run_radio_map(config, trajectories, shard)
     job_id = config.job_id
     all_results = {}
+    # One encoder per run: delta-encoded steps only refer to steps of this run
+    encoder = cir_codecs.CirEncoder(config.codec.dict())
+    # Wall time of each solver step, reported to calibrate the job cost estimates
+    step_seconds = []
+
+    def step_stats():
+        return {
+            "steps": len(step_seconds),
+            "mean_step_seconds": float(np.mean(step_seconds)) if step_seconds else 0.0,
+            "peak_rss_mb": memory.peak_mb(),
+        }
+
+    def should_stop():
+        return _job_control(job_id, shard_index) == "cancel"
 
     if config.move_together:
         logger.info("Running simulation with drones moving together.")
         # Single loop for all drones moving in sync
-        total_steps = config.simulation_steps
-        for step_idx in tqdm(range(total_steps), desc="Simulation Steps"):
-            current_drones = []
-            for drone_idx, drone_config in enumerate(config.drones):
-                new_location = trajectories[drone_idx][step_idx]
-                current_drones.append(Drone(location=new_location))
+        start, stop = (shard["start"], shard["stop"]) if shard else (0, config.simulation_steps)
+        total_steps = stop - start
+        resume = (shard.get("resume") or start) if shard else start
+        for step_idx in tqdm(range(resume, stop), desc="Simulation Steps"):
+            current_drones = [Drone(location=location) for location in trajectories[:, step_idx].tolist()]
             
             # Run simulation step
             intermediate_drone_locations = [drone.location for drone in current_drones]
-            step_results = _run_sionna_step(config, current_drones, step_idx)
+            step_start = time.perf_counter()
+            try:
+                step_results = _run_sionna_step(config, current_drones, step_idx, should_stop, encoder)
+            except SimulationCancelled:
+                return _stop_simulation(config, "cancel", all_results, step_stats(),
+                                        step_idx, 0, shard_index)
+            step_seconds.append(time.perf_counter() - step_start)
             inner_dict_results = {
                 "drone_locations": intermediate_drone_locations,
                 "step_results": step_results
@@ -214,43 +461,42 @@ def run_simulation(config: Config, progress_callback=None):
             all_results[str(step_idx)] = inner_dict_results
             
             # Update progress
-            progress = int((step_idx + 1) / total_steps * 100)
-            _update_job_status(job_id, "processing", progress)
+            progress = int((step_idx - start + 1) / total_steps * 100)
+            with profiling.stage("report"):
+                control = _update_job_status(job_id, "processing", progress, shard_index=shard_index)
+            profiling.end_step(step_idx)
+            if control == "cancel" or (control == "preempt" and step_idx + 1 < stop):
+                return _stop_simulation(config, control, all_results, step_stats(),
+                                        step_idx + 1, progress, shard_index)
     else:
         logger.info("Running simulation with drones moving independently.")
-        # Generate all combinations of positions for drones with motion
+        # Combinations span the steps of the drones with motion; the
+        # trajectories of the other drones stay at their location
         moving_drone_indices = [i for i, d in enumerate(config.drones) if d.has_motion]
-        stationary_drone_indices = [i for i, d in enumerate(config.drones) if not d.has_motion]
-
-        # Get trajectories only for moving drones
-        moving_trajectories = [trajectories[i] for i in moving_drone_indices]
-
-        # Create an iterator for all position combinations
-        position_combinations = itertools.product(*moving_trajectories)
+        trajectory_lengths = [trajectories.shape[1]] * len(moving_drone_indices)
+        drone_range = np.arange(len(config.drones))
 
-        total_combinations = np.prod([len(t) for t in moving_trajectories])
-        combination_count = 0
+        # Combinations are addressed by their index in itertools.product order,
+        # so a shard can start anywhere in the combination space
+        total_combinations = int(np.prod(trajectory_lengths))
+        start, stop = (shard["start"], shard["stop"]) if shard else (0, total_combinations)
+        resume = (shard.get("resume") or start) if shard else start
 
-        for i, combination in enumerate(tqdm(position_combinations, total=total_combinations, desc="Position Combinations")):
-            current_drones = [None] * len(config.drones)
-            step_id_parts = []
-
-            # Place moving drones
-            for idx, drone_pos in enumerate(combination):
-                drone_idx = moving_drone_indices[idx]
-                current_drones[drone_idx] = Drone(location=drone_pos)
-                # Find the step index for this position to create a unique ID
-                step_idx = trajectories[drone_idx].index(drone_pos)
-                step_id_parts.append(f"d{drone_idx}s{step_idx}")
-
-            
-            for drone_idx in stationary_drone_indices:
-                current_drones[drone_idx] = Drone(location=config.drones[drone_idx].location)
+        for i in tqdm(range(resume, stop), desc="Position Combinations"):
+            step_indices = np.zeros(len(config.drones), dtype=int)
+            step_indices[moving_drone_indices] = motion.combination_steps(i, trajectory_lengths)
+            current_drones = [Drone(location=location)
+                              for location in trajectories[drone_range, step_indices].tolist()]
 
-            step_id = "_".join(step_id_parts)
             # Run simulation step
             intermediate_drone_locations = [drone.location for drone in current_drones]
-            step_results = _run_sionna_step(config, current_drones, step_id)
+            step_start = time.perf_counter()
+            try:
+                step_results = _run_sionna_step(config, current_drones, i, should_stop, encoder)
+            except SimulationCancelled:
+                return _stop_simulation(config, "cancel", all_results, step_stats(),
+                                        i, 0, shard_index)
+            step_seconds.append(time.perf_counter() - step_start)
             inner_dict_results = {
                 "drone_locations": intermediate_drone_locations,
                 "step_results": step_results
@@ -258,12 +504,16 @@ def run_simulation(config: Config, progress_callback=None):
             all_results[str(i)] = inner_dict_results
             
             # Update progress
-            combination_count += 1
-            progress = int(combination_count / total_combinations * 100)
-            _update_job_status(job_id, "processing", progress)
+            progress = int((i - start + 1) / (stop - start) * 100)
+            with profiling.stage("report"):
+                control = _update_job_status(job_id, "processing", progress, shard_index=shard_index)
+            profiling.end_step(i)
+            if control == "cancel" or (control == "preempt" and i + 1 < stop):
+                return _stop_simulation(config, control, all_results, step_stats(),
+                                        i + 1, progress, shard_index)
     
     # Update job status to completed with results
-    _update_job_status(job_id, "completed", 100, all_results)
+    report_final_status(job_id, "completed", 100, all_results, step_stats(), shard_index=shard_index)
     
     # Return all results
     return all_results
\ No newline at end of file
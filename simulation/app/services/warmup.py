@@ -0,0 +1,67 @@
+import os
+import shutil
+import time
+from loguru import logger
+
+from app.models.configs import AntennaConfig, Config, Drone, RadioConfig, SolverConfig
+
+# Scenes loaded and traced at startup, comma separated (an empty scene is used if unset)
+WARMUP_SCENES = [name for name in os.getenv("WARMUP_SCENES", "").split(",") if name]
+
+# Small sample budget: the traced kernels do not depend on the number of rays,
+# so this compiles (or loads from the Dr.Jit disk cache) the same kernels as a real job
+WARMUP_SOLVER = SolverConfig(samples_per_src=int(1e4), max_num_paths_per_src=int(1e4))
+
+# Each warm worker process leaves a file named after its pid here, which is
+# how the API process (that runs no simulations itself) reports readiness
+WARM_MARKER_DIR = os.getenv("WARM_MARKER_DIR", "/tmp/simulation-warm")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+def is_warm() -> bool:
+    """Whether at least one live worker process has finished its warm-up."""
+    try:
+        markers = os.listdir(WARM_MARKER_DIR)
+    except FileNotFoundError:
+        return False
+    return any(marker.isdigit() and _pid_alive(int(marker)) for marker in markers)
+
+def reset_warm_markers():
+    """Forgets the warm-up state of previous worker processes."""
+    shutil.rmtree(WARM_MARKER_DIR, ignore_errors=True)
+    os.makedirs(WARM_MARKER_DIR, exist_ok=True)
+
+def warm_up():
+    """Preloads the configured scenes and runs a tiny trace in each to compile kernels."""
+    # Imported here so the API process can report readiness without loading Mitsuba
+    from app.services.simulate import SCENE_CACHE_SIZE, _run_sionna_step
+
+    if len(WARMUP_SCENES) > SCENE_CACHE_SIZE:
+        logger.warning(f"Only {SCENE_CACHE_SIZE} of {len(WARMUP_SCENES)} warm-up scenes fit in the scene cache")
+
+    for scene_name in WARMUP_SCENES or [""]:
+        start = time.perf_counter()
+        config = Config(
+            job_id="warmup",
+            scene_name=scene_name,
+            simulation_steps=1,
+            antenna_configs=AntennaConfig(),
+            radio_configs=RadioConfig(),
+            drones=[Drone(location=[0.0, 0.0, 10.0]), Drone(location=[5.0, 0.0, 10.0])],
+            solver=WARMUP_SOLVER,
+        )
+        try:
+            _run_sionna_step(config, config.drones, 0)
+            logger.info(f"Warmed up scene '{scene_name or '<empty>'}' in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            # A broken scene must not keep the service cold, it fails at job time instead
+            logger.error(f"Warm-up failed for scene '{scene_name or '<empty>'}': {e}")
+
+    os.makedirs(WARM_MARKER_DIR, exist_ok=True)
+    open(os.path.join(WARM_MARKER_DIR, str(os.getpid())), "w").close()
@@ -0,0 +1,88 @@
+import multiprocessing as mp
+import os
+import signal
+import socket
+import sys
+import time
+import uuid
+import requests
+from loguru import logger
+
+from app.services.warmup import reset_warm_markers
+
+DATABASE_URL = os.getenv("DATABASE_URL", "http://database:8000")
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", 1))
+# A worker is replaced after this many jobs or once its RSS exceeds this many MB (0 disables)
+WORKER_MAX_JOBS = int(os.getenv("WORKER_MAX_JOBS", 50))
+WORKER_MAX_RSS_MB = float(os.getenv("WORKER_MAX_RSS_MB", 0))
+
+
+def _run_worker(worker_id: str):
+    """Entry point of a worker process."""
+    # Imported in the child so the supervisor itself never loads Mitsuba/Dr.Jit
+    from app import worker
+    worker.main(worker_id=worker_id, max_jobs=WORKER_MAX_JOBS, max_rss_mb=WORKER_MAX_RSS_MB)
+
+def _prepare_scenes():
+    """Converts and validates every scene once, before the workers load them."""
+    import app.bootstrap_mitsuba  # noqa: F401  (side-effect: sets variant & registers plugins)
+    from app.services.scene_assets import prepare_all_scenes
+    prepare_all_scenes()
+
+def _start_worker(ctx):
+    """Starts a worker process with a new id."""
+    worker_id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+    process = ctx.Process(target=_run_worker, args=(worker_id,), name=f"worker-{worker_id}")
+    process.start()
+    logger.info(f"Started worker {worker_id} (pid {process.pid})")
+    return worker_id, process
+
+def _release_claims(worker_id: str):
+    """Queues again the shards a finished or dead worker had claimed."""
+    try:
+        response = requests.post(f"{DATABASE_URL}/workers/{worker_id}/release")
+        logger.info(f"Worker {worker_id}: {response.json().get('message')}")
+    except Exception as e:
+        # The database service still releases them once the worker's lease expires
+        logger.error(f"Failed to release claims of worker {worker_id}: {e}")
+
+def main():
+    """Keeps WORKER_PROCESSES worker processes running, replacing recycled and dead ones."""
+    logger.info(f"Starting simulation supervisor with {WORKER_PROCESSES} worker(s)...")
+    reset_warm_markers()
+    # Spawned (not forked) workers start with a clean Dr.Jit state
+    ctx = mp.get_context("spawn")
+    if os.getenv("USE_PREPARED_SCENES", "true").lower() == "true":
+        preparation = ctx.Process(target=_prepare_scenes, name="prepare-scenes")
+        preparation.start()
+        preparation.join()
+    workers = dict(_start_worker(ctx) for _ in range(WORKER_PROCESSES))
+
+    def shutdown(signum, frame):
+        logger.info("Stopping workers...")
+        for worker_id, process in workers.items():
+            process.terminate()
+        for worker_id, process in workers.items():
+            process.join()
+            _release_claims(worker_id)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    while True:
+        for worker_id, process in list(workers.items()):
+            if process.is_alive():
+                continue
+            if process.exitcode == 0:
+                logger.info(f"Worker {worker_id} exited for recycling")
+            else:
+                logger.warning(f"Worker {worker_id} died with exit code {process.exitcode}")
+            _release_claims(worker_id)
+            del workers[worker_id]
+            new_id, new_process = _start_worker(ctx)
+            workers[new_id] = new_process
+        time.sleep(1)
+
+if __name__ == "__main__":
+    main()
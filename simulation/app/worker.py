@@ -1,59 +1,98 @@
 
 import os
+import socket
 import time
 import requests
 from loguru import logger
 
-from app.services.simulate import run_simulation
+import app.bootstrap_mitsuba  # noqa: F401  (side-effect: sets variant & registers plugins)
+from app.services.simulate import StatusReportError, report_final_status, run_simulation, release_memory
+from app.services import memory
 from app.models.configs import Config
+from app.services.warmup import warm_up
 
 DATABASE_URL = os.getenv("DATABASE_URL", "http://database:8000")
+POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", 2))
 
-def get_pending_jobs():
-    """Get pending jobs from the database service."""
+def claim_job(affinity=None, worker_id=None):
+    """Claim the next pending job shard, preferring jobs that share the given affinity."""
     try:
-        response = requests.get(f"{DATABASE_URL}/jobs")
+        response = requests.post(f"{DATABASE_URL}/jobs/claim",
+                                 json={"affinity": affinity, "worker_id": worker_id})
         if response.status_code == 200:
-            jobs = response.json()
-            return [job for job in jobs if job['status'] == 'pending']
-        else:
-            logger.error(f"Failed to get jobs: {response.text}")
-            return []
+            return response.json()
+        elif response.status_code != 204:
+            logger.error(f"Failed to claim job: {response.text}")
+        return None
     except Exception as e:
-        logger.error(f"Error getting jobs: {e}")
-        return []
+        logger.error(f"Error claiming job: {e}")
+        return None
 
-def process_job(job):
-    """Process a single job."""
+def process_job(job, shard):
+    """Process a single shard of a job.
+
+    Returns False when the outcome of the shard could not be reported, so
+    it is still claimed by this worker.
+    """
     job_id = job['id']
-    logger.info(f"Found pending job: {job_id}")
+    shard_index = shard['index']
+    logger.info(f"Claimed pending job: {job_id} (shard {shard_index}, steps {shard['start']}-{shard['stop']})")
     try:
         config = Config(**job['config'])
         logger.info(f"Starting simulation for job: {job_id}")
-        run_simulation(config)
+        run_simulation(config, shard=shard)
         logger.info(f"Finished simulation for job: {job_id}")
+    except StatusReportError as e:
+        logger.error(str(e))
+        return False
     except Exception as e:
         logger.error(f"Error processing job {job_id}: {e}")
-        # Update job status to failed
+        # Update shard status to failed, which fails the job
         try:
-            update_data = {"status": "failed", "progress": 0}
-            requests.put(f"{DATABASE_URL}/jobs/{job_id}", json=update_data)
-        except Exception as update_e:
+            report_final_status(job_id, "failed", 0, shard_index=shard_index)
+        except StatusReportError as update_e:
             logger.error(f"Failed to update job status to failed for job {job_id}: {update_e}")
+            return False
+    return True
+
 
+def main(worker_id=None, max_jobs=0, max_rss_mb=0):
+    """Main worker loop.
 
-def main():
-    """Main worker loop."""
-    logger.info("Starting simulation worker...")
+    Returns after max_jobs jobs or once RSS exceeds max_rss_mb (0 disables
+    either limit), so a supervisor can replace the process with a fresh one.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    logger.info(f"Starting simulation worker {worker_id}...")
+    # Only claim jobs once the kernels are compiled and the scenes are loaded
+    warm_up()
+    # Affinity of the last job, so jobs sharing its warm scene are drained first
+    affinity = None
+    jobs_done = 0
     while True:
-        pending_jobs = get_pending_jobs()
-        if pending_jobs:
-            for job in pending_jobs:
-                process_job(job)
-        else:
-            logger.info("No pending jobs found. Waiting...")
-        
-        time.sleep(10) # Poll every 10 seconds
+        claim = claim_job(affinity, worker_id)
+        if claim:
+            if not process_job(claim['job'], claim['shard']):
+                # Claiming more jobs would renew the lease of the unreported shard;
+                # exiting lets the supervisor (or the lease expiry) queue it again
+                logger.warning(f"Worker {worker_id} could not report shard {claim['shard']['index']} "
+                               f"of job {claim['job']['id']}, recycling to release it")
+                return
+            affinity = claim['job'].get('affinity')
+            jobs_done += 1
+            release_memory()
+
+            rss_mb = memory.current_rss_bytes() / 2**20
+            if max_jobs and jobs_done >= max_jobs:
+                logger.info(f"Worker {worker_id} processed {jobs_done} jobs, recycling")
+                return
+            if max_rss_mb and rss_mb > max_rss_mb:
+                logger.info(f"Worker {worker_id} RSS is {rss_mb:.0f} MB, above {max_rss_mb} MB, recycling")
+                return
+            continue
+
+        logger.info("No pending jobs found. Waiting...")
+        time.sleep(POLL_INTERVAL)
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,8 @@
 import json
+import queue
 import numpy as np
-import base64
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import matplotlib.pyplot as plt
@@ -8,71 +10,11 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import requests
 from typing import Tuple, Optional, List
 
-def process_simulation_results_data(job_data: dict) -> Tuple[Optional[int], Optional[np.ndarray], Optional[np.ndarray], Optional[List]]:
-    """
-    Processes simulation results directly from job data,
-    decodes CIR data, and extracts drone locations.
-
-    Args:
-        job_data (dict): The job data from the API.
-
-    Returns:
-        tuple: A tuple containing:
-            - int: The number of simulation steps.
-            - numpy.ndarray: A NumPy array of the CIR magnitudes.
-            - numpy.ndarray: A NumPy array of the CIR phases.
-            - list: A list of drone locations for each step.
-    """
-    try:
-        result_dict = job_data.get('result', {})
-        num_steps = len(result_dict)
-
-        if num_steps == 0:
-            print("No results found in job data")
-            return None, None, None, None
-
-        mag_list = []
-        phase_list = []
-        locations_list = []
-
-        for step_key in sorted(result_dict.keys(), key=int):
-            step_data = result_dict[step_key]
-            step_results = step_data.get('step_results', {})
-            
-            # 1. Extract drone locations
-            locations_list.append(step_data.get('drone_locations'))
-
-            # Get the shape from the metadata
-            shape = step_results.get('shape')
-            if not shape:
-                raise ValueError(f"Shape information not found in step {step_key}")
-                
-            # Calculate the expected number of elements based on the shape
-            expected_elements = int(np.prod(shape))
+from cir_export import export_job_cir
 
-            # 2. Process CIR Magnitude
-            cir_mag_base64 = step_results.get('cir_mag', '')
-            mag_bytes = base64.b64decode(cir_mag_base64)
-            
-            full_mag_array = np.frombuffer(mag_bytes, dtype=np.float16)
-            mag_array = full_mag_array[:expected_elements].reshape(shape)
-            mag_list.append(mag_array)
-
-            # 3. Process CIR Phase
-            cir_phase_base64 = step_results.get('cir_phase', '')
-            phase_bytes = base64.b64decode(cir_phase_base64)
-            
-            full_phase_array = np.frombuffer(phase_bytes, dtype=np.float16)
-            phase_array = full_phase_array[:expected_elements].reshape(shape)
-            phase_list.append(phase_array)
-
-        mag_ndarray = np.stack(mag_list, axis=0)
-        phase_ndarray = np.stack(phase_list, axis=0)
-
-        return num_steps, mag_ndarray, phase_ndarray, locations_list
-    except Exception as e:
-        print(f"Error processing simulation results: {e}")
-        return None, None, None, None
+DATABASE_URL = "http://localhost:8001"
+# Steps fetched per request when browsing a link
+CIR_BLOCK_STEPS = 32
 
 def get_jobs_from_database() -> List[Tuple[str, str]]:
     """
@@ -80,7 +22,7 @@ def get_jobs_from_database() -> List[Tuple[str, str]]:
     Returns a list of tuples (job_id, job_name).
     """
     try:
-        response = requests.get("http://localhost:8001/jobs")
+        response = requests.get(f"{DATABASE_URL}/jobs")
         if response.status_code == 200:
             jobs_data = response.json()
             jobs = []
@@ -100,23 +42,52 @@ def get_jobs_from_database() -> List[Tuple[str, str]]:
         print(f"Error decoding JSON response: {e}")
         return []
 
-def fetch_job_results(job_id: str) -> Optional[dict]:
+def fetch_job_steps(job_id: str, start: Optional[int] = None, stop: Optional[int] = None) -> Optional[dict]:
     """
-    Fetch job results from the server.
-    Returns the JSON response or None if failed.
+    Fetch the number of steps, the CIR shape and the drone locations
+    of a range of steps, without the CIRs themselves.
     """
     try:
-        response = requests.get(f"http://localhost:8001/jobs/{job_id}")
+        response = requests.get(f"{DATABASE_URL}/jobs/{job_id}/steps",
+                                params={"start": start, "stop": stop})
         if response.status_code == 200:
             return response.json()
-        else:
-            print(f"Failed to fetch job results. Status code: {response.status_code}")
-            return None
+        print(f"Failed to fetch job steps. Status code: {response.status_code}")
+        return None
     except requests.RequestException as e:
-        print(f"Error fetching job results: {e}")
+        print(f"Error fetching job steps: {e}")
         return None
 
+def fetch_cir_block(job_id: str, tx_id: int, rx_id: int, block: int) -> Tuple[np.ndarray, np.ndarray, dict]:
+    """
+    Fetch the CIR magnitude and phase of one link for a block of
+    CIR_BLOCK_STEPS steps, with the drone locations of those steps.
+
+    Returns:
+        tuple: magnitudes and phases of shape [steps, taps], and the
+        drone locations by step index.
+    """
+    start, stop = block * CIR_BLOCK_STEPS, (block + 1) * CIR_BLOCK_STEPS
+    response = requests.get(f"{DATABASE_URL}/jobs/{job_id}/cir", params={
+        "start": start, "stop": stop, "rx": rx_id, "tx": tx_id,
+        "rx_ant": 0, "tx_ant": 0, "time": 0, "part": "both",
+    })
+    response.raise_for_status()
+    shape = [int(size) for size in response.headers["X-Shape"].split(",")]
+    cir = np.frombuffer(response.content, dtype=response.headers["X-Dtype"]).reshape(shape)
+    # [parts, steps, rx, rx_ant, tx, tx_ant, time, taps] -> [parts, steps, taps]
+    cir = cir.reshape(shape[0], shape[1], shape[-1])
+
+    steps = fetch_job_steps(job_id, start, stop)
+    locations = {int(step): locs for step, locs in (steps or {}).get('locations', {}).items()}
+    return cir[0], cir[1], locations
+
 class SimulationViewer:
+    # Links whose CIR blocks are kept in memory, and playback speed
+    BLOCK_CACHE_SIZE = 256
+    PLAYBACK_INTERVAL_MS = 50
+    POLL_INTERVAL_MS = 20
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Simulation Results Viewer")
@@ -126,18 +97,28 @@ class SimulationViewer:
         self.jobs: List[Tuple[str, str]] = []
         self.current_job_id: Optional[str] = None
         self.steps = 0
-        self.mag_nd = None
-        self.phase_nd = None
-        self.locations = None
         self.num_drones = 0
         
+        # Fetched CIR blocks, (job_id, tx_id, rx_id, block) -> (mag, phase, locations)
+        self.blocks: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.pending_blocks = set()
+        # Network requests run on worker threads and hand their results to the
+        # Tk thread through this queue, which is polled with after()
+        self.results: "queue.Queue" = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.playing = False
+        self.backgrounds = {}
+        self.location_limits = None
+        
         # UI variables
         self.selected_step = tk.IntVar(value=0)
         self.selected_tx_id = tk.IntVar(value=0)
         self.selected_rx_id = tk.IntVar(value=0)
+        self.status_text = tk.StringVar(value="")
         
         # Create UI
         self.create_widgets()
+        self.root.after(self.POLL_INTERVAL_MS, self.poll_results)
         
         # Load jobs
         self.load_jobs()
@@ -164,26 +145,31 @@ class SimulationViewer:
         export_button = ttk.Button(job_frame, text="Export to NumPy", command=self.export_data_as_numpy)
         export_button.grid(row=0, column=3, padx=(10, 0))
         
+        ttk.Label(job_frame, textvariable=self.status_text).grid(row=0, column=4, padx=(10, 0), sticky=tk.W)
+        
         # Parameters frame
         param_frame = ttk.LabelFrame(main_frame, text="Parameters", padding="10")
         param_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        param_frame.columnconfigure(1, weight=1)
         
-        # Step selection
+        # Step selection: a slider scales to jobs with thousands of steps
         ttk.Label(param_frame, text="Step #:").grid(row=0, column=0, sticky=tk.W)
-        self.step_combobox = ttk.Combobox(param_frame, textvariable=self.selected_step, state="readonly")
-        self.step_combobox.grid(row=0, column=1, padx=(10, 20), sticky=tk.W)
-        self.step_combobox.bind("<<ComboboxSelected>>", self.on_param_changed)
+        self.step_scale = ttk.Scale(param_frame, from_=0, to=0, orient=tk.HORIZONTAL, command=self.on_step_scrolled)
+        self.step_scale.grid(row=0, column=1, padx=(10, 10), sticky=(tk.W, tk.E))
+        ttk.Label(param_frame, textvariable=self.selected_step, width=6).grid(row=0, column=2, sticky=tk.W)
+        self.play_button = ttk.Button(param_frame, text="Play", command=self.toggle_playback)
+        self.play_button.grid(row=0, column=3, padx=(10, 20))
         
         # TX ID selection
-        ttk.Label(param_frame, text="TX ID:").grid(row=0, column=2, sticky=tk.W)
-        self.tx_combobox = ttk.Combobox(param_frame, textvariable=self.selected_tx_id, state="readonly")
-        self.tx_combobox.grid(row=0, column=3, padx=(10, 20), sticky=tk.W)
+        ttk.Label(param_frame, text="TX ID:").grid(row=0, column=4, sticky=tk.W)
+        self.tx_combobox = ttk.Combobox(param_frame, textvariable=self.selected_tx_id, state="readonly", width=6)
+        self.tx_combobox.grid(row=0, column=5, padx=(10, 20), sticky=tk.W)
         self.tx_combobox.bind("<<ComboboxSelected>>", self.on_param_changed)
         
         # RX ID selection
-        ttk.Label(param_frame, text="RX ID:").grid(row=0, column=4, sticky=tk.W)
-        self.rx_combobox = ttk.Combobox(param_frame, textvariable=self.selected_rx_id, state="readonly")
-        self.rx_combobox.grid(row=0, column=5, padx=(10, 0), sticky=tk.W)
+        ttk.Label(param_frame, text="RX ID:").grid(row=0, column=6, sticky=tk.W)
+        self.rx_combobox = ttk.Combobox(param_frame, textvariable=self.selected_rx_id, state="readonly", width=6)
+        self.rx_combobox.grid(row=0, column=7, padx=(10, 0), sticky=tk.W)
         self.rx_combobox.bind("<<ComboboxSelected>>", self.on_param_changed)
         
         # Plots frame
@@ -214,27 +200,118 @@ class SimulationViewer:
         
         self.canvas_phase = FigureCanvasTkAgg(self.fig_phase, plots_frame)
         self.canvas_phase.get_tk_widget().grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(0, 5), pady=(5, 0))
+        
+        self.create_artists()
+    
+    def create_artists(self):
+        """Create the plot artists once; later steps only update their data."""
+        # Plot 1: 2D map of drone locations
+        self.drones_artist = self.ax_locations.scatter([], [], c='blue', label='Drones', animated=True)
+        self.tx_artist = self.ax_locations.scatter([], [], c='red', s=100, label='TX', zorder=5, animated=True)
+        self.rx_artist = self.ax_locations.scatter([], [], c='green', s=100, label='RX', zorder=5, animated=True)
+        self.locations_title = self.ax_locations.text(0.02, 0.97, "", transform=self.ax_locations.transAxes,
+                                                      va='top', animated=True)
+        self.ax_locations.set_title('Drone Locations')
+        self.ax_locations.set_xlabel('X Coordinate')
+        self.ax_locations.set_ylabel('Y Coordinate')
+        self.ax_locations.legend(loc='lower right')
+        self.ax_locations.grid(True)
+        self.ax_locations.set_aspect('equal', adjustable='datalim')
+        
+        # Plot 2: Magnitude of the channel
+        (self.magnitude_line,) = self.ax_magnitude.plot([], [], animated=True)
+        self.ax_magnitude.set_title('Channel Magnitude')
+        self.ax_magnitude.set_xlabel('Sample Index')
+        self.ax_magnitude.set_ylabel('Magnitude')
+        self.ax_magnitude.grid(True)
+        
+        # Plot 3: Phase of the channel
+        (self.phase_line,) = self.ax_phase.plot([], [], animated=True)
+        self.ax_phase.set_title('Channel Phase')
+        self.ax_phase.set_xlabel('Sample Index')
+        self.ax_phase.set_ylabel('Phase (radians)')
+        self.ax_phase.set_ylim(-np.pi * 1.05, np.pi * 1.05)
+        self.ax_phase.grid(True)
+        
+        self.animated_artists = {
+            self.canvas_locations: [self.drones_artist, self.tx_artist, self.rx_artist, self.locations_title],
+            self.canvas_magnitude: [self.magnitude_line],
+            self.canvas_phase: [self.phase_line],
+        }
+        for fig, canvas in [(self.fig_locations, self.canvas_locations),
+                            (self.fig_magnitude, self.canvas_magnitude),
+                            (self.fig_phase, self.canvas_phase)]:
+            fig.tight_layout()
+            # The static parts of a figure are cached after every full draw (e.g. on resize)
+            canvas.mpl_connect('draw_event', lambda event, canvas=canvas: self.on_full_draw(canvas))
+    
+    def on_full_draw(self, canvas):
+        """Cache the static background of a figure and draw its data on top."""
+        self.backgrounds[canvas] = canvas.copy_from_bbox(canvas.figure.bbox)
+        for artist in self.animated_artists[canvas]:
+            canvas.figure.draw_artist(artist)
+    
+    def blit(self, canvas):
+        """Redraw only the data artists of a figure over its cached background."""
+        background = self.backgrounds.get(canvas)
+        if background is None:
+            canvas.draw_idle()
+            return
+        canvas.restore_region(background)
+        for artist in self.animated_artists[canvas]:
+            canvas.figure.draw_artist(artist)
+        canvas.blit(canvas.figure.bbox)
+    
+    def run_in_background(self, kind: str, function, *args):
+        """Run a network call on a worker thread; its result is handled on the Tk thread."""
+        def task():
+            try:
+                self.results.put((kind, args, function(*args), None))
+            except Exception as e:
+                self.results.put((kind, args, None, e))
+        self.executor.submit(task)
+    
+    def poll_results(self):
+        """Handle the results of background calls (Tk widgets may only be used from this thread)."""
+        try:
+            while True:
+                kind, args, value, error = self.results.get_nowait()
+                if kind == "jobs":
+                    self.on_jobs_loaded(value or [])
+                elif kind == "job_steps":
+                    self.on_job_data_loaded(args[0], value)
+                elif kind == "block":
+                    self.on_block_loaded(args, value, error)
+                elif kind == "export_progress":
+                    self.status_text.set(f"Exported {args[0]}/{args[1]} steps")
+                elif kind == "export":
+                    self.on_export_done(args[1], value, error)
+        except queue.Empty:
+            pass
+        self.root.after(self.POLL_INTERVAL_MS, self.poll_results)
 
     def load_jobs(self):
         """Load jobs from database and populate the combobox."""
-        self.jobs = get_jobs_from_database()
+        self.status_text.set("Loading jobs...")
+        self.run_in_background("jobs", get_jobs_from_database)
+    
+    def on_jobs_loaded(self, jobs: List[Tuple[str, str]]):
+        self.status_text.set("")
+        self.jobs = jobs
         job_names = [f"{job[1]} (ID: {job[0]})" for job in self.jobs]
         self.job_combobox['values'] = job_names
-        if job_names:
-            self.job_combobox.current(0)
-            self.on_job_selected()
+        if not job_names:
+            return
+        # Keep the current job selected after a refresh
+        job_ids = [job_id for job_id, _ in self.jobs]
+        self.job_combobox.current(job_ids.index(self.current_job_id) if self.current_job_id in job_ids else 0)
+        self.on_job_selected()
             
     def refresh_jobs(self):
         """Refresh the job list from the database."""
-        current_job_id = self.current_job_id
+        # Jobs may have new results since their CIRs were cached
+        self.blocks.clear()
         self.load_jobs()
-        
-        if current_job_id:
-            for i, (job_id, _) in enumerate(self.jobs):
-                if job_id == current_job_id:
-                    self.job_combobox.current(i)
-                    self.on_job_selected()
-                    break
     
     def on_job_selected(self, event=None):
         """Handle job selection."""
@@ -245,32 +322,44 @@ class SimulationViewer:
             self.load_job_data(job_id)
     
     def load_job_data(self, job_id: str):
-        """Load simulation data for the selected job."""
-        job_data = fetch_job_results(job_id)
-        if job_data is None:
+        """Load the step count and shape of the selected job; CIRs are fetched as they are viewed."""
+        self.stop_playback()
+        self.status_text.set("Loading job...")
+        self.run_in_background("job_steps", fetch_job_steps, job_id, 0, 1)
+    
+    def on_job_data_loaded(self, job_id: str, job_steps: Optional[dict]):
+        if job_id != self.current_job_id:
+            return  # another job was selected meanwhile
+        self.status_text.set("")
+        if job_steps is None:
             print(f"Failed to load data for job {job_id}")
             return
             
         try:
-            steps, mag_nd, phase_nd, locations = process_simulation_results_data(job_data)
-            if steps is not None:
-                self.steps = steps
-                self.mag_nd = mag_nd
-                self.phase_nd = phase_nd
-                self.locations = locations
-                self.num_drones = len(locations[0]) if locations and locations[0] else 0
-                
-                self.update_parameter_comboboxes()
-                self.plot_data()
+            self.steps = job_steps['num_steps']
+            # Every drone is both a receiver (first axis) and a transmitter
+            self.num_drones = job_steps['shape'][0]
+            
+            self.update_parameter_comboboxes()
+            self.reset_axes(job_steps['shape'][-1])
+            self.plot_data()
         except Exception as e:
             print(f"Error loading job data: {e}")
     
+    def reset_axes(self, num_taps: int):
+        """Set the axis limits of a newly loaded job; they only change again when data falls outside."""
+        self.ax_magnitude.set_xlim(0, max(num_taps - 1, 1))
+        self.ax_magnitude.set_ylim(0, 1)
+        self.ax_phase.set_xlim(0, max(num_taps - 1, 1))
+        self.location_limits = None
+        for canvas in self.animated_artists:
+            canvas.draw_idle()
+    
     def update_parameter_comboboxes(self):
-        """Update the parameter comboboxes with available options."""
-        step_values = list(range(self.steps))
-        self.step_combobox['values'] = step_values
-        if step_values:
-            self.selected_step.set(step_values[0])
+        """Update the parameter widgets with available options."""
+        self.step_scale.configure(to=max(self.steps - 1, 0))
+        self.step_scale.set(0)
+        self.selected_step.set(0)
         
         drone_ids = list(range(self.num_drones))
         self.tx_combobox['values'] = drone_ids
@@ -279,70 +368,137 @@ class SimulationViewer:
             self.selected_tx_id.set(drone_ids[0])
             self.selected_rx_id.set(drone_ids[0])
     
+    def on_step_scrolled(self, value):
+        """Handle slider moves, which fire for every intermediate step."""
+        step = int(float(value))
+        if step != self.selected_step.get():
+            self.selected_step.set(step)
+            self.plot_data()
+    
     def on_param_changed(self, event=None):
         """Handle parameter changes."""
         self.plot_data()
     
+    def toggle_playback(self):
+        if self.playing:
+            self.stop_playback()
+        elif self.steps > 0:
+            self.playing = True
+            self.play_button.configure(text="Pause")
+            self.root.after(self.PLAYBACK_INTERVAL_MS, self.play_next_step)
+    
+    def stop_playback(self):
+        self.playing = False
+        self.play_button.configure(text="Play")
+    
+    def play_next_step(self):
+        if not self.playing:
+            return
+        step = (self.selected_step.get() + 1) % self.steps
+        key = self.block_key(step)
+        # Wait for blocks still being fetched instead of skipping their steps
+        if key is None or key in self.blocks:
+            self.selected_step.set(step)
+            self.step_scale.set(step)
+            self.plot_data()
+        else:
+            self.request_block(key)
+        self.root.after(self.PLAYBACK_INTERVAL_MS, self.play_next_step)
+    
+    def block_key(self, step: int) -> Optional[tuple]:
+        if self.current_job_id is None:
+            return None
+        return (self.current_job_id, self.selected_tx_id.get(), self.selected_rx_id.get(), step // CIR_BLOCK_STEPS)
+    
+    def request_block(self, key: tuple):
+        """Fetch a CIR block in the background unless it is cached or already requested."""
+        if key in self.blocks or key in self.pending_blocks:
+            return
+        self.pending_blocks.add(key)
+        self.run_in_background("block", fetch_cir_block, *key)
+    
+    def on_block_loaded(self, key: tuple, block, error: Optional[Exception]):
+        self.pending_blocks.discard(key)
+        if error is not None:
+            print(f"Error fetching CIR block {key}: {error}")
+            return
+        self.blocks[key] = block
+        while len(self.blocks) > self.BLOCK_CACHE_SIZE:
+            self.blocks.popitem(last=False)
+        if key == self.block_key(self.selected_step.get()):
+            self.plot_data()
+    
     def plot_data(self):
         """Plot the data based on selected parameters."""
         step = self.selected_step.get()
         tx_id = self.selected_tx_id.get()
         rx_id = self.selected_rx_id.get()
         
-        if (self.mag_nd is None or self.phase_nd is None or self.locations is None or
+        if (self.current_job_id is None or
             not (0 <= step < self.steps and 0 <= tx_id < self.num_drones and 0 <= rx_id < self.num_drones)):
             return
         
-        for ax in [self.ax_locations, self.ax_magnitude, self.ax_phase]:
-            ax.clear()
+        key = self.block_key(step)
+        if key not in self.blocks:
+            # Drawn by on_block_loaded once fetched
+            self.request_block(key)
+            return
+        self.blocks.move_to_end(key)
+        # Prefetch the next block so scrubbing and playback do not stall at block edges
+        if step % CIR_BLOCK_STEPS >= CIR_BLOCK_STEPS // 2 and step + CIR_BLOCK_STEPS // 2 < self.steps:
+            self.request_block(key[:3] + (key[3] + 1,))
         
-        cir_mag = self.mag_nd[step, tx_id, 0, rx_id, 0, 0, :]
-        cir_phase = self.phase_nd[step, tx_id, 0, rx_id, 0, 0, :]
-        drone_locations = self.locations[step]
+        block_mag, block_phase, block_locations = self.blocks[key]
+        cir_mag = block_mag[step % CIR_BLOCK_STEPS]
+        cir_phase = block_phase[step % CIR_BLOCK_STEPS]
+        drone_locations = block_locations.get(step)
+        taps = np.arange(len(cir_mag))
+        full_redraw = False
         
         # Plot 1: 2D map of drone locations
         if drone_locations:
-            x_coords = [loc[0] for loc in drone_locations]
-            y_coords = [loc[1] for loc in drone_locations]
-            
-            self.ax_locations.scatter(x_coords, y_coords, c='blue', label='Drones')
-            self.ax_locations.scatter(x_coords[tx_id], y_coords[tx_id], c='red', s=100, label=f'TX ({tx_id})', zorder=5)
-            self.ax_locations.scatter(x_coords[rx_id], y_coords[rx_id], c='green', s=100, label=f'RX ({rx_id})', zorder=5)
-            
-            self.ax_locations.set_title(f'Drone Locations - Step {step}')
-            self.ax_locations.set_xlabel('X Coordinate')
-            self.ax_locations.set_ylabel('Y Coordinate')
-            self.ax_locations.legend()
-            self.ax_locations.grid(True)
-            self.ax_locations.set_aspect('equal', adjustable='box')
+            points = np.asarray(drone_locations, dtype=float)[:, :2]
+            self.drones_artist.set_offsets(points)
+            self.tx_artist.set_offsets(points[[tx_id]])
+            self.rx_artist.set_offsets(points[[rx_id]])
+            self.locations_title.set_text(f'Step {step}  TX: {tx_id}  RX: {rx_id}')
+            # Limits only grow, so most steps are blitted without rescaling the axes
+            low, high = points.min(axis=0), points.max(axis=0)
+            if self.location_limits is not None:
+                low = np.minimum(low, self.location_limits[0])
+                high = np.maximum(high, self.location_limits[1])
+            if self.location_limits is None or not np.array_equal([low, high], self.location_limits):
+                self.location_limits = np.array([low, high])
+                margin = np.maximum((high - low) * 0.1, 1.0)
+                self.ax_locations.set_xlim(low[0] - margin[0], high[0] + margin[0])
+                self.ax_locations.set_ylim(low[1] - margin[1], high[1] + margin[1])
+                self.canvas_locations.draw_idle()
+                full_redraw = True
+        if not full_redraw:
+            self.blit(self.canvas_locations)
             
         # Plot 2: Magnitude of the channel
-        self.ax_magnitude.plot(cir_mag)
-        self.ax_magnitude.set_title(f'Channel Magnitude (TX:{tx_id}, RX:{rx_id})')
-        self.ax_magnitude.set_xlabel('Sample Index')
-        self.ax_magnitude.set_ylabel('Magnitude')
-        self.ax_magnitude.grid(True)
+        self.magnitude_line.set_data(taps, cir_mag)
+        peak = float(np.nanmax(cir_mag)) if len(cir_mag) else 0.0
+        if peak > self.ax_magnitude.get_ylim()[1]:
+            self.ax_magnitude.set_ylim(0, peak * 1.1)
+            self.canvas_magnitude.draw_idle()
+        else:
+            self.blit(self.canvas_magnitude)
         
         # Plot 3: Phase of the channel
-        self.ax_phase.plot(cir_phase)
-        self.ax_phase.set_title(f'Channel Phase (TX:{tx_id}, RX:{rx_id})')
-        self.ax_phase.set_xlabel('Sample Index')
-        self.ax_phase.set_ylabel('Phase (radians)')
-        self.ax_phase.grid(True)
-        
-        for fig in [self.fig_locations, self.fig_magnitude, self.fig_phase]:
-            fig.tight_layout()
-        
-        for canvas in [self.canvas_locations, self.canvas_magnitude, self.canvas_phase]:
-            canvas.draw()
+        self.phase_line.set_data(taps, cir_phase)
+        self.blit(self.canvas_phase)
 
     def export_data_as_numpy(self):
         """
         Handles the export button click. Prompts the user for a file location
         and saves the CIR data to a .npy file with the shape:
         [2, num_steps, num_drones, num_drones, num_samples]
+        
+        The same export runs headless with `python cir_export.py <job_id> <file>`.
         """
-        if self.mag_nd is None or self.phase_nd is None:
+        if self.current_job_id is None or self.steps == 0:
             messagebox.showwarning("Export Error", "No simulation data loaded to export.")
             return
 
@@ -356,25 +512,22 @@ class SimulationViewer:
             # User cancelled the dialog
             return
 
-        try:
-            # Reshape the data from 7D to 4D using slicing
-            # Original shape: [num_steps, num_drones, ant1, num_drones, ant2, ant3, num_samples]
-            # Target shape:   [num_steps, num_drones, num_drones, num_samples]
-            mag_4d = self.mag_nd[:, :, 0, :, 0, 0, :]
-            phase_4d = self.phase_nd[:, :, 0, :, 0, 0, :]
-            
-            # Stack magnitude and phase along a new first axis
-            # Final shape: [2, num_steps, num_drones, num_drones, num_samples]
-            export_array = np.stack([mag_4d, phase_4d], axis=0)
-            
-            # Save the array to the selected file
-            np.save(file_path, export_array)
-            
-            # Display shape information as specified in feature.md
-            shape_info = f"Shape: {export_array.shape}\nShape: [2, num_steps, num_drones, num_drones, num_samples]\n2 because 1 for CIR magnitude and 1 for CIR phase"
-            messagebox.showinfo("Export Successful", f"Data successfully exported to:\n{file_path}\n\n{shape_info}")
-        except Exception as e:
-            messagebox.showerror("Export Failed", f"An error occurred while exporting data:\n{e}")
+        # Streamed into the file on a worker thread, one chunk of steps at a time
+        def report(done, total):
+            self.results.put(("export_progress", (done, total), None, None))
+        self.status_text.set("Exporting...")
+        self.run_in_background("export", lambda job_id, path: export_job_cir(
+            job_id, path, database_url=DATABASE_URL, progress_callback=report),
+            self.current_job_id, file_path)
+    
+    def on_export_done(self, file_path: str, shape, error: Optional[Exception]):
+        self.status_text.set("")
+        if error is not None:
+            messagebox.showerror("Export Failed", f"An error occurred while exporting data:\n{error}")
+            return
+        # Display shape information as specified in feature.md
+        shape_info = f"Shape: {shape}\nShape: [2, num_steps, num_drones, num_drones, num_samples]\n2 because 1 for CIR magnitude and 1 for CIR phase"
+        messagebox.showinfo("Export Successful", f"Data successfully exported to:\n{file_path}\n\n{shape_info}")
 
 def main():
     root = tk.Tk()